@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+from benchmarks.common import bench_db_config, connect_bench_db
+from benchmarks.mock_servers import SyntheticTelegraphStore, MockChatServer
+from benchmarks.run_benchmarks import load_corpus
+
+# 未来事件堆积任务多 worker 吞吐基准：同一份语料分别用 1/4/16 个 worker 进程以租约方式并行处理
+# python -m benchmarks.bench_backlog_workers --corpus 2000 --workers 1,4,16 --latency 0.3
+
+
+def configure_logging(workdir):
+    # 先于被测模块配置日志，避免写入服务器上的 /var/log 日志
+    logging.basicConfig(filename=os.path.join(workdir, 'bench.log'), level=logging.INFO,
+                        format='%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+
+
+# 子进程入口：指向测试库与模拟 LLM 接口后认领处理，直到没有可认领的记录
+# 各 worker 均分 LLM 配额
+def worker_main(chat_url, workdir, index, requests_per_minute, tokens_per_minute):
+    configure_logging(workdir)
+    from openai import OpenAI
+    import future_events_analysis as f
+    from llm_cache import LLMResponseCache
+    from llm_client import LLMGateway
+
+    f.db_config = bench_db_config
+    f.client = OpenAI(api_key='bench', base_url=chat_url, max_retries=0)
+    f.llm_gateway = LLMGateway(f.METRICS_STAGE, requests_per_minute, tokens_per_minute)
+    f.llm_cache = LLMResponseCache(path=os.path.join(workdir, f'cache_{index}.sqlite3'))
+    f.NEAR_DUP_ENABLED = False
+    f.process_backlog_data(worker_id=f'bench-{index}')
+
+
+def prepare(store):
+    import future_events_analysis as f
+    load_corpus(store)
+    conn = connect_bench_db()
+    cursor = conn.cursor()
+    f.ensure_future_events_table(conn, cursor)
+    f.ensure_lease_columns(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+# 返回 (剩余未处理条数, 事件被重复写入的新闻条数)
+def verify():
+    conn = connect_bench_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM perception_cls_news WHERE future_event_status = 'unprocessed'")
+    remaining = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT news_id FROM perception_future_events GROUP BY news_id HAVING COUNT(*) > 1
+        ) duplicated
+    """)
+    duplicated = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    return remaining, duplicated
+
+
+def run(num_workers, args, workdir):
+    store = SyntheticTelegraphStore(args.corpus)
+    chat = MockChatServer(args.latency, args.error_rate).start()
+    prepare(store)
+
+    # 每轮使用独立的缓存目录，避免上一轮的缓存命中影响结果
+    run_dir = tempfile.mkdtemp(prefix=f'workers_{num_workers}_', dir=workdir)
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=worker_main, args=(chat.url, run_dir, index, args.rpm / num_workers, args.tpm / num_workers))
+        for index in range(num_workers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    chat.stop()
+
+    remaining, duplicated = verify()
+    done = args.corpus - remaining
+    print(
+        f"{num_workers:>3} 个 worker  {done:>7} 条  {elapsed:>8.1f} s  {done / elapsed:>8.1f} 条/s  "
+        f"LLM 请求 {chat.requests}  剩余未处理 {remaining}  事件重复写入 {duplicated}"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='未来事件堆积任务多 worker 吞吐基准')
+    parser.add_argument('--corpus', type=int, default=2000, help='合成电报条数')
+    parser.add_argument('--workers', default='1,4,16', help='逗号分隔的 worker 进程数')
+    parser.add_argument('--latency', type=float, default=0.3, help='模拟 LLM 平均延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟 LLM 500 错误比例')
+    parser.add_argument('--rpm', type=float, default=100000, help='LLM 请求数配额（次/分钟），各 worker 均分')
+    parser.add_argument('--tpm', type=float, default=100000000, help='LLM token 配额（个/分钟），各 worker 均分')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='perception_bench_')
+    configure_logging(workdir)
+    print(f"测试库 {bench_db_config['host']}:{bench_db_config['port']}/{bench_db_config['database']}，语料 {args.corpus} 条")
+    for num_workers in [int(value) for value in args.workers.split(',')]:
+        run(num_workers, args, workdir)
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.common import connect_bench_db, reset_schema, percentile
+
+# 未来事件查询基准：生成数百万条合成事件，对比 JSON_CONTAINS 全表扫描与主题/地区分类表索引查询的延迟
+# python -m benchmarks.bench_event_queries --events 3000000 --repeat 20
+
+THEMES = ['政治', '外交', '经济', '军事', '法律', '交通', '体育', '科技', '环境', '社会', '工业']
+REGIONS = ['中国', '美国', '欧盟', '日本', '俄罗斯', '英国', '韩国', '印度', '中东', '东南亚', '非洲', '联合国', '全球']
+EVENTS_PER_NEWS = 3
+INSERT_CHUNK = 5000
+WINDOW_DAYS = 14
+
+# (主题, 地区)；None 表示不按该维度筛选
+QUERIES = [('军事', '中国'), ('经济', None), (None, '美国'), ('科技', '欧盟'), (None, None)]
+
+
+# 写入合成新闻与事件：预计时间分布在前后 180 天内，每条事件 1-3 个主题、1-2 个地区
+def load_events(conn, count, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    cursor = conn.cursor()
+    news_count = (count + EVENTS_PER_NEWS - 1) // EVENTS_PER_NEWS
+    for start in range(0, news_count, INSERT_CHUNK):
+        cursor.executemany(
+            "INSERT INTO perception_cls_news (id, ctime, content, future_event_status) VALUES (%s, %s, %s, 'has_events')",
+            [(news_id, int(now.timestamp()), f'合成新闻{news_id}') for news_id in range(start + 1, min(start + INSERT_CHUNK, news_count) + 1)]
+        )
+        conn.commit()
+    for start in range(0, count, INSERT_CHUNK):
+        rows = []
+        for index in range(start, min(start + INSERT_CHUNK, count)):
+            description = f'合成事件{index}'
+            rows.append((
+                index // EVENTS_PER_NEWS + 1,
+                description,
+                now + timedelta(seconds=rng.randint(-180 * 86400, 180 * 86400)),
+                round(rng.random(), 2),
+                json.dumps(rng.sample(THEMES, rng.randint(1, 3)), ensure_ascii=False),
+                json.dumps(rng.sample(REGIONS, rng.randint(1, 2)), ensure_ascii=False),
+                hashlib.sha256(description.encode('utf-8')).hexdigest(),
+            ))
+        cursor.executemany("""
+            INSERT INTO perception_future_events (
+                news_id, event_description, expected_time, probability_of_occurrence,
+                theme_categories, region_categories, event_hash
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+    cursor.close()
+
+
+# 改写前的查询方式：JSON_CONTAINS 筛选，无可用索引
+def query_json_contains(cursor, theme, region, start, days, limit=100):
+    conditions = ["expected_time >= %s AND expected_time < %s"]
+    params = [start, start + timedelta(days=days)]
+    if theme is not None:
+        conditions.append("JSON_CONTAINS(theme_categories, JSON_QUOTE(%s))")
+        params.append(theme)
+    if region is not None:
+        conditions.append("JSON_CONTAINS(region_categories, JSON_QUOTE(%s))")
+        params.append(region)
+    cursor.execute(f"""
+        SELECT id, news_id, event_description, expected_time, probability_of_occurrence
+        FROM perception_future_events IGNORE INDEX (idx_expected_time)
+        WHERE {' AND '.join(conditions)}
+        ORDER BY probability_of_occurrence DESC, expected_time
+        LIMIT %s
+    """, params + [limit])
+    return cursor.fetchall()
+
+
+def measure(func, repeat):
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(func())
+        latencies.append(time.perf_counter() - started)
+    return rows, latencies
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='未来事件查询基准')
+    parser.add_argument('--events', type=int, default=3000000, help='合成事件条数')
+    parser.add_argument('--repeat', type=int, default=20, help='每个查询的重复次数')
+    parser.add_argument('--skip-load', action='store_true', help='复用测试库中已有的合成事件')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='perception_bench_')
+    # 先于被测模块配置日志，避免写入服务器上的 /var/log 日志
+    logging.basicConfig(filename=os.path.join(workdir, 'bench.log'), level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    import future_events_analysis as f
+    import future_events_query as q
+
+    conn = connect_bench_db()
+    cursor = conn.cursor()
+    if not args.skip_load:
+        reset_schema(conn)
+        f.ensure_future_events_table(conn, cursor)
+        conn.commit()
+        started = time.perf_counter()
+        load_events(conn, args.events)
+        print(f"写入 {args.events} 条合成事件 {time.perf_counter() - started:.1f} s")
+        started = time.perf_counter()
+        q.rebuild_event_categories(conn, cursor)
+        print(f"重建主题/地区分类表 {time.perf_counter() - started:.1f} s")
+    else:
+        f.ensure_future_events_table(conn, cursor)
+    cursor.execute("ANALYZE TABLE perception_future_events, perception_future_event_themes, perception_future_event_regions")
+    cursor.fetchall()
+
+    start = datetime.now()
+    for theme, region in QUERIES:
+        name = f"主题={theme or '*'} 地区={region or '*'}"
+        for method, func in (
+            ('JSON_CONTAINS', lambda: query_json_contains(cursor, theme, region, start, WINDOW_DAYS)),
+            ('分类表索引', lambda: q.query_upcoming_events(cursor, theme, region, start, WINDOW_DAYS)),
+        ):
+            rows, latencies = measure(func, args.repeat)
+            print(
+                f"{name:<20} {method:<14} 返回 {rows:>4} 条  "
+                f"p50 {percentile(latencies, 50) * 1000:>9.1f} ms  p99 {percentile(latencies, 99) * 1000:>9.1f} ms"
+            )
+    cursor.close()
+    conn.close()
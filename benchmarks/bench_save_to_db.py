@@ -0,0 +1,35 @@
+import sys
+import time
+
+import crawler_cls
+from benchmarks.common import connect_bench_db, reset_schema, make_corpus
+
+PAGE_SIZE = 20
+
+
+# 逐页写入，返回 (首次插入 rows/s, 重复 upsert rows/s)
+def run(save_func, corpus):
+    conn = connect_bench_db()
+    reset_schema(conn)
+    pages = [corpus[i:i + PAGE_SIZE] for i in range(0, len(corpus), PAGE_SIZE)]
+    rates = []
+    for _ in range(2):  # 第一轮为新数据插入，第二轮模拟轮询重复拉取同一批数据
+        started = time.perf_counter()
+        for page in pages:
+            save_func(conn, page)
+        rates.append(len(corpus) / (time.perf_counter() - started))
+    conn.close()
+    return rates
+
+
+if __name__ == "__main__":
+    # python -m benchmarks.bench_save_to_db [条数]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    corpus = make_corpus(count)
+    results = {
+        '逐条写入 save_to_db': run(crawler_cls.save_to_db, corpus),
+        '批量写入 save_to_db_bulk': run(crawler_cls.save_to_db_bulk, corpus),
+    }
+    print(f"\n{count} 条数据，每页 {PAGE_SIZE} 条")
+    for name, (insert_rate, upsert_rate) in results.items():
+        print(f"{name}: 插入 {insert_rate:.0f} rows/s，重复 upsert {upsert_rate:.0f} rows/s")
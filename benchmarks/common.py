@@ -0,0 +1,159 @@
+import os
+import time
+import random
+import mysql.connector
+
+# 基准测试使用的本地 MySQL（切勿指向生产库，测试会清空数据表）
+bench_db_config = {
+    'host': os.environ.get('BENCH_DB_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('BENCH_DB_PORT', '3306')),
+    'user': os.environ.get('BENCH_DB_USER', 'root'),
+    'password': os.environ.get('BENCH_DB_PASSWORD', ''),
+    'database': os.environ.get('BENCH_DB_NAME', 'perception_bench')
+}
+
+# 与 README 中表结构一致的测试表
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS perception_cls_news (
+        id INT PRIMARY KEY,
+        ctime INT,
+        content TEXT,
+        level VARCHAR(10),
+        reading_num INT,
+        comment_num INT,
+        share_num INT,
+        modified_time INT,
+        insert_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        hotspot_level INT,
+        feature_scores JSON,
+        processed_at TIMESTAMP NULL,
+        future_event_status VARCHAR(20) DEFAULT 'unprocessed',
+        KEY idx_ctime (ctime)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS perception_cls_news_subjects (
+        news_id INT NOT NULL,
+        subject_id INT,
+        subject_name VARCHAR(255),
+        KEY idx_news_id (news_id)
+    )
+    """,
+]
+
+SUBJECT_POOL = [
+    (1001, 'A股盘面直播'), (1002, '港股动态'), (1003, '美股动态'), (1004, '黄金'),
+    (2001, '人工智能'), (2002, '新能源汽车'), (2003, '地缘政治'), (2004, '央行动态'),
+    (2005, '半导体'), (2006, '消费'), (2007, '航天'), (2008, '贸易摩擦'),
+]
+
+PHRASES = [
+    '国务院常务会议', '美联储', '外交部发言人', '某科技公司', '发布会', '将于下周举行',
+    '沪指收涨', '成交额突破', '芯片出口管制', '新能源车销量', '地震', '央行宣布降准',
+    '签署合作协议', '首次发射', '票房突破', '关税', '同比增长', '明年一季度投产',
+]
+
+
+def connect_bench_db():
+    return mysql.connector.connect(**bench_db_config)
+
+
+# 创建测试表并清空数据
+def reset_schema(conn, extra_statements=()):
+    cursor = conn.cursor()
+    for statement in list(SCHEMA_STATEMENTS) + list(extra_statements):
+        cursor.execute(statement)
+    cursor.execute("SHOW TABLES")
+    for (table,) in cursor.fetchall():
+        if table.startswith('perception_'):
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            cursor.execute(f"TRUNCATE TABLE {table}")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    conn.commit()
+    cursor.close()
+
+
+# 生成一条与 telegraphList 返回格式一致的合成电报
+def make_telegraph(news_id, ctime, rng=random):
+    content = '【合成快讯】' + '，'.join(rng.sample(PHRASES, 4)) + f'。编号{news_id}'
+    return {
+        'id': news_id,
+        'ctime': ctime,
+        'content': content,
+        'level': rng.choice(['A', 'B', 'C']),
+        'reading_num': rng.randint(0, 200000),
+        'comment_num': rng.randint(0, 500),
+        'share_num': rng.randint(0, 2000),
+        'modified_time': ctime,
+        'subjects': [
+            {'subject_id': subject_id, 'subject_name': name}
+            for subject_id, name in rng.sample(SUBJECT_POOL, rng.randint(0, 3))
+        ],
+    }
+
+
+# 生成 count 条按 ctime 倒序排列的合成电报
+def make_corpus(count, start_id=1, start_ctime=None, interval=15, seed=42):
+    rng = random.Random(seed)
+    start_ctime = start_ctime or int(time.time()) - count * interval
+    return [make_telegraph(start_id + i, start_ctime + i * interval, rng) for i in reversed(range(count))]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# 统计数据库往返次数的连接包装：每次 execute/executemany/commit/rollback 计一次
+class RoundTripCounter:
+    def __init__(self):
+        self.executes = 0
+        self.commits = 0
+
+    @property
+    def total(self):
+        return self.executes + self.commits
+
+
+class CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.executes += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.executes += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def commit(self):
+        self._counter.commits += 1
+        return self._conn.commit()
+
+    def rollback(self):
+        self._counter.commits += 1
+        return self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
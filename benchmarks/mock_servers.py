@@ -0,0 +1,195 @@
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.common import make_telegraph
+
+CURRENT_DATE_PATTERN = re.compile(r'当前时间为 (\d{4}年\d{2}月\d{2}日)')
+SCORE_DIMENSIONS = ["冲突性", "名人效应", "突发性", "经济敏感议题", "社会/文化热点", "科技突破", "外交动态"]
+
+
+# 按需生成的合成电报库：第 i 条的 id 为 start_id + i，ctime 为 base_ctime + i * interval，内容由种子决定，百万级也不占内存
+class SyntheticTelegraphStore:
+    def __init__(self, count, base_ctime=None, interval=15, start_id=1, seed=42):
+        self.count = count
+        self.interval = interval
+        self.start_id = start_id
+        self.seed = seed
+        self.base_ctime = base_ctime or int(time.time()) - count * interval
+
+    def telegraph(self, index):
+        return make_telegraph(self.start_id + index, self.base_ctime + index * self.interval, random.Random(self.seed + index))
+
+    # 与 telegraphList 一致：返回 ctime 不晚于 last_time 的最新 rn 条，按 ctime 倒序
+    def page(self, last_time, rn):
+        newest = min(self.count - 1, (last_time - self.base_ctime) // self.interval)
+        return [self.telegraph(index) for index in range(newest, max(-1, newest - rn), -1)]
+
+    def all(self):
+        return [self.telegraph(index) for index in range(self.count)]
+
+
+# 本地 HTTP 服务的公共部分：后台线程运行，记录请求数
+class MockServer:
+    def __init__(self, handler_cls):
+        self.requests = 0
+        self.lock = threading.Lock()
+        handler = type(handler_cls.__name__, (handler_cls,), {'mock': self})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name, 0) + 1)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# 模拟财联社 nodeapi/telegraphList
+class TelegraphHandler(QuietHandler):
+    def do_GET(self):
+        self.mock.count('requests')
+        parsed = urlparse(self.path)
+        if parsed.path != '/nodeapi/telegraphList':
+            self.send_json(404, {'error': 404})
+            return
+        query = parse_qs(parsed.query)
+        last_time = int(query.get('lastTime', [str(int(time.time()))])[0])
+        rn = int(query.get('rn', ['20'])[0])
+        self.send_json(200, {'error': 0, 'data': {'roll_data': self.mock.store.page(last_time, rn)}})
+
+
+class MockTelegraphServer(MockServer):
+    def __init__(self, store):
+        super().__init__(TelegraphHandler)
+        self.store = store
+
+    @property
+    def url(self):
+        return self.base_url + '/nodeapi/telegraphList'
+
+
+def stable_scores(content):
+    digest = hashlib.md5(content.encode('utf-8')).digest()
+    return {dimension: digest[i] % 6 if digest[i] % 3 == 0 else 0 for i, dimension in enumerate(SCORE_DIMENSIONS)}
+
+
+# 预计时间取提示词中的当前日期（即合成电报的发布日期）之后 1～7 天，由内容决定，保证能通过写库时的时间校验
+def stable_expected_time(system, content):
+    match = CURRENT_DATE_PATTERN.search(system)
+    current = datetime.strptime(match.group(1), '%Y年%m月%d日') if match else datetime.now()
+    days = 1 + hashlib.md5(content.encode('utf-8')).digest()[0] % 7
+    return (current + timedelta(days=days)).strftime('%Y-%m-%d 00:00:00')
+
+
+# 模拟 OpenAI 兼容的 chat/completions：可配置延迟、错误率和 429 比例
+class ChatCompletionsHandler(QuietHandler):
+    def do_POST(self):
+        mock = self.mock
+        mock.count('requests')
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        time.sleep(max(0.0, random.gauss(mock.latency, mock.latency * 0.2)))
+        roll = random.random()
+        if roll < mock.rate_limit_rate:
+            mock.count('rate_limited')
+            self.send_json(429, {'error': {'message': 'mock rate limit', 'type': 'rate_limit'}}, {'Retry-After': str(mock.retry_after)})
+            return
+        if roll < mock.rate_limit_rate + mock.error_rate:
+            mock.count('errors')
+            self.send_json(500, {'error': {'message': 'mock server error'}})
+            return
+
+        messages = request.get('messages', [])
+        system = next((m['content'] for m in messages if m['role'] == 'system'), '')
+        user = next((m['content'] for m in messages if m['role'] == 'user'), '')
+        content = self.answer(system, user)
+        prompt_tokens = (len(system) + len(user)) // 2
+        completion_tokens = len(content) // 2
+        mock.add_tokens(prompt_tokens, completion_tokens)
+        self.send_json(200, {
+            'id': f'mock-{mock.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    def answer(self, system, user):
+        if '未来事件' in system and '关键特征' not in system:
+            if '将于' in user or '投产' in user:
+                return json.dumps([{
+                    'event_description': user[:60],
+                    'expected_time': stable_expected_time(system, user),
+                    'remarks': 'mock',
+                    'probability_of_occurrence': 0.6,
+                    'theme_categories': ['经济'],
+                    'region_categories': ['中国'],
+                }], ensure_ascii=False)
+            return '[]'
+        try:
+            batch = json.loads(user)
+        except ValueError:
+            batch = None
+        if isinstance(batch, dict):
+            return json.dumps({news_id: stable_scores(content) for news_id, content in batch.items()}, ensure_ascii=False)
+        return json.dumps(stable_scores(user), ensure_ascii=False)
+
+
+class MockChatServer(MockServer):
+    def __init__(self, latency=0.3, error_rate=0.0, rate_limit_rate=0.0, retry_after=1):
+        super().__init__(ChatCompletionsHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    @property
+    def url(self):
+        return self.base_url + '/v1'
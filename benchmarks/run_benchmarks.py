@@ -0,0 +1,238 @@
+import io
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import contextlib
+
+import mysql.connector
+from openai import OpenAI
+
+from llm_client import LLMGateway, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+
+from benchmarks.common import bench_db_config, reset_schema, percentile, RoundTripCounter, CountingConnection
+from benchmarks.mock_servers import SyntheticTelegraphStore, MockTelegraphServer, MockChatServer
+
+# 离线端到端基准：本地模拟电报接口、模拟 chat/completions 接口和本地 MySQL，不访问财联社、LLM 或生产库
+# python -m benchmarks.run_benchmarks all --corpus 10000 --latency 0.3 --error-rate 0.01 --rate-limit 0.02
+
+_real_connect = mysql.connector.connect
+
+
+# 连接池语义：close() 不真正断开，供爬虫的 connect_db 反复取用
+class KeepOpenConnection(CountingConnection):
+    def close(self):
+        pass
+
+
+class BenchContext:
+    def __init__(self, args):
+        self.args = args
+        self.counter = RoundTripCounter()
+        self.workdir = tempfile.mkdtemp(prefix='perception_bench_')
+        # 先于被测模块配置日志，避免写入服务器上的 /var/log 日志
+        logging.basicConfig(filename=os.path.join(self.workdir, 'bench.log'), level=logging.INFO,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+        self.store = SyntheticTelegraphStore(args.corpus)
+
+    def connect(self, **_):
+        return CountingConnection(_real_connect(**bench_db_config), self.counter)
+
+    def reset_counter(self):
+        self.counter.executes = 0
+        self.counter.commits = 0
+
+
+# 记录每次调用耗时
+def timed(func, latencies):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def report(name, items, elapsed, latencies, counter, chat=None):
+    elapsed = max(elapsed, 1e-9)
+    line = (
+        f"{name:<12} {items:>9} 条  {elapsed:>8.1f} s  {items / elapsed:>9.1f} 条/s  "
+        f"p50 {percentile(latencies, 50) * 1000:>8.1f} ms  p99 {percentile(latencies, 99) * 1000:>8.1f} ms  "
+        f"DB 往返 {counter.total} ({counter.total / max(items, 1):.2f}/条)"
+    )
+    if chat is not None:
+        line += (
+            f"  LLM 请求 {chat.requests}（429: {getattr(chat, 'rate_limited', 0)}，错误: {getattr(chat, 'errors', 0)}）"
+            f"  tokens {chat.prompt_tokens}+{chat.completion_tokens}"
+        )
+    print(line)
+
+
+# 把合成语料批量写入测试库（不计入统计）
+def load_corpus(store):
+    import crawler_cls
+    conn = _real_connect(**bench_db_config)
+    reset_schema(conn)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for start in range(0, store.count, 1000):
+            chunk = [store.telegraph(index) for index in range(start, min(start + 1000, store.count))]
+            crawler_cls.save_to_db_bulk(conn, chunk)
+    conn.close()
+
+
+def start_chat_server(args):
+    return MockChatServer(args.latency, args.error_rate, args.rate_limit, args.retry_after).start()
+
+
+# 爬虫：从最新时间向前翻页补采整个语料并批量写库
+def bench_crawler(ctx):
+    import crawler_cls
+    from news_queue import NewsQueue
+
+    server = MockTelegraphServer(ctx.store).start()
+    conn = _real_connect(**bench_db_config)
+    reset_schema(conn)
+    conn.close()
+
+    shared = KeepOpenConnection(_real_connect(**bench_db_config), ctx.counter)
+    crawler_cls.url = server.url
+    crawler_cls.PAGE_REQUEST_DELAY = 0
+    crawler_cls.connect_db = lambda: shared
+    crawler_cls.news_queue = NewsQueue(os.path.join(ctx.workdir, 'news_queue.sqlite3'))
+    latencies = []
+    crawler_cls.fetch_page = timed(crawler_cls.fetch_page, latencies)
+    ctx.reset_counter()
+
+    start_ts = ctx.store.base_ctime
+    end_ts = ctx.store.base_ctime + ctx.store.count * ctx.store.interval
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        saved = crawler_cls.backfill(start_ts, end_ts)
+    report('crawler_cls', saved, time.perf_counter() - started, latencies, ctx.counter)
+    server.stop()
+
+
+# 热度计算：并发批量评分直到没有待评分记录
+def bench_hotspot(ctx):
+    import hot_spot_detector as h
+    from llm_cache import LLMResponseCache
+    from near_duplicate import NearDuplicateIndex
+
+    args = ctx.args
+    chat = start_chat_server(args)
+    load_corpus(ctx.store)
+    h.client = OpenAI(api_key='bench', base_url=chat.url, max_retries=0)
+    h.llm_gateway = LLMGateway(h.METRICS_STAGE, args.rpm, args.tpm)
+    h.llm_cache = LLMResponseCache(path=os.path.join(ctx.workdir, 'hotspot_cache.sqlite3'))
+    h.near_dup_index = NearDuplicateIndex()
+    h.NEAR_DUP_ENABLED = args.near_dup
+    h.PRESCORE_ENABLED = args.prescore
+    latencies = []
+    h.process_records_batch = timed(h.process_records_batch, latencies)
+
+    mysql.connector.connect = ctx.connect
+    try:
+        conn = ctx.connect()
+        cursor = conn.cursor()
+        h.ensure_tables(cursor)
+        ctx.reset_counter()
+        failed = set()
+        started = time.perf_counter()
+        while True:
+            conn.commit()
+            records = h.fetch_pending_records(cursor, args.concurrency * args.batch_size, failed)
+            if not records:
+                break
+            failed.update(h.score_records_concurrently(conn, cursor, records, args.concurrency, args.batch_size))
+        elapsed = time.perf_counter() - started
+        report('hotspot', ctx.store.count - len(failed), elapsed, latencies, ctx.counter, chat)
+        cursor.close()
+        conn.close()
+    finally:
+        mysql.connector.connect = _real_connect
+        chat.stop()
+
+
+# 未来事件抽取：每批 100 条处理直到没有未处理记录
+def bench_future(ctx):
+    import future_events_analysis as f
+    from llm_cache import LLMResponseCache
+    from near_duplicate import NearDuplicateIndex
+
+    args = ctx.args
+    chat = start_chat_server(args)
+    load_corpus(ctx.store)
+    f.client = OpenAI(api_key='bench', base_url=chat.url, max_retries=0)
+    f.llm_gateway = LLMGateway(f.METRICS_STAGE, args.rpm, args.tpm)
+    f.llm_cache = LLMResponseCache(path=os.path.join(ctx.workdir, 'future_cache.sqlite3'))
+    f.near_dup_index = NearDuplicateIndex()
+    f.NEAR_DUP_ENABLED = args.near_dup
+    latencies = []
+    f.extract_events = timed(f.extract_events, latencies)
+
+    mysql.connector.connect = ctx.connect
+    try:
+        conn = ctx.connect()
+        cursor = conn.cursor()
+        f.ensure_future_events_table(conn, cursor)
+        current_time = time.strftime("%Y年%m月%d日")
+        ctx.reset_counter()
+        failed = set()
+        started = time.perf_counter()
+        while True:
+            conn.commit()
+            exclude = f"AND id NOT IN ({', '.join(['%s'] * len(failed))})" if failed else ""
+            cursor.execute(f"""
+                SELECT id, content FROM perception_cls_news
+                WHERE future_event_status = 'unprocessed' {exclude}
+                ORDER BY ctime DESC LIMIT 100
+            """, tuple(failed))
+            records = cursor.fetchall()
+            if not records:
+                break
+            f.process_batch(cursor, conn, records, current_time)
+            ids = [record_id for record_id, _ in records]
+            cursor.execute(f"""
+                SELECT id FROM perception_cls_news
+                WHERE future_event_status = 'unprocessed' AND id IN ({', '.join(['%s'] * len(ids))})
+            """, ids)
+            failed.update(row[0] for row in cursor.fetchall())
+        elapsed = time.perf_counter() - started
+        report('future', ctx.store.count - len(failed), elapsed, latencies, ctx.counter, chat)
+        cursor.close()
+        conn.close()
+    finally:
+        mysql.connector.connect = _real_connect
+        chat.stop()
+
+
+BENCHMARKS = {'crawler': bench_crawler, 'hotspot': bench_hotspot, 'future': bench_future}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='感知模块离线端到端基准')
+    parser.add_argument('target', choices=list(BENCHMARKS) + ['all'])
+    parser.add_argument('--corpus', type=int, default=10000, help='合成电报条数（1 万到 100 万）')
+    parser.add_argument('--latency', type=float, default=0.3, help='模拟 LLM 平均延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟 LLM 500 错误比例')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='模拟 LLM 429 比例')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 响应的 Retry-After（秒）')
+    parser.add_argument('--concurrency', type=int, default=8, help='热度计算并发请求数')
+    parser.add_argument('--batch-size', type=int, default=10, help='热度计算每请求条数')
+    parser.add_argument('--rpm', type=float, default=LLM_REQUESTS_PER_MINUTE, help='LLM 请求数配额（次/分钟）')
+    parser.add_argument('--tpm', type=float, default=LLM_TOKENS_PER_MINUTE, help='LLM token 配额（个/分钟）')
+    parser.add_argument('--near-dup', action='store_true', help='启用近重复继承')
+    parser.add_argument('--prescore', action='store_true', help='启用本地预评分')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    ctx = BenchContext(args)
+    print(f"测试库 {bench_db_config['host']}:{bench_db_config['port']}/{bench_db_config['database']}，语料 {args.corpus} 条")
+    targets = list(BENCHMARKS) if args.target == 'all' else [args.target]
+    for target in targets:
+        BENCHMARKS[target](ctx)
@@ -0,0 +1,436 @@
+import sys
+import json
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import mysql.connector
+import schedule
+
+import hot_spot_detector as hotspot
+import future_events_analysis as events
+from scoring_backends import ScoreResult, FAILED_RESULT
+from llm_cache import LLMResponseCache, prompt_fingerprint, dated_prompt_version
+from llm_client import LLMGateway
+from temporal_expressions import HINT_PREFIX
+from metrics import COMBINED_METRICS_PORT, RECORDS_PROCESSED, instrument_connection, start_metrics_server, update_backlog
+
+# 合并分析：一次 LLM 请求同时返回 7 个维度的热度评分和未来事件列表，两项结果在同一事务内写入
+# 替代分别运行热度计算与未来事件抽取两个服务（运行本服务时应停止那两个服务的定时任务），相同新闻内容只发送一次
+
+# 合并输出格式（附加在热度评分规则与未来事件抽取规则之后）
+combined_instructions = """
+#### **3. 输出格式**
+- 以上两部分合并为一个 JSON 对象返回，包含两个字段：
+  - "scores"：7 个关键特征的评分对象；
+  - "events"：未来事件列表，每个事件的字段与示例一致，没有未来事件时为空数组 []。
+"""
+
+# 批量分析时附加的说明（规则只发送一次）
+batch_instructions = """
+#### **4. 批量输入**
+- 输入是一个 JSON 对象，键为新闻 id，值为新闻内容。
+- 请对每条新闻独立分析，返回一个 JSON 对象，键为相同的新闻 id，值为该新闻的 {"scores": ..., "events": [...]}。
+"""
+
+# 用户提示中的输出格式说明
+user_format_hint = " Please respond in the format {\"scores\": {\"冲突性\": ..., \"名人效应\": ..., \"突发性\": ..., \"经济敏感议题\": ..., \"社会/文化热点\": ..., \"科技突破\": ..., \"外交动态\": ...}, \"events\": [{\"event_description\": ..., \"expected_time\": ..., \"remarks\": ..., \"probability_of_occurrence\": ..., \"theme_categories\": ..., \"region_categories\": ...}, ...]}"
+
+# 模型与缓存配置（任一模块的提示词改动后缓存版本自动变化；提示词含当前日期，读写缓存时经 dated_prompt_version 把日期并入版本）
+LLM_MODEL = "deepseek-ai/DeepSeek-V3"
+COMBINED_PROMPT_VERSION = "combined:" + prompt_fingerprint(
+    hotspot.system_content, events.system_content_template, events.example_json, combined_instructions, user_format_hint, HINT_PREFIX
+)
+llm_cache = LLMResponseCache()
+
+# 并发与认领配置
+ANALYSIS_CONCURRENCY = 8         # 同时在途的 LLM 请求数
+ANALYSIS_BATCH_SIZE = 5          # 每次 LLM 请求打包的新闻条数（输出含事件列表，比单独评分的批量小）
+CLAIM_SIZE = 40                  # 每次认领的记录数
+IDLE_SECONDS = 30                # 持续模式下无可认领记录时的等待时间（秒）
+
+# 指标中的阶段名与待处理条件：热度评分或未来事件抽取任一未完成
+METRICS_STAGE = 'combined'
+PENDING_CONDITION = "(hotspot_level IS NULL OR future_event_status = 'unprocessed')"
+
+# LLM 调用限速与重试：本服务替代两个服务运行，独占全部配额；只缺一项结果的记录沿用原模块的请求，也经过这里限速
+llm_gateway = LLMGateway(METRICS_STAGE)
+
+
+# 共用限速器：热度计算与未来事件抽取模块的单项请求也计入本服务的配额
+def share_gateway():
+    hotspot.llm_gateway = llm_gateway
+    events.llm_gateway = llm_gateway
+
+
+# 合并系统提示：热度评分规则 + 未来事件抽取规则与示例 + 合并输出格式
+def build_system_content(current_time, batch=False):
+    parts = [
+        hotspot.system_content,
+        "#### **2. 未来事件抽取**",
+        events.system_content_template.format(current_time=current_time),
+        "事件示例：" + events.example_json,
+        combined_instructions,
+    ]
+    if batch:
+        parts.append(batch_instructions)
+    return "\n".join(parts)
+
+
+# 校验合并结果：评分 7 个维度齐全且为 0-5 的整数、事件为列表，返回 (scores, event_data)，否则返回 None
+def validate_result(data):
+    if not isinstance(data, dict):
+        return None
+    scores = hotspot.validate_scores(data.get("scores"))
+    event_data = events.validate_events(data.get("events"))
+    if scores is None or event_data is None:
+        return None
+    return scores, event_data
+
+
+def cache_result(content, current_time, scores, event_data):
+    prompt_version = dated_prompt_version(COMBINED_PROMPT_VERSION, current_time)
+    llm_cache.put(content, prompt_version, LLM_MODEL, {"scores": scores, "events": event_data})
+
+
+# 单条合并分析请求（只调用一次，重试由调用方决定），失败或格式错误时抛出异常
+def request_analysis(content, current_time):
+    response = llm_gateway.chat_completion(
+        hotspot.client,
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": build_system_content(current_time)},
+            {"role": "user", "content": events.with_time_hints(content) + user_format_hint}
+        ],
+        response_format={"type": "json_object"}
+    )
+    result = validate_result(json.loads(response.choices[0].message.content))
+    if result is None:
+        raise ValueError("合并分析返回的评分或事件格式错误")
+    cache_result(content, current_time, *result)
+    return result
+
+
+# 批量合并分析：K 条新闻打包成一次请求，缺失或格式错误的条目单独回退到逐条请求
+# 返回 ({record_id: ScoreResult}, [(record_id, event_data)])，失败的记录评分为 FAILED_RESULT 且不在事件列表中
+def analyze_records(records, current_time, max_retries=3):
+    analyzed = {}
+    pending = []
+    prompt_version = dated_prompt_version(COMBINED_PROMPT_VERSION, current_time)
+    for record_id, content in records:
+        cached = validate_result(llm_cache.get(content, prompt_version, LLM_MODEL))
+        if cached is not None:
+            analyzed[record_id] = cached
+        else:
+            pending.append((record_id, content))
+
+    fallback = pending
+    if len(pending) > 1:
+        user_content = json.dumps({str(record_id): events.with_time_hints(content) for record_id, content in pending}, ensure_ascii=False)
+
+        def request_batch():
+            response = llm_gateway.chat_completion(
+                hotspot.client,
+                model=LLM_MODEL,
+                messages=[
+                    {"role": "system", "content": build_system_content(current_time, batch=True)},
+                    {"role": "user", "content": user_content}
+                ],
+                response_format={"type": "json_object"}
+            )
+            data = json.loads(response.choices[0].message.content)
+            if not isinstance(data, dict):
+                raise ValueError(f"批量分析返回的不是 JSON 对象: {type(data).__name__}")
+            return data
+
+        try:
+            batch_data = llm_gateway.call_with_retries(request_batch, max_retries, f"批量合并分析 {len(pending)} 条")
+        except Exception as e:
+            logging.error(f"批量合并分析 {len(pending)} 条失败: {e}")
+            batch_data = {}
+
+        fallback = []
+        for record_id, content in pending:
+            result = validate_result(batch_data.get(str(record_id)))
+            if result is None:
+                fallback.append((record_id, content))
+                continue
+            cache_result(content, current_time, *result)
+            analyzed[record_id] = result
+        logging.info(f"批量合并分析完成: {len(pending)} 条，单独回退 {len(fallback)} 条")
+
+    failed = []
+    for (record_id, _), result, error in llm_gateway.run_deferred(fallback, lambda record: request_analysis(record[1], current_time), max_retries):
+        if error is None:
+            analyzed[record_id] = result
+        else:
+            failed.append(record_id)
+            logging.error(f"记录 {record_id} 合并分析失败: {error}")
+
+    score_results = {record_id: FAILED_RESULT for record_id in failed}
+    event_results = []
+    processed_at = datetime.now()
+    for record_id, (scores, event_data) in analyzed.items():
+        score_results[record_id] = ScoreResult(scores, hotspot.calculate_hotspot_level(scores), processed_at, True)
+        event_results.append((record_id, event_data))
+    return score_results, event_results
+
+
+# 只缺未来事件的记录：沿用未来事件抽取的提示词逐条抽取，返回 [(record_id, event_data)]
+def extract_events_only(records, current_time):
+    event_results = []
+    for (record_id, _), event_data, error in llm_gateway.run_deferred(records, lambda record: events.extract_events(record[0], record[1], current_time)):
+        if error is None:
+            event_results.append((record_id, event_data))
+        else:
+            RECORDS_PROCESSED.labels(events.METRICS_STAGE, 'failed').inc()
+            logging.warning(f"记录 {record_id} 未来事件抽取失败 ({error})，状态保持 'unprocessed'")
+    return event_results
+
+
+# 在线程池中执行的一批请求，kind 为 combined（两项都缺）、scores（只缺评分）或 events（只缺事件）
+def run_job(kind, chunk, current_time):
+    if kind == 'combined':
+        return analyze_records(chunk, current_time)
+    if kind == 'scores':
+        return hotspot.get_scoring_backend().score_remote(chunk), []
+    return {}, extract_events_only(chunk, current_time)
+
+
+# 查询记录各自还缺哪项结果，返回 (待评分 id 集合, 待抽取 id 集合)
+def fetch_pending_parts(cursor, news_ids):
+    news_ids = list(news_ids)
+    if not news_ids:
+        return set(), set()
+    cursor.execute(f"""
+        SELECT id, hotspot_level IS NULL, future_event_status = 'unprocessed'
+        FROM perception_cls_news
+        WHERE id IN ({', '.join(['%s'] * len(news_ids))})
+    """, news_ids)
+    need_scores, need_events = set(), set()
+    for record_id, scores_pending, events_pending in cursor.fetchall():
+        if scores_pending:
+            need_scores.add(record_id)
+        if events_pending:
+            need_events.add(record_id)
+    return need_scores, need_events
+
+
+# 按标签跳过：一次查询标签，两项结果按各自的跳过规则一并写入，从 need_scores/need_events 中移除已跳过的记录
+def skip_tagged_records(cursor, records, need_scores, need_events):
+    tags_by_id = hotspot.get_subject_tags_batch(cursor, [record_id for record_id, _ in records])
+    score_skip_ids = [record_id for record_id, _ in records
+                      if record_id in need_scores and hotspot.should_skip_processing(tags_by_id[record_id])]
+    if score_skip_ids:
+        # 只写入仍待评分的记录，已由其他进程评分的不再累加热度汇总
+        open_ids = hotspot.lock_pending_ids(cursor, score_skip_ids)
+        need_scores.difference_update(score_skip_ids)
+        score_skip_ids = [record_id for record_id in score_skip_ids if record_id in open_ids]
+    event_skip_ids = [record_id for record_id, _ in records
+                      if record_id in need_events and events.should_skip_processing(tags_by_id[record_id])]
+
+    if score_skip_ids:
+        cursor.execute(f"""
+            UPDATE perception_cls_news
+            SET hotspot_level = 0, feature_scores = NULL, processed_at = %s
+            WHERE id IN ({', '.join(['%s'] * len(score_skip_ids))})
+        """, (datetime.now(), *score_skip_ids))
+        hotspot.update_rollups(cursor, score_skip_ids)
+        RECORDS_PROCESSED.labels(hotspot.METRICS_STAGE, 'skipped').inc(len(score_skip_ids))
+    if event_skip_ids:
+        cursor.execute(f"""
+            UPDATE perception_cls_news
+            SET future_event_status = 'skipped'
+            WHERE id IN ({', '.join(['%s'] * len(event_skip_ids))})
+        """, event_skip_ids)
+        RECORDS_PROCESSED.labels(events.METRICS_STAGE, 'skipped').inc(len(event_skip_ids))
+        need_events.difference_update(event_skip_ids)
+    if score_skip_ids or event_skip_ids:
+        logging.info(f"按标签跳过: 热度评分 {len(score_skip_ids)} 条，未来事件抽取 {len(event_skip_ids)} 条 (id: {sorted(set(score_skip_ids) | set(event_skip_ids))})")
+
+
+# 在一个事务内写入一批结果：锁定仍待评分的记录写入评分并累加热度汇总，再写入未来事件（同样只写仍未处理的记录）
+# 返回 (已写入评分的 id 列表, 已写入事件的 id 集合)
+def save_combined_results(conn, cursor, chunk, score_results, event_results):
+    ids = [record_id for record_id, _ in chunk]
+    try:
+        cursor.execute(f"""
+            SELECT id FROM perception_cls_news
+            WHERE {hotspot.PENDING_CONDITION} AND id IN ({', '.join(['%s'] * len(ids))})
+            FOR UPDATE
+        """, ids)
+        open_ids = {row[0] for row in cursor.fetchall()}
+        scored_ids = []
+        for record_id in ids:
+            if record_id in open_ids and record_id in score_results:
+                if hotspot.apply_score_result(cursor, record_id, score_results[record_id]):
+                    scored_ids.append(record_id)
+        hotspot.update_rollups(cursor, scored_ids)
+        saved_event_ids = events.write_extraction_results(cursor, event_results)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return scored_ids, saved_event_ids
+
+
+# 写入一批结果，整批失败时逐条写入；写入成功的记录加入两个模块各自的近重复索引
+def apply_results(conn, cursor, chunk, score_results, event_results):
+    try:
+        scored_ids, saved_event_ids = save_combined_results(conn, cursor, chunk, score_results, event_results)
+    except Exception as e:
+        logging.error(f"批量写入 {len(chunk)} 条分析结果失败: {e}，改为逐条写入")
+        scored_ids, saved_event_ids = [], set()
+        for record in chunk:
+            record_id = record[0]
+            try:
+                record_scored, record_saved = save_combined_results(
+                    conn, cursor, [record],
+                    {record_id: score_results[record_id]} if record_id in score_results else {},
+                    [item for item in event_results if item[0] == record_id]
+                )
+            except Exception as record_error:
+                logging.error(f"记录 {record_id} 写入失败: {record_error}，保持待处理")
+                continue
+            scored_ids.extend(record_scored)
+            saved_event_ids |= record_saved
+
+    contents = dict(chunk)
+    for record_id in scored_ids:
+        hotspot.near_dup_index.add(record_id, contents[record_id])
+    for record_id, event_data in event_results:
+        if record_id in saved_event_ids:
+            events.near_dup_index.add(record_id, contents[record_id])
+            events.record_extraction_outcome(record_id, event_data)
+    RECORDS_PROCESSED.labels(METRICS_STAGE, 'saved').inc(len(set(scored_ids) | saved_event_ids))
+
+
+# 处理一批已认领的记录：标签跳过、预评分、近重复继承、时间表达预过滤与本地模型评分在当前线程完成，
+# 其余按缺少的结果分组提交到线程池（两项都缺的合并为一次请求），数据库写入和提交只在当前线程进行
+def process_records(conn, cursor, records, current_time, max_workers=ANALYSIS_CONCURRENCY, batch_size=ANALYSIS_BATCH_SIZE):
+    need_scores, need_events = fetch_pending_parts(cursor, [record_id for record_id, _ in records])
+    skip_tagged_records(cursor, records, need_scores, need_events)
+    score_records = hotspot.prescore_zero_records(cursor, [record for record in records if record[0] in need_scores])
+    score_records = hotspot.inherit_duplicate_scores(cursor, score_records)
+    event_records = events.inherit_duplicate_events(cursor, [record for record in records if record[0] in need_events])
+    event_records = events.prefilter_timeless_records(cursor, event_records)
+    conn.commit()
+
+    backend = hotspot.get_scoring_backend()
+    local_results, score_records = backend.score_local(score_records)
+    if local_results:
+        apply_results(conn, cursor, [record for record in records if record[0] in local_results], local_results, [])
+
+    score_ids = {record_id for record_id, _ in score_records}
+    event_ids = {record_id for record_id, _ in event_records}
+    jobs = [
+        ('combined', [record for record in score_records if record[0] in event_ids]),
+        ('scores', [record for record in score_records if record[0] not in event_ids]),
+        ('events', [record for record in event_records if record[0] not in score_ids]),
+    ]
+    logging.info("合并分析: " + "，".join(f"{kind} {len(kind_records)} 条" for kind, kind_records in jobs))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for kind, kind_records in jobs:
+            for chunk in hotspot.chunk_records(kind_records, batch_size):
+                futures[executor.submit(run_job, kind, chunk, current_time)] = chunk
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = futures.pop(future)
+                score_results, event_results = future.result()
+                apply_results(conn, cursor, chunk, score_results, event_results)
+
+
+# 检查并创建两项结果写入依赖的表与租约字段
+def ensure_tables(conn, cursor):
+    hotspot.ensure_tables(cursor)
+    events.ensure_future_events_table(conn, cursor)
+    events.ensure_lease_columns(cursor)
+
+
+# 认领并处理待处理记录；exit_when_empty 为 False 时常驻等待新记录与过期租约
+# 与未来事件抽取 worker 共用租约字段，同时运行时不会重复处理同一条记录
+def process_news_data(exit_when_empty=True, max_workers=ANALYSIS_CONCURRENCY, batch_size=ANALYSIS_BATCH_SIZE):
+    worker_id = events.make_worker_id()
+    processed_count = 0
+    try:
+        conn = instrument_connection(mysql.connector.connect(**hotspot.db_config))
+        cursor = conn.cursor()
+        ensure_tables(conn, cursor)
+
+        pending_count = update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+        logging.info(f"合并分析开始，当前 {pending_count} 条待处理记录")
+
+        while True:
+            records = events.claim_records(conn, cursor, worker_id, CLAIM_SIZE, condition=PENDING_CONDITION)
+            if not records:
+                if exit_when_empty:
+                    break
+                update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+                time.sleep(IDLE_SECONDS)
+                continue
+
+            current_time = datetime.now().strftime("%Y年%m月%d日")
+            process_records(conn, cursor, records, current_time, max_workers, batch_size)
+            processed_count += len(records)
+            logging.info(f"合并分析已处理 {processed_count} 条记录")
+
+        logging.info(f"没有待处理的记录，本次共处理 {processed_count} 条记录")
+        llm_cache.log_stats()
+
+    except mysql.connector.Error as db_err:
+        logging.error(f"数据库错误: {db_err}")
+    except Exception as e:
+        logging.error(f"未知错误: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+
+# 定时任务（带重启逻辑）
+def run_scheduler():
+    while True:
+        try:
+            schedule.every(5).minutes.do(process_news_data)
+            logging.info("定时任务已启动，每5分钟运行一次")
+            while True:
+                schedule.run_pending()
+                time.sleep(60)
+        except Exception as e:
+            logging.error(f"定时任务崩溃: {e}，将在5秒后重启")
+            time.sleep(5)
+
+
+# 持续模式（带重启逻辑）
+def run_drain(max_workers=ANALYSIS_CONCURRENCY, batch_size=ANALYSIS_BATCH_SIZE):
+    while True:
+        process_news_data(False, max_workers, batch_size)
+        logging.error("持续合并分析模式中断，将在5秒后重启")
+        time.sleep(5)
+
+
+if __name__ == "__main__":
+    # python combined_analysis.py：先处理全部待处理记录，然后每5分钟运行一次
+    # python combined_analysis.py drain [并发数] [每请求条数]：常驻认领并处理待处理记录
+    logging.basicConfig(
+        filename='/var/log/combined_analysis.log',
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        force=True
+    )
+    share_gateway()
+    start_metrics_server(COMBINED_METRICS_PORT)
+    if len(sys.argv) > 1 and sys.argv[1] == "drain":
+        concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else ANALYSIS_CONCURRENCY
+        batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else ANALYSIS_BATCH_SIZE
+        logging.info(f"脚本启动，drain 模式，并发数 {concurrency}，每请求 {batch_size} 条")
+        run_drain(concurrency, batch_size)
+    else:
+        logging.info("脚本启动，处理所有待处理数据")
+        process_news_data()
+        run_scheduler()
@@ -0,0 +1,22 @@
+import logging
+
+# 辅助脚本（热度汇总、归档、计数曲线、本地模型训练与评估等）和前端读取服务共用的数据库配置
+# 只依赖本模块，不会引入热度计算模块的日志文件、OpenAI 客户端、LLM 缓存与网关
+db_config = {
+    'host': '****',     # 只写 IP 地址或域名
+    'port': 3306,       # 端口号单独指定，默认为 3306
+    'user': '****',     # 替换为你的 MySQL 用户名
+    'password': '****', # 替换为你的 MySQL 密码
+    'database': '****'  # 替换为你的数据库名
+}
+
+# 前端只读数据库配置（建议改为只读账号或只读从库）
+read_db_config = dict(db_config)
+
+
+# 辅助脚本命令行运行时的日志配置：输出到终端
+def setup_cli_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
@@ -1,8 +1,15 @@
+import sys
+import sqlite3
 import requests
 import time
 import json
-import mysql.connector
-from mysql.connector import Error
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from mysql.connector import Error, pooling
+from news_queue import NewsQueue
+from engagement_tracker import EngagementTracker, ensure_engagement_table
+from metrics import CRAWLER_METRICS_PORT, http_get, instrument_connection, start_metrics_server
 
 # MySQL 数据库配置
 db_config = {
@@ -31,11 +38,61 @@ headers = {
 url = "https://www.cls.cn/nodeapi/telegraphList"
 last_time = int(time.time())  # 初始时间戳
 
+# 数据库连接池配置（连接池在整个轮询周期内复用）
+DB_POOL_SIZE = 2
+BULK_CHUNK_SIZE = 500  # 批量写入时每条 SQL 最多包含的新闻条数
+db_pool = None
 
+# 翻页与轮询配置
+PAGE_SIZE = 20               # 每页条数
+REQUEST_TIMEOUT = 15         # 单次请求超时（秒）
+PAGE_REQUEST_DELAY = 1       # 连续翻页之间的间隔（秒），避免请求过密
+MAX_PAGES_PER_POLL = 50      # 单次轮询最多翻页数
+MIN_POLL_INTERVAL = 30       # 最短轮询间隔（秒）
+MAX_POLL_INTERVAL = 300      # 最长轮询间隔（秒），即原来的 5 分钟
+TARGET_ITEMS_PER_POLL = 10   # 期望每次轮询拉到的新数据条数（半页，留出余量）
+RATE_SMOOTHING = 0.3         # 新闻速率指数平滑系数
+
+# HTTP 连接配置：各分类共用一个带连接池的 Session，保持长连接
+HTTP_POOL_SIZE = 8           # 连接池大小，不小于同时抓取的分类数
+http_session = None
+request_limiter = None       # 由多数据源调度设置的请求限速（llm_client.TokenBucket），为 None 时不限速
+
+# 同时轮询的电报分类（"" 为全部，其余与网页端电报页的分类标签一致），各分类的结果按 id 合并去重后一次写库
+TELEGRAPH_CATEGORIES = ["", "red", "announcement", "watch", "hk_us", "fund", "remind"]
+category_cursors = {}        # 分类 -> 该分类已写库的最新 ctime，翻页到此为止（写库成功后才前移）
+category_gaps = {}           # 分类 -> (下界 ctime, 上界 ctime)：翻页达到上限后尚未抓取的区间，后续轮询继续向前补齐
+
+# 变更检测配置
+CHANGE_CACHE_SIZE = 20000        # LRU 最多记录的新闻条数
+CHANGE_CACHE_WARM_ROWS = 5000    # 启动时从库中预热的最新新闻条数
+change_detector = None
+
+# 新增或内容变更的新闻 id 发布到本地队列，热度计算与未来事件抽取即时消费
+news_queue = NewsQueue()
+
+# 计数跟踪：记录每次抓到的阅读/评论/分享数形成时间序列，并在请求预算内按优先级刷新近期新闻的计数
+ENGAGEMENT_TRACKING = True
+engagement_tracker = None
+
+# 新闻 id 空间：财联社沿用电报原 id（远低于该值），其他数据源的新闻 id 从该值起分配（见 news_sources.py）
+EXTERNAL_ID_BASE = 1500000000
+
+NEWS_COLUMNS = ['id', 'ctime', 'content', 'level', 'reading_num', 'comment_num', 'share_num', 'modified_time']
+
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        db_pool = pooling.MySQLConnectionPool(pool_name="crawler_cls", pool_size=DB_POOL_SIZE, **db_config)
+    return db_pool
+
+
+# 从连接池取连接，conn.close() 会把连接归还连接池
 def connect_db():
     try:
-        conn = mysql.connector.connect(**db_config)
-        return conn
+        conn = get_db_pool().get_connection()
+        return instrument_connection(conn)
     except Error as e:
         print(f"数据库连接失败: {e}")
         return None
@@ -92,58 +149,488 @@ def save_to_db(conn, roll_data):
         cursor.close()
 
 
-def main():
-    global last_time
-    while True:
-        # 每次请求使用当前时间戳
-        last_time = int(time.time())
-
-        params = {
-            "app": "CailianpressWeb",
-            "category": "",
-            "lastTime": str(last_time),
-            "os": "web",
-            "refresh_type": "1",
-            "rn": "20",
-            "sv": "8.4.6",
-            "sign": "fa815d0472341bb06d8aec7892c30273"
-        }
+# 批量写入：整页数据一次多行 upsert，一次 DELETE 和一次多行 INSERT 替换主题
+def save_to_db_bulk(conn, roll_data):
+    # 同一页内重复的 id 只保留最后一条
+    entries = list({entry['id']: entry for entry in roll_data}.values())
+    if not entries:
+        return 0
+
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(entries), BULK_CHUNK_SIZE):
+            chunk = entries[start:start + BULK_CHUNK_SIZE]
+            news_ids = [entry['id'] for entry in chunk]
+
+            row_placeholder = "(" + ", ".join(["%s"] * len(NEWS_COLUMNS)) + ")"
+            news_query = f"""
+                INSERT INTO perception_cls_news ({', '.join(NEWS_COLUMNS)})
+                VALUES {', '.join([row_placeholder] * len(chunk))}
+                ON DUPLICATE KEY UPDATE
+                    ctime = VALUES(ctime),
+                    content = VALUES(content),
+                    level = VALUES(level),
+                    reading_num = VALUES(reading_num),
+                    comment_num = VALUES(comment_num),
+                    share_num = VALUES(share_num),
+                    modified_time = VALUES(modified_time),
+                    insert_time = CURRENT_TIMESTAMP
+            """
+            cursor.execute(news_query, [entry[column] for entry in chunk for column in NEWS_COLUMNS])
+
+            delete_subjects_query = f"""
+                DELETE FROM perception_cls_news_subjects
+                WHERE news_id IN ({', '.join(['%s'] * len(news_ids))})
+            """
+            cursor.execute(delete_subjects_query, news_ids)
+
+            subject_rows = [
+                (entry['id'], subject['subject_id'], subject['subject_name'])
+                for entry in chunk
+                for subject in entry.get('subjects') or []
+            ]
+            if subject_rows:
+                subjects_query = f"""
+                    INSERT INTO perception_cls_news_subjects (news_id, subject_id, subject_name)
+                    VALUES {', '.join(['(%s, %s, %s)'] * len(subject_rows))}
+                """
+                cursor.execute(subjects_query, [value for row in subject_rows for value in row])
+
+        conn.commit()
+        print(f"成功批量保存 {len(entries)} 条数据到数据库")
+        return len(entries)
+    except Error as e:
+        print(f"数据库操作失败: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        cursor.close()
+
+
+# 仅计数变化时用一条 UPDATE ... CASE 批量更新阅读/评论/分享数，不重写主题、不重置 insert_time
+def update_counters_bulk(conn, entries):
+    if not entries:
+        return 0
+    cursor = conn.cursor()
+    try:
+        news_ids = [entry['id'] for entry in entries]
+        set_clauses = []
+        params = []
+        for column in ('reading_num', 'comment_num', 'share_num'):
+            set_clauses.append(f"{column} = CASE id {' '.join(['WHEN %s THEN %s'] * len(entries))} END")
+            for entry in entries:
+                params.extend([entry['id'], entry[column]])
+        params.extend(news_ids)
+        cursor.execute(f"""
+            UPDATE perception_cls_news
+            SET {', '.join(set_clauses)}
+            WHERE id IN ({', '.join(['%s'] * len(news_ids))})
+        """, params)
+        conn.commit()
+        return len(entries)
+    except Error as e:
+        print(f"数据库操作失败: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        cursor.close()
+
+
+def counters_hash(entry):
+    return hash((entry['reading_num'], entry['comment_num'], entry['share_num']))
+
+
+# 变更检测：进程内 LRU 记录 id -> (modified_time, 计数哈希)，只写入新增或真正变化的条目
+class ChangeDetector:
+    def __init__(self, max_size=CHANGE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    # 从库中预热最新的 limit 条记录
+    def warm(self, conn, limit=CHANGE_CACHE_WARM_ROWS):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, modified_time, reading_num, comment_num, share_num
+                FROM perception_cls_news
+                ORDER BY ctime DESC
+                LIMIT %s
+            """, (limit,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        # 逆序写入，保证最新的记录在 LRU 尾部
+        for news_id, modified_time, reading_num, comment_num, share_num in reversed(rows):
+            self._put(news_id, (modified_time, hash((reading_num, comment_num, share_num))))
+        print(f"变更检测缓存已预热 {len(rows)} 条")
+
+    def _put(self, news_id, state):
+        self.entries[news_id] = state
+        self.entries.move_to_end(news_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    # 返回 'new' / 'modified' / 'counters' / 'unchanged'
+    def classify(self, entry):
+        state = self.entries.get(entry['id'])
+        if state is None:
+            return 'new'
+        self.entries.move_to_end(entry['id'])
+        modified_time, cached_counters = state
+        if entry['modified_time'] != modified_time:
+            return 'modified'
+        if counters_hash(entry) != cached_counters:
+            return 'counters'
+        return 'unchanged'
+
+    # 按类别分组
+    def split(self, roll_data):
+        groups = {'new': [], 'modified': [], 'counters': [], 'unchanged': []}
+        for entry in roll_data:
+            groups[self.classify(entry)].append(entry)
+        return groups
+
+    # 写库成功后记录最新状态
+    def remember(self, entries):
+        for entry in entries:
+            self._put(entry['id'], (entry['modified_time'], counters_hash(entry)))
 
+
+# 发布新增/变更的新闻到本地队列，失败不影响爬取
+def publish_changes(entries):
+    try:
+        news_queue.publish((entry['id'], entry['ctime']) for entry in entries)
+    except sqlite3.Error as e:
+        print(f"发布到本地队列失败: {e}")
+
+
+# 共用的 HTTP Session：请求头只设置一次，连接池在轮询周期之间和各分类线程之间复用
+def get_http_session():
+    global http_session
+    if http_session is None:
+        http_session = requests.Session()
+        http_session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        http_session.mount("https://", adapter)
+        http_session.mount("http://", adapter)
+    return http_session
+
+
+# 请求一页电报：返回 lastTime 之前（不晚于 lastTime）的最多 rn 条，接口报错时返回 None
+def fetch_page(page_last_time, rn=PAGE_SIZE, category=""):
+    params = {
+        "app": "CailianpressWeb",
+        "category": category,
+        "lastTime": str(page_last_time),
+        "os": "web",
+        "refresh_type": "1",
+        "rn": str(rn),
+        "sv": "8.4.6",
+        "sign": "fa815d0472341bb06d8aec7892c30273"
+    }
+    if request_limiter is not None:
+        request_limiter.acquire()
+    response = http_get('telegraphList', url, session=get_http_session(), params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    json_data = response.json()
+    if json_data.get("error") != 0:
+        print(f"请求错误: {json_data}")
+        return None
+    return json_data["data"]["roll_data"]
+
+
+# 查询库中财联社新闻的最新 ctime（不含其他数据源），空表返回 None
+def get_latest_stored_ctime(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT ctime FROM perception_cls_news WHERE id < %s ORDER BY ctime DESC LIMIT 1",
+            (EXTERNAL_ID_BASE,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+# 从 start_time 开始以已收到的最早 ctime 为游标向前翻页，直到覆盖 stop_ctime（库中最新 ctime）
+# stop_ctime 为 None（空表）时只取第一页；返回 (按 id 去重的结果, 缺口)
+# 达到翻页上限时缺口为尚未抓取的区间 (stop_ctime, 最后的翻页游标)，否则为 None
+def fetch_since(stop_ctime, start_time=None, max_pages=MAX_PAGES_PER_POLL, category=""):
+    page_cursor = start_time or int(time.time())
+    collected = {}
+    gap = None
+    for page_no in range(max_pages):
+        roll_data = fetch_page(page_cursor, category=category)
+        if not roll_data:
+            break
+        for entry in roll_data:
+            collected[entry['id']] = entry
+
+        oldest_ctime = min(entry['ctime'] for entry in roll_data)
+        if stop_ctime is None or oldest_ctime <= stop_ctime:
+            break
+        if oldest_ctime >= page_cursor:
+            # 同一秒内的电报超过一页时游标无法前进，避免死循环
+            print(f"翻页游标未前进 (ctime: {oldest_ctime})，停止翻页")
+            break
+        page_cursor = oldest_ctime
+        time.sleep(PAGE_REQUEST_DELAY)
+    else:
+        gap = (stop_ctime, page_cursor)
+        print(f"已达到单次轮询翻页上限 {max_pages} 页，区间 {gap} 将在后续轮询中补齐")
+    return list(collected.values()), gap
+
+
+# 并发轮询所有分类：每个分类在独立线程中从 start_time 向前翻页到该分类已写库的最新 ctime（首次为库中最新 ctime），
+# 有未补齐的缺口时再从缺口上界向前翻页；单个分类请求失败不影响其他分类
+# 返回 (按 id 合并去重的结果, {分类: (本次收到的最新 ctime, 剩余缺口)})
+# 分类游标与缺口不在这里更新，调用方写库成功后调用 commit_category_cursors，写库失败时下次轮询重新抓取这些条目
+def fetch_all_categories(stop_ctime, start_time=None, categories=None):
+    categories = TELEGRAPH_CATEGORIES if categories is None else categories
+
+    def fetch_category(category):
+        old_gap = category_gaps.get(category)
         try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            json_data = response.json()
-
-            if json_data.get("error") == 0:
-                roll_data = json_data["data"]["roll_data"]
-                if roll_data:
-                    # 调试：打印所有 ctime，检查数据顺序
-                    ctimes = [entry["ctime"] for entry in roll_data]
-                    print(f"所有 ctime: {ctimes}")
-
-                    # 获取最新的条目（最大 ctime）
-                    latest_entry = max(roll_data, key=lambda x: x["ctime"])
-                    print(f"请求时间戳: {last_time}")
-                    print(f"最新条目 (ctime: {latest_entry['ctime']}): {latest_entry['content']}")
-
-                    conn = connect_db()
-                    if conn:
-                        save_to_db(conn, roll_data)
-                        conn.close()
-
-                    # 不更新 last_time，保持每次用当前时间
-                    print(f"更新后的 last_time: {last_time}")
+            roll_data, gap = fetch_since(category_cursors.get(category, stop_ctime), start_time, category=category)
+            if old_gap:
+                gap_data, rest = fetch_since(old_gap[0], old_gap[1], category=category)
+                roll_data += gap_data
+                # 新旧缺口同时存在时合并为一个区间，中间已写库的部分重新抓取后由写库去重
+                if rest and gap:
+                    gap = (rest[0], gap[1])
                 else:
-                    print("无新数据返回")
-            else:
-                print(f"请求错误: {json_data}")
+                    gap = gap or rest
+        except requests.exceptions.RequestException as e:
+            print(f"分类 '{category or '全部'}' 请求失败: {e}")
+            return None
+        return roll_data, gap
+
+    collected = {}
+    progress = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(categories))) as executor:
+        for category, result in zip(categories, executor.map(fetch_category, categories)):
+            if result is None:
+                continue
+            roll_data, gap = result
+            newest = max((entry['ctime'] for entry in roll_data), default=None)
+            progress[category] = (newest, gap)
+            for entry in roll_data:
+                collected[entry['id']] = entry
+    return list(collected.values()), progress
+
+
+# 写库成功后前移分类游标并更新缺口
+def commit_category_cursors(progress):
+    for category, (newest, gap) in progress.items():
+        if newest is not None:
+            category_cursors[category] = max(newest, category_cursors.get(category, newest))
+        if gap:
+            category_gaps[category] = gap
+        else:
+            category_gaps.pop(category, None)
 
-            time.sleep(300)  # 5 分钟间隔
 
+# 补采模式：从 end_ts 向前翻页到 start_ts，每页立即写库
+def backfill(start_ts, end_ts):
+    page_cursor = end_ts
+    total = 0
+    while page_cursor > start_ts:
+        try:
+            roll_data = fetch_page(page_cursor)
+        except requests.exceptions.RequestException as e:
+            print(f"补采请求失败: {e}，{PAGE_REQUEST_DELAY * 10} 秒后重试")
+            time.sleep(PAGE_REQUEST_DELAY * 10)
+            continue
+        if not roll_data:
+            break
+
+        in_range = [entry for entry in roll_data if start_ts <= entry['ctime'] <= end_ts]
+        if in_range:
+            conn = connect_db()
+            if conn:
+                total += save_to_db_bulk(conn, in_range)
+                conn.close()
+
+        oldest_ctime = min(entry['ctime'] for entry in roll_data)
+        print(f"补采进度: 已到 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(oldest_ctime))}，累计 {total} 条")
+        if oldest_ctime >= page_cursor:
+            print(f"翻页游标未前进 (ctime: {oldest_ctime})，停止补采")
+            break
+        page_cursor = oldest_ctime
+        time.sleep(PAGE_REQUEST_DELAY)
+    print(f"补采完成，共保存 {total} 条数据")
+    return total
+
+
+# 自适应轮询间隔：按平滑后的新闻速率，使每次轮询约拉到 TARGET_ITEMS_PER_POLL 条新数据
+def next_poll_interval(news_rate):
+    if news_rate <= 0:
+        return MAX_POLL_INTERVAL
+    interval = TARGET_ITEMS_PER_POLL / news_rate
+    return int(min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, interval)))
+
+
+# 执行一次轮询，返回本次新增（ctime 晚于库中最新 ctime）的条数
+def poll_once():
+    global last_time
+    # 每次请求使用当前时间戳
+    last_time = int(time.time())
+
+    conn = connect_db()
+    if not conn:
+        return 0
+    try:
+        stop_ctime = get_latest_stored_ctime(conn)
+        roll_data, newest = fetch_all_categories(stop_ctime, last_time)
+        if not roll_data:
+            print("无新数据返回")
+            return 0
+
+        # 调试：打印所有 ctime，检查数据顺序
+        ctimes = [entry["ctime"] for entry in roll_data]
+        print(f"所有 ctime: {ctimes}")
+
+        # 获取最新的条目（最大 ctime）
+        latest_entry = max(roll_data, key=lambda x: x["ctime"])
+        print(f"请求时间戳: {last_time}")
+        print(f"最新条目 (ctime: {latest_entry['ctime']}): {latest_entry['content']}")
+
+        if store_entries(conn, roll_data):
+            commit_category_cursors(newest)
+        else:
+            print("写库失败，分类游标保持不变，下次轮询重新抓取")
+        return sum(1 for entry in roll_data if stop_ctime is None or entry['ctime'] > stop_ctime)
+    finally:
+        conn.close()
+
+
+# 写入抓取到的条目（轮询与计数刷新共用）：经变更检测只写入新增、变更或仅计数变化的条目，并记录计数序列
+# 返回新增与内容变更的条目是否全部写入（仅计数更新失败不影响返回值，下次抓取时仍会更新）
+def store_entries(conn, roll_data):
+    saved = True
+    if change_detector is None:
+        if save_to_db_bulk(conn, roll_data):
+            publish_changes(roll_data)
+        else:
+            saved = not roll_data
+    else:
+        groups = change_detector.split(roll_data)
+        changed = groups['new'] + groups['modified']
+        if changed and save_to_db_bulk(conn, changed) == len(changed):
+            change_detector.remember(changed)
+            publish_changes(changed)
+        elif changed:
+            saved = False
+        if groups['counters'] and update_counters_bulk(conn, groups['counters']):
+            change_detector.remember(groups['counters'])
+        written = len(changed) + len(groups['counters'])
+        print(
+            f"变更检测: 新增 {len(groups['new'])}，内容变更 {len(groups['modified'])}，"
+            f"仅计数变更 {len(groups['counters'])}，未变化 {len(groups['unchanged'])}，"
+            f"写入比例 {written / len(roll_data):.0%}"
+        )
+    if engagement_tracker is not None:
+        # 其他数据源的条目无法按电报页刷新，不纳入计数跟踪
+        engagement_tracker.observe([entry for entry in roll_data if entry.get('source', 'cls') == 'cls'])
+        engagement_tracker.flush(conn)
+    return saved
+
+
+# 在请求预算内刷新近期新闻的计数（以目标新闻的 ctime 为锚点请求一页），结果按轮询数据写入
+def refresh_engagement():
+    if engagement_tracker is None:
+        return 0
+    entries = engagement_tracker.refresh()
+    if not entries:
+        return 0
+    conn = connect_db()
+    if not conn:
+        return 0
+    try:
+        store_entries(conn, entries)
+    finally:
+        conn.close()
+    return len(entries)
+
+
+# 启动时创建计数跟踪并从库中加载跟踪期内的序列
+def init_engagement_tracker():
+    global engagement_tracker
+    if not ENGAGEMENT_TRACKING:
+        return
+    engagement_tracker = EngagementTracker(fetch_page, request_delay=PAGE_REQUEST_DELAY, max_news_id=EXTERNAL_ID_BASE)
+    conn = connect_db()
+    if conn:
+        try:
+            cursor = conn.cursor()
+            ensure_engagement_table(cursor)
+            cursor.close()
+            engagement_tracker.warm(conn)
+        except Error as e:
+            print(f"计数跟踪加载失败: {e}")
+        finally:
+            conn.close()
+
+
+# 启动时创建变更检测缓存并从库中预热
+def init_change_detector():
+    global change_detector
+    change_detector = ChangeDetector()
+    conn = connect_db()
+    if conn:
+        try:
+            change_detector.warm(conn)
+        except Error as e:
+            print(f"变更检测缓存预热失败: {e}")
+        finally:
+            conn.close()
+
+
+def main():
+    init_change_detector()
+    init_engagement_tracker()
+    news_rate = 0.0              # 平滑后的新闻速率（条/秒）
+    last_poll = time.time()
+    while True:
+        try:
+            new_count = poll_once()
         except requests.exceptions.RequestException as e:
             print(f"请求失败: {e}")
-            time.sleep(300)
+            new_count = 0
+        except Error as e:
+            # 数据库暂时不可用时跳过本轮，分类游标未提交，下次轮询重新抓取
+            print(f"轮询读写数据库失败: {e}")
+            new_count = 0
+        try:
+            refresh_engagement()
+        except requests.exceptions.RequestException as e:
+            print(f"计数刷新请求失败: {e}")
+        except Error as e:
+            print(f"计数刷新写库失败: {e}")
+
+        now = time.time()
+        elapsed = max(now - last_poll, 1)
+        last_poll = now
+        news_rate = RATE_SMOOTHING * (new_count / elapsed) + (1 - RATE_SMOOTHING) * news_rate
+        interval = next_poll_interval(news_rate)
+        print(f"本次新增 {new_count} 条，新闻速率 {news_rate * 60:.2f} 条/分钟，{interval} 秒后再次轮询")
+        time.sleep(interval)
+
+
+# 解析时间参数：支持 Unix 时间戳或 "YYYY-MM-DD[ HH:MM:SS]"
+def parse_time_arg(value):
+    if value.isdigit():
+        return int(value)
+    fmt = "%Y-%m-%d %H:%M:%S" if " " in value else "%Y-%m-%d"
+    return int(time.mktime(time.strptime(value, fmt)))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    start_metrics_server(CRAWLER_METRICS_PORT)
+    # python crawler_cls.py backfill <开始时间> [结束时间]：补采指定时间段
+    if len(sys.argv) > 2 and sys.argv[1] == "backfill":
+        end = parse_time_arg(sys.argv[3]) if len(sys.argv) > 3 else int(time.time())
+        backfill(parse_time_arg(sys.argv[2]), end)
+    else:
+        main()
@@ -0,0 +1,303 @@
+import sys
+import time
+from array import array
+
+from mysql.connector import Error
+
+# 阅读/评论/分享数的时间序列：每条新闻一个序列，内存中以 array 存储相邻采样的差值，库中以 zigzag varint 编码的 BLOB 保存
+# 刷新调度：在固定的请求预算内优先重新抓取发布不久、增长快的新闻，其余随发布时间衰减；
+# 电报接口没有按 id 查询的接口，刷新时以目标新闻的 ctime 为 lastTime 请求一页，一次请求同时刷新该页的约 20 条新闻
+ENGAGEMENT_TABLE = 'perception_news_engagement'
+COUNTER_COLUMNS = ('reading_num', 'comment_num', 'share_num')
+
+TRACK_MAX_AGE_HOURS = 72             # 发布超过该时长的新闻不再刷新
+REFRESH_REQUESTS_PER_HOUR = 360      # 刷新请求预算（次/小时），与正常轮询分开计算
+REFRESH_BURST = 20                   # 单次刷新最多使用的请求数
+MIN_REFRESH_SECONDS = 120            # 同一条新闻两次刷新的最短间隔（秒）
+RECENCY_HALF_LIFE_HOURS = 6          # 优先级随发布时长衰减的半衰期（小时）
+GROWTH_SCALE = 1000                  # 阅读增速（次/小时）达到该值时优先级翻倍
+GROWTH_SMOOTHING = 0.5               # 增速指数平滑系数
+MAX_MISSES = 3                       # 锚定页中连续找不到该新闻的次数达到该值后停止跟踪（新闻可能已删除）
+WARM_MAX_ROWS = 20000                # 启动时从库中加载的最多条数
+SAVE_CHUNK_SIZE = 500                # 每条 upsert 最多写入的序列数
+
+
+# zigzag varint 编码：差值可能为负（计数被修正），先映射为非负整数再按 7 位分组编码
+def encode_varints(values):
+    out = bytearray()
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+    return values
+
+
+# 单条新闻的计数序列：四个 array 依次保存每次采样相对上一次的时间差与三个计数的差值，首个采样相对 (ctime, 0, 0, 0)
+# 计数未变化的刷新不追加采样，只更新 last_checked
+class CounterSeries:
+    __slots__ = ('news_id', 'ctime', 'deltas', 'last', 'last_checked', 'growth', 'misses')
+
+    def __init__(self, news_id, ctime):
+        self.news_id = news_id
+        self.ctime = ctime
+        self.deltas = tuple(array('q') for _ in range(1 + len(COUNTER_COLUMNS)))
+        self.last = (ctime,) + (0,) * len(COUNTER_COLUMNS)   # 最后一次采样的 (时间, 阅读, 评论, 分享)
+        self.last_checked = 0
+        self.growth = 0.0                                    # 平滑后的阅读增速（次/小时）
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.deltas[0])
+
+    # 记录一次采样，计数有变化时追加并返回 True
+    def add(self, timestamp, counters):
+        self.last_checked = timestamp
+        self.misses = 0
+        if len(self) and tuple(counters) == self.last[1:]:
+            return False
+        sample = (timestamp,) + tuple(counters)
+        for column, (value, previous) in enumerate(zip(sample, self.last)):
+            self.deltas[column].append(value - previous)
+        if len(self) > 1:
+            hours = max(timestamp - self.last[0], 1) / 3600
+            rate = (counters[0] - self.last[1]) / hours
+            self.growth = GROWTH_SMOOTHING * rate + (1 - GROWTH_SMOOTHING) * self.growth
+        self.last = sample
+        return True
+
+    # 还原为 [(时间, 阅读, 评论, 分享)]
+    def samples(self):
+        current = [self.ctime] + [0] * len(COUNTER_COLUMNS)
+        result = []
+        for deltas in zip(*self.deltas):
+            current = [value + delta for value, delta in zip(current, deltas)]
+            result.append(tuple(current))
+        return result
+
+    # 按采样交错编码：dt, d阅读, d评论, d分享, dt, ...
+    def encode(self):
+        return encode_varints(value for deltas in zip(*self.deltas) for value in deltas)
+
+    @classmethod
+    def decode(cls, news_id, ctime, data, last_checked=0):
+        series = cls(news_id, ctime)
+        values = decode_varints(data)
+        width = len(series.deltas)
+        for start in range(0, len(values) - width + 1, width):
+            sample = [value + delta for value, delta in zip(series.last, values[start:start + width])]
+            series.add(sample[0], sample[1:])
+        series.last_checked = max(last_checked, series.last[0])
+        return series
+
+    # 刷新优先级：距上次刷新的时长 x (1 + 阅读增速 / GROWTH_SCALE) x 随发布时长按半衰期衰减
+    def priority(self, now):
+        age_hours = max(now - self.ctime, 0) / 3600
+        stale_hours = max(now - self.last_checked, 0) / 3600
+        return stale_hours * (1 + max(self.growth, 0) / GROWTH_SCALE) * 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+
+
+# 检查并创建计数序列表
+def ensure_engagement_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ENGAGEMENT_TABLE} (
+            news_id INT PRIMARY KEY,
+            ctime INT NOT NULL,
+            samples INT NOT NULL,
+            series BLOB NOT NULL,
+            last_checked INT NOT NULL,
+            reading_num INT,
+            comment_num INT,
+            share_num INT,
+            growth_per_hour FLOAT,
+            KEY idx_ctime (ctime)
+        )
+    """)
+
+
+# 写入一组序列（分段多行 upsert，整段 BLOB 覆盖）
+def save_series(cursor, series_list):
+    series_list = list(series_list)
+    for start in range(0, len(series_list), SAVE_CHUNK_SIZE):
+        save_series_chunk(cursor, series_list[start:start + SAVE_CHUNK_SIZE])
+
+
+def save_series_chunk(cursor, series_list):
+    cursor.execute(f"""
+        INSERT INTO {ENGAGEMENT_TABLE}
+            (news_id, ctime, samples, series, last_checked, reading_num, comment_num, share_num, growth_per_hour)
+        VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(series_list))}
+        ON DUPLICATE KEY UPDATE
+            samples = VALUES(samples), series = VALUES(series), last_checked = VALUES(last_checked),
+            reading_num = VALUES(reading_num), comment_num = VALUES(comment_num), share_num = VALUES(share_num),
+            growth_per_hour = VALUES(growth_per_hour)
+    """, [value for series in series_list for value in (
+        series.news_id, series.ctime, len(series), series.encode(), series.last_checked,
+        *series.last[1:], series.growth
+    )])
+
+
+# 读取一条新闻的计数曲线 [(时间, 阅读, 评论, 分享)]
+def engagement_curve(cursor, news_id):
+    cursor.execute(f"SELECT ctime, series FROM {ENGAGEMENT_TABLE} WHERE news_id = %s", (news_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return []
+    return CounterSeries.decode(news_id, row[0], row[1]).samples()
+
+
+# 活跃新闻的计数跟踪与刷新调度；fetch_page(lastTime) 为爬虫的单页请求函数
+class EngagementTracker:
+    def __init__(self, fetch_page, requests_per_hour=REFRESH_REQUESTS_PER_HOUR, burst=REFRESH_BURST,
+                 max_age_hours=TRACK_MAX_AGE_HOURS, request_delay=1, max_news_id=None):
+        self.fetch_page = fetch_page
+        self.max_news_id = max_news_id   # 只加载 id 小于该值的新闻（其他数据源的新闻无法按电报页刷新）
+        self.requests_per_hour = requests_per_hour
+        self.burst = burst
+        self.max_age = max_age_hours * 3600
+        self.request_delay = request_delay
+        self.active = {}                 # news_id -> CounterSeries
+        self.dirty = set()               # 有新采样、尚未写库的 news_id
+        self.allowance = float(burst)    # 可用的刷新请求数（令牌桶）
+        self.refilled_at = time.time()
+        self.requests_used = 0
+
+    # 从库中加载发布时间在跟踪期内的序列，没有序列的新闻以当前计数作为首个采样
+    def warm(self, conn, now=None):
+        now = int(now or time.time())
+        since = now - self.max_age
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT news_id, ctime, series, last_checked FROM {ENGAGEMENT_TABLE}
+                WHERE ctime >= %s ORDER BY ctime DESC LIMIT %s
+            """, (since, WARM_MAX_ROWS))
+            for news_id, ctime, data, last_checked in cursor.fetchall():
+                self.active[news_id] = CounterSeries.decode(news_id, ctime, data, last_checked)
+            id_condition = "AND id < %s" if self.max_news_id is not None else ""
+            id_params = (self.max_news_id,) if self.max_news_id is not None else ()
+            cursor.execute(f"""
+                SELECT id, ctime, {', '.join(COUNTER_COLUMNS)} FROM perception_cls_news
+                WHERE ctime >= %s {id_condition} ORDER BY ctime DESC LIMIT %s
+            """, (since, *id_params, WARM_MAX_ROWS))
+            entries = [dict(zip(('id', 'ctime') + COUNTER_COLUMNS, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        self.observe([entry for entry in entries if entry['id'] not in self.active], now)
+        print(f"计数跟踪已加载 {len(self.active)} 条新闻")
+
+    # 记录抓取到的条目（正常轮询与刷新都会调用），只跟踪发布时间在跟踪期内的新闻
+    def observe(self, entries, now=None):
+        now = int(now or time.time())
+        for entry in entries:
+            if now - entry['ctime'] > self.max_age:
+                continue
+            series = self.active.get(entry['id'])
+            if series is None:
+                series = self.active[entry['id']] = CounterSeries(entry['id'], entry['ctime'])
+            if series.add(now, [entry[column] or 0 for column in COUNTER_COLUMNS]):
+                self.dirty.add(entry['id'])
+
+    # 写入有变化的序列并移出超过跟踪期或多次找不到的新闻
+    def flush(self, conn, now=None):
+        now = int(now or time.time())
+        retired = [news_id for news_id, series in self.active.items()
+                   if now - series.ctime > self.max_age or series.misses >= MAX_MISSES]
+        to_save = [self.active[news_id] for news_id in self.dirty | set(retired) if news_id in self.active]
+        cursor = conn.cursor()
+        try:
+            save_series(cursor, to_save)
+            conn.commit()
+        except Error as e:
+            print(f"计数序列写入失败: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+        self.dirty.clear()
+        for news_id in retired:
+            del self.active[news_id]
+        return len(to_save)
+
+    def _refill(self, now):
+        self.allowance = min(self.burst, self.allowance + max(now - self.refilled_at, 0) * self.requests_per_hour / 3600)
+        self.refilled_at = now
+
+    # 按优先级刷新：优先级最高且本轮尚未被覆盖的新闻作为锚点请求一页，该页返回的条目全部记录，
+    # 直到用完请求预算或没有到达最短刷新间隔的新闻；返回本轮抓取到的条目（由爬虫写回新闻表）
+    def refresh(self, now=None):
+        now = now or time.time()
+        self._refill(now)
+        candidates = sorted(
+            (series for series in self.active.values() if now - series.last_checked >= MIN_REFRESH_SECONDS),
+            key=lambda series: series.priority(now), reverse=True
+        )
+        covered = set()
+        fetched = {}
+        requests_made = 0
+        for series in candidates:
+            if self.allowance < 1:
+                break
+            if series.news_id in covered:
+                continue
+            self.allowance -= 1
+            requests_made += 1
+            roll_data = self.fetch_page(series.ctime)
+            if roll_data is None:
+                break
+            for entry in roll_data:
+                fetched[entry['id']] = entry
+            covered.update(fetched)
+            if series.news_id not in fetched:
+                series.misses += 1
+                series.last_checked = int(now)
+            if self.request_delay:
+                time.sleep(self.request_delay)
+        self.requests_used += requests_made
+        entries = list(fetched.values())
+        self.observe(entries, now)
+        if requests_made:
+            print(f"计数刷新: {requests_made} 次请求刷新 {len(covered & set(self.active))} 条新闻，跟踪中 {len(self.active)} 条")
+        return entries
+
+
+if __name__ == "__main__":
+    # python engagement_tracker.py curve <news_id>：输出一条新闻的阅读/评论/分享数曲线
+    import mysql.connector
+    from config import db_config, setup_cli_logging
+    setup_cli_logging()
+    if len(sys.argv) > 2 and sys.argv[1] == "curve":
+        try:
+            conn = mysql.connector.connect(**db_config)
+            cursor = conn.cursor()
+            ensure_engagement_table(cursor)
+            previous = None
+            for timestamp, reading, comment, share in engagement_curve(cursor, int(sys.argv[2])):
+                rate = ""
+                if previous is not None:
+                    rate = f"  阅读增速 {(reading - previous[1]) / max(timestamp - previous[0], 1) * 3600:.0f}/小时"
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}  阅读 {reading}  评论 {comment}  分享 {share}{rate}")
+                previous = (timestamp, reading)
+        except Error as e:
+            print(f"数据库错误: {e}")
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+    else:
+        print("用法: python engagement_tracker.py curve <news_id>")
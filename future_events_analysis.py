@@ -1,10 +1,26 @@
+import os
+import sys
 import json
 import time
+import socket
+import hashlib
 import logging
+import multiprocessing
 from datetime import datetime
 import mysql.connector
+from mysql.connector import errorcode
 from openai import OpenAI
 import schedule
+from llm_cache import LLMResponseCache, prompt_fingerprint, dated_prompt_version, normalize_content
+from news_queue import NewsQueue, FUTURE_EVENTS_CONSUMER
+from near_duplicate import NearDuplicateIndex, ensure_duplicates_table, record_duplicate
+from metrics import (
+    FUTURE_EVENTS_METRICS_PORT, FUTURE_EVENTS_WORKER_METRICS_PORT_BASE, RECORDS_PROCESSED, instrument_connection,
+    observe_pipeline_latency, start_metrics_server, update_backlog, update_queue_backlog
+)
+from llm_client import LLMGateway
+from future_events_query import ensure_event_category_tables, sync_news_event_categories
+from temporal_expressions import HINT_PREFIX, has_future_cue, format_hints, normalize_expected_time
 
 # 配置日志（使用绝对路径，适用于服务器环境）
 logging.basicConfig(
@@ -13,10 +29,11 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# OpenAI 客户端配置
+# OpenAI 客户端配置（重试、退避与限速由 llm_gateway 统一处理，关闭 SDK 自带重试）
 client = OpenAI(
     api_key="****",
-    base_url="****"
+    base_url="****",
+    max_retries=0
 )
 
 # 数据库连接配置
@@ -28,6 +45,35 @@ db_config = {
     'database': '****'
 }
 
+# 近重复继承：与窗口内已抽取过的新闻近重复时继承其结果，事件不重复写入，通过 perception_news_duplicates 关联
+NEAR_DUP_ENABLED = True
+near_dup_index = NearDuplicateIndex()
+
+# 时间表达预过滤：没有任何未来时间线索的新闻直接判为 'no_events'，不调用 LLM（评估见 temporal_expressions.py evaluate）
+TEMPORAL_PREFILTER = True
+
+# 流式模式配置
+STREAM_MAX_MESSAGES = 50         # 每次从队列读取的最大消息数
+STREAM_WAIT_SECONDS = 5          # 队列为空时单次等待时长（秒）
+STREAM_SWEEP_INTERVAL = 300      # 兜底扫描未经队列通知的待处理记录的间隔（秒）
+LATENCY_REPORT_INTERVAL = 60     # 端到端延迟报告间隔（秒）
+
+# 指标中的阶段名与待处理条件
+METRICS_STAGE = 'future_events'
+PENDING_CONDITION = "future_event_status = 'unprocessed'"
+
+# LLM 调用限速与重试（与热度计算各占一半配额；worker 模式下再由各 worker 进程均分）
+llm_gateway = LLMGateway(METRICS_STAGE, quota_share=0.5)
+
+# 堆积任务租约配置：各 worker 进程（可跨机器）以租约方式认领未处理记录，租约过期的记录可被其他 worker 重新认领
+BACKLOG_CLAIM_SIZE = 20          # 每次认领的记录数
+LEASE_SECONDS = 600              # 租约时长（秒），需长于处理一批记录的最长耗时；处理失败的记录在租约过期后重试
+WORKER_IDLE_SECONDS = 30         # 常驻 worker 无可认领记录时的等待时间（秒）
+
+# 事件写入配置
+EVENT_INSERT_CHUNK_SIZE = 500       # 每条 INSERT 最多包含的事件行数
+EVENT_HASH_BACKFILL_CHUNK = 1000    # 迁移旧表时每次回填 event_hash 的行数
+
 # 无需评分的标签列表
 SKIP_TAGS = {
     'A股盘面直播', '港股动态', '美股动态', 'A股公告速递', '期货市场情报',
@@ -75,15 +121,31 @@ example_json = """
 ]
 """
 
-# 查询标签
-def get_subject_tags(cursor, news_id):
-    try:
-        cursor.execute("SELECT subject_name FROM perception_cls_news_subjects WHERE news_id = %s", (news_id,))
-        tags = {row[0] for row in cursor.fetchall()}
+# 用户提示中的输出格式说明
+user_format_hint = " Please respond in the format [{\"event_description\": ..., \"expected_time\": ..., \"remarks\": ..., \"probability_of_occurrence\": ..., \"theme_categories\": ..., \"region_categories\": ...}, ...]，如果没有未来事件，返回空数组 []"
+
+# 模型与缓存配置（提示词模板改动后缓存版本自动变化；提示词含当前日期，读写缓存时经 dated_prompt_version 把日期并入版本）
+LLM_MODEL = "deepseek-ai/DeepSeek-V3"
+FUTURE_EVENTS_PROMPT_VERSION = "future_events:" + prompt_fingerprint(system_content_template, example_json, user_format_hint, HINT_PREFIX)
+llm_cache = LLMResponseCache()
+
+# 批量查询标签：一次查询返回 {news_id: 标签集合}
+def get_subject_tags_batch(cursor, news_ids):
+    news_ids = list(news_ids)
+    tags = {news_id: set() for news_id in news_ids}
+    if not news_ids:
         return tags
+    try:
+        cursor.execute(f"""
+            SELECT news_id, subject_name
+            FROM perception_cls_news_subjects
+            WHERE news_id IN ({', '.join(['%s'] * len(news_ids))})
+        """, news_ids)
+        for news_id, subject_name in cursor.fetchall():
+            tags[news_id].add(subject_name)
     except mysql.connector.Error as e:
-        logging.warning(f"查询标签失败 (news_id={news_id}): {e}")
-        return set()
+        logging.warning(f"批量查询标签失败 ({len(news_ids)} 条): {e}")
+    return tags
 
 # 检查是否跳过处理
 def should_skip_processing(tags):
@@ -91,31 +153,56 @@ def should_skip_processing(tags):
         return False
     return tags.issubset(SKIP_TAGS)
 
-# 处理单条记录
-def process_record(record_id, content, current_time, retry_count=0, max_retries=3):
+# 抽取单条记录的未来事件（相同内容优先读取本地缓存；只调用一次，重试由调用方决定），失败时抛出异常
+# 返回结构无法识别时抛出 ValueError，只有校验通过的事件列表才写入缓存
+def extract_events(record_id, content, current_time):
+    prompt_version = dated_prompt_version(FUTURE_EVENTS_PROMPT_VERSION, current_time)
+    cached_events = validate_events(llm_cache.get(content, prompt_version, LLM_MODEL))
+    if cached_events is not None:
+        logging.info(f"记录 {record_id} 命中 LLM 缓存")
+        return cached_events
+
     system_content = system_content_template.format(current_time=current_time)
     full_system_content = system_content + "\n" + example_json
-    user_content = content + " Please respond in the format [{\"event_description\": ..., \"expected_time\": ..., \"remarks\": ..., \"probability_of_occurrence\": ..., \"theme_categories\": ..., \"region_categories\": ...}, ...]，如果没有未来事件，返回空数组 []"
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-V3",
-            messages=[
-                {"role": "system", "content": full_system_content},
-                {"role": "user", "content": user_content}
-            ],
-            response_format={"type": "json_object"}
-        )
-        event_data = json.loads(response.choices[0].message.content)
-        return event_data, True
-    except Exception as e:
-        logging.error(f"记录 {record_id} 处理失败 (尝试 {retry_count + 1}/{max_retries}): {e}")
-        if retry_count < max_retries - 1:
-            time.sleep(2)
-            return process_record(record_id, content, current_time, retry_count + 1, max_retries)
-        return None, False
-
-# 检查并创建 perception_future_events 表
-def ensure_future_events_table(cursor):
+    user_content = with_time_hints(content) + user_format_hint
+    response = llm_gateway.chat_completion(
+        client,
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": full_system_content},
+            {"role": "user", "content": user_content}
+        ],
+        response_format={"type": "json_object"}
+    )
+    event_data = validate_events(json.loads(response.choices[0].message.content))
+    if event_data is None:
+        raise ValueError("返回的事件结构无法识别")
+    llm_cache.put(content, prompt_version, LLM_MODEL, event_data)
+    return event_data
+
+# 校验并规范化抽取结果：按 json_object 返回时模型可能把列表包在对象里（如 {"events": [...]}）或只返回单个事件，
+# 取出事件列表并只保留带文本描述的事件字典；结构无法识别或列表中没有一个合法事件时返回 None
+def validate_events(data):
+    if isinstance(data, dict):
+        if "event_description" in data:
+            data = [data]
+        else:
+            lists = [value for value in data.values() if isinstance(value, list)]
+            if len(lists) > 1:
+                return None
+            data = lists[0] if lists else []
+    if not isinstance(data, list):
+        return None
+    valid = [event for event in data
+             if isinstance(event, dict) and isinstance(event.get("event_description"), str) and event["event_description"]]
+    return valid if valid or not data else None
+
+# 新闻内容后附上换算为具体日期的时间线索（没有时返回原内容）
+def with_time_hints(content):
+    return content + format_hints(content)
+
+# 检查并创建 perception_future_events 表；旧表迁移与分类表各自独立执行，一项失败不影响另一项
+def ensure_future_events_table(conn, cursor):
     try:
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS perception_future_events (
@@ -128,67 +215,225 @@ def ensure_future_events_table(cursor):
                 probability_of_occurrence FLOAT,
                 theme_categories JSON,
                 region_categories JSON,
+                event_hash CHAR(64) NOT NULL,
+                UNIQUE KEY uniq_news_event (news_id, event_hash),
                 FOREIGN KEY (news_id) REFERENCES perception_cls_news(id)
             )
         """)
         logging.info("确保 perception_future_events 表存在或已创建")
     except mysql.connector.Error as e:
         logging.error(f"创建 perception_future_events 表失败: {e}")
+    try:
+        ensure_event_hash_column(conn, cursor)
+    except mysql.connector.Error as e:
+        conn.rollback()
+        logging.error(f"perception_future_events 迁移 event_hash 失败: {e}")
+    try:
+        ensure_event_category_tables(cursor)
+    except mysql.connector.Error as e:
+        logging.error(f"创建未来事件分类表失败: {e}")
+
+# 执行迁移 DDL：多个 worker 同时启动时，字段或索引可能已由其他进程添加，视为已完成
+def execute_migration(cursor, statement):
+    try:
+        cursor.execute(statement)
+    except mysql.connector.Error as e:
+        if e.errno not in (errorcode.ER_DUP_FIELDNAME, errorcode.ER_DUP_KEYNAME):
+            raise
+        logging.info(f"迁移已由其他进程完成: {e}")
+
+# 旧表迁移：添加 event_hash 字段并回填，删除已重复写入的事件（保留最早一条）后建立 (news_id, event_hash) 唯一键
+# 以唯一键是否存在判断迁移是否完成，每一步都可重复执行，中断或多个 worker 同时迁移时都能收敛到同一结果
+def ensure_event_hash_column(conn, cursor):
+    cursor.execute("SHOW INDEX FROM perception_future_events WHERE Key_name = 'uniq_news_event'")
+    if cursor.fetchall():
+        return
+    logging.info("perception_future_events 缺少 (news_id, event_hash) 唯一键，开始迁移")
+    execute_migration(cursor, "ALTER TABLE perception_future_events ADD COLUMN event_hash CHAR(64) NULL")
+    while True:
+        cursor.execute("""
+            SELECT id, event_description FROM perception_future_events
+            WHERE event_hash IS NULL LIMIT %s
+        """, (EVENT_HASH_BACKFILL_CHUNK,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE perception_future_events SET event_hash = %s WHERE id = %s",
+            [(event_hash(description), event_id) for event_id, description in rows]
+        )
+        conn.commit()
+    cursor.execute("ALTER TABLE perception_future_events MODIFY event_hash CHAR(64) NOT NULL")
+    while True:
+        cursor.execute("""
+            DELETE duplicate FROM perception_future_events duplicate
+            JOIN perception_future_events kept
+              ON duplicate.news_id = kept.news_id AND duplicate.event_hash = kept.event_hash AND duplicate.id > kept.id
+        """)
+        logging.info(f"删除重复写入的未来事件 {cursor.rowcount} 条")
+        conn.commit()
+        try:
+            execute_migration(cursor, "ALTER TABLE perception_future_events ADD UNIQUE KEY uniq_news_event (news_id, event_hash)")
+            break
+        except mysql.connector.Error as e:
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            # 唯一键建立前其他 worker 又写入了重复事件，重新删除后再建
+            logging.info(f"建立唯一键时发现新的重复事件，重新去重: {e}")
+    logging.info("perception_future_events 已添加 (news_id, event_hash) 唯一键")
+
+# 事件去重哈希：归一化后的事件描述（全半角统一、去空白），同一新闻重复写入同一事件时被唯一键忽略
+def event_hash(event_description):
+    return hashlib.sha256(normalize_content(event_description).encode('utf-8')).hexdigest()
+
+def event_row(record_id, event):
+    event_description = event.get("event_description", "")
+    return (
+        record_id,
+        event_description,
+        normalize_expected_time(event.get("expected_time", "未指明")),
+        event.get("remarks", ""),
+        event.get("probability_of_occurrence", 0.0),
+        json.dumps(event.get("theme_categories", []), ensure_ascii=False),
+        json.dumps(event.get("region_categories", []), ensure_ascii=False),
+        event_hash(event_description),
+    )
+
+# 写入一组抽取结果（不提交）：锁定仍未处理的记录，按结果分组更新状态，事件用多行 INSERT 写入（重复事件由唯一键忽略），并同步主题/地区分类表
+# extracted 为 [(record_id, event_data)]，返回实际写入的记录 id 集合（其余记录已由其他进程处理）
+def write_extraction_results(cursor, extracted):
+    ids = [record_id for record_id, _ in extracted]
+    if not ids:
+        return set()
+    cursor.execute(f"""
+        SELECT id FROM perception_cls_news
+        WHERE {PENDING_CONDITION} AND id IN ({', '.join(['%s'] * len(ids))})
+        FOR UPDATE
+    """, ids)
+    open_ids = {row[0] for row in cursor.fetchall()}
+
+    ids_by_status = {'has_events': [], 'no_events': []}
+    rows = []
+    for record_id, event_data in extracted:
+        if record_id not in open_ids:
+            continue
+        ids_by_status['has_events' if event_data else 'no_events'].append(record_id)
+        rows.extend(event_row(record_id, event) for event in event_data or [])
+
+    for status, status_ids in ids_by_status.items():
+        if status_ids:
+            cursor.execute(f"""
+                UPDATE perception_cls_news
+                SET future_event_status = %s
+                WHERE id IN ({', '.join(['%s'] * len(status_ids))})
+            """, (status, *status_ids))
+    for start in range(0, len(rows), EVENT_INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + EVENT_INSERT_CHUNK_SIZE]
+        cursor.execute(f"""
+            INSERT INTO perception_future_events (
+                news_id, event_description, expected_time, remarks,
+                probability_of_occurrence, theme_categories, region_categories, event_hash
+            )
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))}
+            ON DUPLICATE KEY UPDATE id = id
+        """, [value for row in chunk for value in row])
+    sync_news_event_categories(cursor, ids_by_status['has_events'])
+    return open_ids
+
+# 在一个事务内写入一组抽取结果，失败时回滚并抛出异常
+def save_extraction_results(conn, cursor, extracted):
+    try:
+        open_ids = write_extraction_results(cursor, extracted)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return open_ids
 
-# 处理堆积任务（批量处理，直到查询数量小于10）
-def process_backlog_data():
+# 检查并添加租约字段：认领者与租约到期时间，以及按状态和 ctime 认领用的索引
+def ensure_lease_columns(cursor):
+    try:
+        cursor.execute("SHOW COLUMNS FROM perception_cls_news LIKE 'future_event_lease_owner'")
+        if cursor.fetchall():
+            return
+        cursor.execute("""
+            ALTER TABLE perception_cls_news
+                ADD COLUMN future_event_lease_owner VARCHAR(64) NULL,
+                ADD COLUMN future_event_lease_expires DATETIME NULL,
+                ADD KEY idx_future_event_claim (future_event_status, ctime)
+        """)
+        logging.info("perception_cls_news 已添加租约字段")
+    except mysql.connector.Error as e:
+        # 多个 worker 同时启动时只有一个能添加成功
+        logging.error(f"添加租约字段失败: {e}")
+
+# worker 标识：主机名 + 进程号，跨机器唯一
+def make_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+# 以租约方式认领未处理记录：短事务内 SELECT ... FOR UPDATE SKIP LOCKED 锁定无租约或租约已过期的记录并写入租约
+# news_ids 不为 None 时只认领其中的记录；condition 为待处理条件（合并分析阶段认领两项结果任一未完成的记录）；返回 [(id, content)]
+def claim_records(conn, cursor, worker_id, limit, news_ids=None, lease_seconds=LEASE_SECONDS, condition=PENDING_CONDITION):
+    id_clause = ""
+    params = []
+    if news_ids is not None:
+        params = list(news_ids)
+        if not params:
+            return []
+        id_clause = f"AND id IN ({', '.join(['%s'] * len(params))})"
+
+    # 结束上一个只读快照，锁定读取总能看到最新提交的数据
+    conn.commit()
+    cursor.execute(f"""
+        SELECT id, content
+        FROM perception_cls_news
+        WHERE {condition} {id_clause}
+          AND (future_event_lease_expires IS NULL OR future_event_lease_expires < NOW())
+        ORDER BY ctime DESC
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (*params, limit))
+    records = cursor.fetchall()
+    if records:
+        cursor.execute(f"""
+            UPDATE perception_cls_news
+            SET future_event_lease_owner = %s, future_event_lease_expires = NOW() + INTERVAL %s SECOND
+            WHERE id IN ({', '.join(['%s'] * len(records))})
+        """, (worker_id, lease_seconds, *[record_id for record_id, _ in records]))
+    conn.commit()
+    return records
+
+# 处理堆积任务：循环认领并处理未处理记录，可多进程、多机器同时运行
+# exit_when_empty 为 True 时没有可认领的记录即退出，否则常驻等待新记录与过期租约
+def process_backlog_data(worker_id=None, exit_when_empty=True, batch_size=BACKLOG_CLAIM_SIZE):
+    worker_id = worker_id or make_worker_id()
+    processed_count = 0
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = instrument_connection(mysql.connector.connect(**db_config))
         cursor = conn.cursor()
 
-        # 确保表存在
-        ensure_future_events_table(cursor)
+        # 确保表和租约字段存在
+        ensure_future_events_table(conn, cursor)
+        ensure_lease_columns(cursor)
 
-        # 获取当前时间
-        current_time = datetime.now().strftime("%Y年%m月%d日")
-        logging.info(f"当前时间设置为: {current_time}")
+        initial_unprocessed = update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+        logging.info(f"worker {worker_id} 启动，当前 {initial_unprocessed} 条未处理记录，每次认领 {batch_size} 条")
 
-        # 获取初始未处理记录总数
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM perception_cls_news 
-            WHERE future_event_status = 'unprocessed'
-        """)
-        initial_unprocessed = cursor.fetchone()[0]
-        logging.info(f"初始发现 {initial_unprocessed} 条未处理记录，开始批量处理")
-
-        batch_size = 100  # 每批处理100条
-        processed_count = 0
-        target_count = max(1600, initial_unprocessed)  # 目标处理1600条或更多
-
-        while processed_count < target_count:
-            cursor.execute("""
-                SELECT id, content 
-                FROM perception_cls_news 
-                WHERE future_event_status = 'unprocessed' 
-                ORDER BY ctime DESC 
-                LIMIT %s
-            """, (batch_size,))
-            records = cursor.fetchall()
-
-            if len(records) < 10:  # 查询数量小于10，结束堆积任务处理
-                logging.info(f"查询数量 {len(records)} 小于10，堆积任务处理完成，共处理 {processed_count + len(records)} 条记录")
-                if records:  # 处理最后一批少于10条的记录
-                    process_batch(cursor, conn, records, current_time)
-                    processed_count += len(records)
-                break
+        while True:
+            records = claim_records(conn, cursor, worker_id, batch_size)
+            if not records:
+                if exit_when_empty:
+                    break
+                time.sleep(WORKER_IDLE_SECONDS)
+                continue
 
-            logging.info(f"处理批次: {processed_count + 1} - {processed_count + len(records)} / {target_count}")
+            current_time = datetime.now().strftime("%Y年%m月%d日")
             process_batch(cursor, conn, records, current_time)
             processed_count += len(records)
-            conn.commit()
+            logging.info(f"worker {worker_id} 已处理 {processed_count} 条记录")
 
-            # 检查剩余未处理记录数
-            cursor.execute("SELECT COUNT(*) FROM perception_cls_news WHERE future_event_status = 'unprocessed'")
-            remaining = cursor.fetchone()[0]
-            logging.info(f"当前剩余未处理记录: {remaining}")
-
-        logging.info(f"堆积任务处理结束，共处理 {processed_count} 条记录，剩余记录将由定时任务处理")
+        logging.info(f"worker {worker_id} 没有可认领的记录，堆积任务处理结束，共处理 {processed_count} 条记录")
+        llm_cache.log_stats()
 
     except mysql.connector.Error as db_err:
         logging.error(f"数据库错误: {db_err}")
@@ -200,95 +445,143 @@ def process_backlog_data():
         if 'conn' in locals():
             conn.close()
 
-# 处理一批记录的辅助函数
-def process_batch(cursor, conn, records, current_time):
-    for record in records:
-        record_id, content = record
-        tags = get_subject_tags(cursor, record_id)
-
-        if should_skip_processing(tags):
-            cursor.execute("""
-                UPDATE perception_cls_news 
-                SET future_event_status = 'skipped'
-                WHERE id = %s
-            """, (record_id,))
-            logging.info(f"记录 {record_id} 跳过处理（标签: {tags}），状态更新为 'skipped'")
-            conn.commit()
+# 标签全部属于 SKIP_TAGS 的记录用一条 UPDATE 标记为 'skipped'，返回仍需处理的记录
+def skip_tagged_records(cursor, records):
+    tags_by_id = get_subject_tags_batch(cursor, [record_id for record_id, _ in records])
+    skip_ids = [record_id for record_id, _ in records if should_skip_processing(tags_by_id[record_id])]
+    if not skip_ids:
+        return list(records)
+
+    cursor.execute(f"""
+        UPDATE perception_cls_news 
+        SET future_event_status = 'skipped'
+        WHERE id IN ({', '.join(['%s'] * len(skip_ids))})
+    """, skip_ids)
+    RECORDS_PROCESSED.labels(METRICS_STAGE, 'skipped').inc(len(skip_ids))
+    logging.info(f"{len(skip_ids)} 条记录按标签跳过处理，状态更新为 'skipped' (id: {skip_ids})")
+    skipped = set(skip_ids)
+    return [record for record in records if record[0] not in skipped]
+
+# 没有未来时间线索的记录用一条 UPDATE 标记为 'no_events'，返回仍需处理的记录
+def prefilter_timeless_records(cursor, records):
+    if not TEMPORAL_PREFILTER or not records:
+        return list(records)
+    timeless_ids = [record_id for record_id, content in records if not has_future_cue(content)]
+    if not timeless_ids:
+        return list(records)
+    cursor.execute(f"""
+        UPDATE perception_cls_news
+        SET future_event_status = 'no_events'
+        WHERE id IN ({', '.join(['%s'] * len(timeless_ids))})
+    """, timeless_ids)
+    RECORDS_PROCESSED.labels(METRICS_STAGE, 'prefiltered').inc(len(timeless_ids))
+    logging.info(f"{len(timeless_ids)} 条记录没有未来时间线索，状态更新为 'no_events' (id: {timeless_ids})")
+    timeless = set(timeless_ids)
+    return [record for record in records if record[0] not in timeless]
+
+# 与已抽取新闻近重复的记录继承其状态并记录近重复关系，返回仍需处理的记录
+def inherit_duplicate_events(cursor, records):
+    if not NEAR_DUP_ENABLED or not records:
+        return list(records)
+    if not near_dup_index.warmed:
+        ensure_duplicates_table(cursor)
+        near_dup_index.warm(cursor, "future_event_status IN ('has_events', 'no_events')")
+
+    matches = {}
+    for record_id, content in records:
+        match = near_dup_index.find(content, exclude_id=record_id)
+        if match:
+            matches[record_id] = match
+    if not matches:
+        return list(records)
+
+    canonical_ids = list({canonical_id for canonical_id, _ in matches.values()})
+    cursor.execute(f"""
+        SELECT id, future_event_status
+        FROM perception_cls_news
+        WHERE future_event_status IN ('has_events', 'no_events') AND id IN ({', '.join(['%s'] * len(canonical_ids))})
+    """, canonical_ids)
+    canonical_status = dict(cursor.fetchall())
+
+    inherited = set()
+    for record_id, (canonical_id, similarity) in matches.items():
+        status = canonical_status.get(canonical_id)
+        if status is None:
             continue
+        cursor.execute("""
+            UPDATE perception_cls_news 
+            SET future_event_status = %s
+            WHERE id = %s
+        """, (status, record_id))
+        record_duplicate(cursor, record_id, canonical_id, similarity)
+        inherited.add(record_id)
+        RECORDS_PROCESSED.labels(METRICS_STAGE, 'inherited').inc()
+        logging.info(f"记录 {record_id} 与 {canonical_id} 近重复 (相似度 {similarity:.2f})，继承状态 '{status}'，事件不重复写入")
+    return [record for record in records if record[0] not in inherited]
 
-        event_data, success = process_record(record_id, content, current_time)
-        if success:
-            if event_data:
-                for event in event_data:
-                    event_description = event.get("event_description", "")
-                    expected_time_str = event.get("expected_time", "未指明")
-                    remarks = event.get("remarks", "")
-                    probability_of_occurrence = event.get("probability_of_occurrence", 0.0)
-                    theme_categories = json.dumps(event.get("theme_categories", []), ensure_ascii=False)
-                    region_categories = json.dumps(event.get("region_categories", []), ensure_ascii=False)
-                    expected_time = None if expected_time_str == "未指明" else expected_time_str
-
-                    cursor.execute("""
-                        INSERT INTO perception_future_events (
-                            news_id, 
-                            event_description, 
-                            expected_time, 
-                            remarks,
-                            probability_of_occurrence,
-                            theme_categories,
-                            region_categories
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        record_id,
-                        event_description,
-                        expected_time,
-                        remarks,
-                        probability_of_occurrence,
-                        theme_categories,
-                        region_categories
-                    ))
-
-                cursor.execute("""
-                    UPDATE perception_cls_news 
-                    SET future_event_status = 'has_events'
-                    WHERE id = %s
-                """, (record_id,))
-                logging.info(f"记录 {record_id} 处理成功，发现 {len(event_data)} 个未来事件，状态更新为 'has_events'")
-            else:
-                cursor.execute("""
-                    UPDATE perception_cls_news 
-                    SET future_event_status = 'no_events'
-                    WHERE id = %s
-                """, (record_id,))
-                logging.info(f"记录 {record_id} 处理成功，无未来事件，状态更新为 'no_events'")
+# 处理一批记录的辅助函数
+def process_batch(cursor, conn, records, current_time):
+    records = skip_tagged_records(cursor, records)
+    records = inherit_duplicate_events(cursor, records)
+    records = prefilter_timeless_records(cursor, records)
+    conn.commit()
+
+    # 失败的记录按退避推迟重试，期间继续处理其余记录；结果全部返回后在一个事务内写入
+    extracted = []
+    contents = dict(records)
+    for (record_id, _), event_data, error in llm_gateway.run_deferred(records, lambda record: extract_events(record[0], record[1], current_time)):
+        if error is None:
+            extracted.append((record_id, event_data))
         else:
-            logging.warning(f"记录 {record_id} 处理失败，状态保持 'unprocessed'")
+            RECORDS_PROCESSED.labels(METRICS_STAGE, 'failed').inc()
+            logging.warning(f"记录 {record_id} 处理失败 ({error})，状态保持 'unprocessed'")
 
-        conn.commit()
+    try:
+        saved_ids = save_extraction_results(conn, cursor, extracted)
+    except Exception as e:
+        # 整批写入失败时逐条写入，避免一条异常数据阻塞整批记录
+        logging.error(f"批量写入 {len(extracted)} 条抽取结果失败: {e}，改为逐条写入")
+        saved_ids = set()
+        for item in extracted:
+            try:
+                saved_ids |= save_extraction_results(conn, cursor, [item])
+            except Exception as record_error:
+                logging.error(f"记录 {item[0]} 写入失败: {record_error}，状态保持 'unprocessed'")
+
+    for record_id, event_data in extracted:
+        if record_id not in saved_ids:
+            logging.info(f"记录 {record_id} 已由其他进程处理或写入失败，跳过")
+            continue
+        near_dup_index.add(record_id, contents[record_id])
+        record_extraction_outcome(record_id, event_data)
+
+# 记录已写入的抽取结果的指标与日志
+def record_extraction_outcome(record_id, event_data):
+    if event_data:
+        RECORDS_PROCESSED.labels(METRICS_STAGE, 'has_events').inc()
+        logging.info(f"记录 {record_id} 处理成功，发现 {len(event_data)} 个未来事件，状态更新为 'has_events'")
+    else:
+        RECORDS_PROCESSED.labels(METRICS_STAGE, 'no_events').inc()
+        logging.info(f"记录 {record_id} 处理成功，无未来事件，状态更新为 'no_events'")
 
 # 处理定时任务（每5分钟处理10条）
 def process_news_data():
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = instrument_connection(mysql.connector.connect(**db_config))
         cursor = conn.cursor()
 
-        # 确保表存在
-        ensure_future_events_table(cursor)
+        # 确保表和租约字段存在
+        ensure_future_events_table(conn, cursor)
+        ensure_lease_columns(cursor)
 
         # 获取当前时间
         current_time = datetime.now().strftime("%Y年%m月%d日")
         logging.info(f"当前时间设置为: {current_time}")
 
-        # 获取未处理的新闻记录
-        cursor.execute("""
-            SELECT id, content 
-            FROM perception_cls_news 
-            WHERE future_event_status = 'unprocessed' 
-            ORDER BY ctime DESC 
-            LIMIT 10
-        """)
-        records = cursor.fetchall()
+        update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+
+        # 认领未处理的新闻记录（与堆积任务 worker 并行时不会重复处理）
+        records = claim_records(conn, cursor, make_worker_id(), 10)
 
         if not records:
             logging.info("没有待处理的记录")
@@ -297,6 +590,74 @@ def process_news_data():
         logging.info(f"开始处理 {len(records)} 条记录")
         process_batch(cursor, conn, records, current_time)
         logging.info(f"本次处理完成，共处理 {len(records)} 条记录")
+        llm_cache.log_stats()
+
+    except mysql.connector.Error as db_err:
+        logging.error(f"数据库错误: {db_err}")
+    except Exception as e:
+        logging.error(f"未知错误: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+# 按 id 查询仍未处理的记录（流式模式使用）
+def fetch_unprocessed_records_by_ids(cursor, news_ids):
+    news_ids = list(news_ids)
+    if not news_ids:
+        return []
+    cursor.execute(f"""
+        SELECT id, content 
+        FROM perception_cls_news 
+        WHERE future_event_status = 'unprocessed' AND id IN ({', '.join(['%s'] * len(news_ids))})
+        ORDER BY ctime DESC
+    """, news_ids)
+    return cursor.fetchall()
+
+# 流式模式：消费爬虫发布到本地队列的新闻 id，入队后立即抽取，并记录端到端延迟
+def stream_news_data():
+    queue = NewsQueue()
+    last_sweep = 0.0
+    last_latency_log = time.time()
+    try:
+        conn = instrument_connection(mysql.connector.connect(**db_config))
+        cursor = conn.cursor()
+
+        # 确保表和租约字段存在
+        ensure_future_events_table(conn, cursor)
+        ensure_lease_columns(cursor)
+        worker_id = make_worker_id()
+        logging.info("流式抽取模式启动")
+
+        while True:
+            if time.time() - last_sweep >= STREAM_SWEEP_INTERVAL:
+                # 兜底：补处理爬虫未发布到队列的记录（如补采数据）
+                process_news_data()
+                last_sweep = time.time()
+
+            messages = queue.consume(FUTURE_EVENTS_CONSUMER, STREAM_MAX_MESSAGES, STREAM_WAIT_SECONDS)
+            if messages:
+                first_messages = {}
+                for message in messages:
+                    first_messages.setdefault(message[1], message)
+
+                records = claim_records(conn, cursor, worker_id, len(first_messages), first_messages)
+                if records:
+                    current_time = datetime.now().strftime("%Y年%m月%d日")
+                    process_batch(cursor, conn, records, current_time)
+                    # 处理失败的记录保持 'unprocessed'，不计入延迟统计
+                    still_pending = {record_id for record_id, _ in fetch_unprocessed_records_by_ids(cursor, first_messages)}
+                    done_messages = [first_messages[record_id] for record_id, _ in records if record_id not in still_pending]
+                    queue.record_latency(FUTURE_EVENTS_CONSUMER, done_messages)
+                    observe_pipeline_latency(FUTURE_EVENTS_CONSUMER, done_messages)
+                queue.ack(FUTURE_EVENTS_CONSUMER, messages[-1][0])
+
+            if time.time() - last_latency_log >= LATENCY_REPORT_INTERVAL:
+                queue.log_latency(FUTURE_EVENTS_CONSUMER)
+                update_queue_backlog(queue, FUTURE_EVENTS_CONSUMER)
+                update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+                last_latency_log = time.time()
 
     except mysql.connector.Error as db_err:
         logging.error(f"数据库错误: {db_err}")
@@ -321,9 +682,49 @@ def run_scheduler():
             logging.error(f"定时任务崩溃: {e}，将在5秒后重启")
             time.sleep(5)
 
+# 流式模式（带重启逻辑）
+def run_stream():
+    while True:
+        stream_news_data()
+        logging.error("流式抽取模式中断，将在5秒后重启")
+        time.sleep(5)
+
+# 常驻堆积任务 worker（带重启逻辑），每个 worker 在独立端口提供指标
+def run_backlog_worker(worker_index=0, num_workers=1):
+    start_metrics_server(FUTURE_EVENTS_WORKER_METRICS_PORT_BASE + worker_index)
+    llm_gateway.limiter.scale(1 / num_workers)
+    while True:
+        process_backlog_data(exit_when_empty=False)
+        logging.error("堆积任务 worker 中断，将在5秒后重启")
+        time.sleep(5)
+
+# 启动 num_workers 个 worker 进程并等待；其他机器上可同时运行同样的命令
+def run_backlog_workers(num_workers):
+    processes = [
+        multiprocessing.Process(target=run_backlog_worker, args=(index, num_workers), name=f"future-events-worker-{index}")
+        for index in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    logging.info(f"已启动 {num_workers} 个堆积任务 worker 进程")
+    for process in processes:
+        process.join()
+
 # 主函数
 if __name__ == "__main__":
+    # python future_events_analysis.py workers <进程数>：常驻 worker 进程以租约方式并行处理未处理记录
+    if len(sys.argv) > 2 and sys.argv[1] == "workers":
+        logging.info(f"脚本启动，worker 模式，{sys.argv[2]} 个进程")
+        run_backlog_workers(int(sys.argv[2]))
+        sys.exit(0)
+
+    start_metrics_server(FUTURE_EVENTS_METRICS_PORT)
     logging.info("脚本启动，开始处理堆积任务")
     process_backlog_data()  # 先处理堆积任务
-    logging.info("堆积任务处理完毕，进入定时任务模式")
-    run_scheduler()         # 然后启动定时任务
\ No newline at end of file
+    # python future_events_analysis.py stream：消费爬虫发布的新闻队列，入队即抽取
+    if len(sys.argv) > 1 and sys.argv[1] == "stream":
+        logging.info("堆积任务处理完毕，进入流式模式")
+        run_stream()
+    else:
+        logging.info("堆积任务处理完毕，进入定时任务模式")
+        run_scheduler()         # 然后启动定时任务
\ No newline at end of file
@@ -0,0 +1,182 @@
+import sys
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+import mysql.connector
+from mysql.connector import errorcode
+
+# 主题/地区分类表：把 perception_future_events 中的 JSON 分类展开为一行一个分类，
+# 并冗余事件的预计时间与发生概率，使“某主题/地区 + 时间窗口 + 按概率排序”的查询走 (分类, 预计时间) 索引，不再全表 JSON_CONTAINS
+CATEGORY_TABLES = {
+    'theme': ('perception_future_event_themes', 'theme_categories'),
+    'region': ('perception_future_event_regions', 'region_categories'),
+}
+CATEGORY_MAX_LENGTH = 64        # 超长的分类值不写入分类表
+REBUILD_CHUNK_SIZE = 5000       # 重建分类表时每次处理的事件数
+
+DEFAULT_WINDOW_DAYS = 14
+DEFAULT_LIMIT = 100
+
+EVENT_COLUMNS = """
+    e.id, e.news_id, e.event_description, e.expected_time, e.remarks,
+    e.probability_of_occurrence, e.theme_categories, e.region_categories
+"""
+
+
+# 检查并创建主题/地区分类表，以及未来事件表按预计时间查询用的索引
+def ensure_event_category_tables(cursor):
+    for column, (table, _) in CATEGORY_TABLES.items():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                event_id INT NOT NULL,
+                {column} VARCHAR({CATEGORY_MAX_LENGTH}) NOT NULL,
+                expected_time DATETIME,
+                probability_of_occurrence FLOAT,
+                PRIMARY KEY (event_id, {column}),
+                KEY idx_{column}_time ({column}, expected_time, probability_of_occurrence),
+                FOREIGN KEY (event_id) REFERENCES perception_future_events(id) ON DELETE CASCADE
+            )
+        """)
+    cursor.execute("SHOW INDEX FROM perception_future_events WHERE Key_name = 'idx_expected_time'")
+    if not cursor.fetchall():
+        try:
+            cursor.execute("ALTER TABLE perception_future_events ADD KEY idx_expected_time (expected_time, probability_of_occurrence)")
+            logging.info("perception_future_events 已添加 idx_expected_time 索引")
+        except mysql.connector.Error as e:
+            # 多个 worker 同时启动时索引可能已由其他进程添加
+            if e.errno != errorcode.ER_DUP_KEYNAME:
+                raise
+
+
+# 把满足 condition 的事件的 JSON 分类展开写入分类表（需 MySQL 8.0+ 的 JSON_TABLE），已存在的行刷新冗余字段
+# 与事件写入在同一事务中调用，分类表与事件表保持一致
+def sync_event_categories(cursor, condition, params=()):
+    for column, (table, json_column) in CATEGORY_TABLES.items():
+        cursor.execute(f"""
+            INSERT INTO {table} (event_id, {column}, expected_time, probability_of_occurrence)
+            SELECT e.id, c.value, e.expected_time, e.probability_of_occurrence
+            FROM perception_future_events e,
+                 JSON_TABLE(e.{json_column}, '$[*]' COLUMNS (
+                     value VARCHAR({CATEGORY_MAX_LENGTH}) PATH '$' NULL ON ERROR
+                 )) c
+            WHERE {condition} AND c.value IS NOT NULL AND c.value <> ''
+            ON DUPLICATE KEY UPDATE
+                expected_time = e.expected_time,
+                probability_of_occurrence = e.probability_of_occurrence
+        """, params)
+
+
+def sync_news_event_categories(cursor, news_ids):
+    news_ids = list(news_ids)
+    if news_ids:
+        sync_event_categories(cursor, f"e.news_id IN ({', '.join(['%s'] * len(news_ids))})", news_ids)
+
+
+# 按事件 id 分段重建分类表（首次上线或修复数据时使用），每段单独提交
+def rebuild_event_categories(conn, cursor, chunk_size=REBUILD_CHUNK_SIZE):
+    cursor.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM perception_future_events")
+    min_id, max_id = cursor.fetchone()
+    for start in range(min_id, max_id + 1, chunk_size):
+        sync_event_categories(cursor, "e.id >= %s AND e.id < %s", (start, start + chunk_size))
+        conn.commit()
+        logging.info(f"分类表已重建至事件 id {min(start + chunk_size - 1, max_id)} / {max_id}")
+
+
+# 查询预计时间在 [start, start + days) 内的未来事件，可按主题和地区筛选，按发生概率从高到低排序
+# 有主题时以主题分类表的 (theme, expected_time) 索引定位，再按主键关联地区分类表；只有地区时以地区分类表定位
+def query_upcoming_events(cursor, theme=None, region=None, start=None, days=DEFAULT_WINDOW_DAYS,
+                          min_probability=None, limit=DEFAULT_LIMIT):
+    start = start or datetime.now()
+    end = start + timedelta(days=days)
+    joins, join_params = [], []
+    conditions, params = [], []
+
+    if theme is not None:
+        driver = 't'
+        source = "perception_future_event_themes t"
+        conditions.append("t.theme = %s")
+        params.append(theme)
+        if region is not None:
+            joins.append("JOIN perception_future_event_regions r ON r.event_id = t.event_id AND r.region = %s")
+            join_params.append(region)
+    elif region is not None:
+        driver = 'r'
+        source = "perception_future_event_regions r"
+        conditions.append("r.region = %s")
+        params.append(region)
+    else:
+        driver = 'e'
+        source = None
+
+    conditions.append(f"{driver}.expected_time >= %s AND {driver}.expected_time < %s")
+    params.extend([start, end])
+    if min_probability is not None:
+        conditions.append(f"{driver}.probability_of_occurrence >= %s")
+        params.append(min_probability)
+
+    if source is None:
+        sql = f"SELECT {EVENT_COLUMNS} FROM perception_future_events e"
+    else:
+        joins.append(f"JOIN perception_future_events e ON e.id = {driver}.event_id")
+        sql = f"SELECT {EVENT_COLUMNS} FROM {source} " + " ".join(joins)
+    sql += f"""
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {driver}.probability_of_occurrence DESC, {driver}.expected_time
+        LIMIT %s
+    """
+    cursor.execute(sql, join_params + params + [limit])
+    return cursor.fetchall()
+
+
+# 各主题（或地区）在时间窗口内的事件数
+def count_upcoming_by_category(cursor, category='theme', start=None, days=DEFAULT_WINDOW_DAYS):
+    table, _ = CATEGORY_TABLES[category]
+    start = start or datetime.now()
+    cursor.execute(f"""
+        SELECT {category}, COUNT(*)
+        FROM {table}
+        WHERE expected_time >= %s AND expected_time < %s
+        GROUP BY {category}
+        ORDER BY COUNT(*) DESC
+    """, (start, start + timedelta(days=days)))
+    return cursor.fetchall()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='未来事件查询')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help='重建主题/地区分类表')
+    query = subparsers.add_parser('query', help='查询时间窗口内的未来事件')
+    query.add_argument('--theme')
+    query.add_argument('--region')
+    query.add_argument('--days', type=int, default=DEFAULT_WINDOW_DAYS)
+    query.add_argument('--min-probability', type=float)
+    query.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # python future_events_query.py rebuild
+    # python future_events_query.py query --theme 军事 --region 中国 --days 14
+    from config import db_config, setup_cli_logging
+    setup_cli_logging()
+    args = parse_args(sys.argv[1:])
+    try:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        ensure_event_category_tables(cursor)
+        if args.command == 'rebuild':
+            rebuild_event_categories(conn, cursor)
+        else:
+            rows = query_upcoming_events(cursor, args.theme, args.region, days=args.days,
+                                         min_probability=args.min_probability, limit=args.limit)
+            for event_id, news_id, description, expected_time, _, probability, themes, regions in rows:
+                print(f"{expected_time}  {probability or 0:.2f}  [{news_id}] {description}  主题 {themes}  地区 {regions}")
+    except mysql.connector.Error as e:
+        logging.error(f"数据库错误: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
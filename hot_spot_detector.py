@@ -1,11 +1,27 @@
+import sys
 import json
-import math
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 import mysql.connector
 from openai import OpenAI
 import schedule
+from llm_cache import LLMResponseCache, prompt_fingerprint
+from news_queue import NewsQueue, HOTSPOT_CONSUMER
+from hot_spot_prescorer import prescore, is_confident_zero
+from near_duplicate import NearDuplicateIndex, ensure_duplicates_table, record_duplicate
+from metrics import (
+    HOTSPOT_METRICS_PORT, RECORDS_PROCESSED, instrument_connection,
+    observe_pipeline_latency, start_metrics_server, update_backlog, update_queue_backlog
+)
+from llm_client import LLMGateway
+from hotspot_rollup import ensure_rollup_table, accumulate_news
+from scoring_backends import (
+    SCORE_DIMENSIONS, SCORE_SOURCES_TABLE, FAILED_RESULT, LOCAL_MODEL_PATH, ScoreResult, LocalScoringModel,
+    calculate_hotspot_level, RemoteLLMBackend, LocalModelBackend, RoutingBackend, ensure_score_sources_table,
+    record_score_source
+)
 
 # 配置日志（使用绝对路径）
 logging.basicConfig(
@@ -14,10 +30,11 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# OpenAI 客户端配置
+# OpenAI 客户端配置（重试、退避与限速由 llm_gateway 统一处理，关闭 SDK 自带重试）
 client = OpenAI(
     api_key="****",
-    base_url="****"
+    base_url="****",
+    max_retries=0
 )
 
 # 数据库连接配置（请替换为实际值）
@@ -50,6 +67,21 @@ system_content = """
   7. **外交动态**（领导人言论、外交冲突、国际会议等，有丑闻或失态提高得分）。  
 """
 
+# 批量评分时附加在系统提示后的说明（评分规则只发送一次）
+batch_instructions = """
+#### **2. 批量输入**
+- 输入是一个 JSON 对象，键为新闻 id，值为新闻内容。
+- 请对每条新闻独立评分，返回一个 JSON 对象，键为相同的新闻 id，值为该新闻 7 个关键特征的评分对象。
+"""
+
+# 用户提示中的输出格式说明
+user_format_hint = " Please respond in the format {\"冲突性\": ..., \"名人效应\": ..., \"突发性\": ..., \"经济敏感议题\": ..., \"社会/文化热点\": ..., \"科技突破\": ..., \"外交动态\": ...}"
+
+# 模型与缓存配置（提示词改动后缓存版本自动变化）
+LLM_MODEL = "deepseek-ai/DeepSeek-V3"
+HOTSPOT_PROMPT_VERSION = "hotspot:" + prompt_fingerprint(system_content, user_format_hint)
+llm_cache = LLMResponseCache()
+
 # 无需评分的标签列表
 SKIP_TAGS = {
     'A股盘面直播', '港股动态', '美股动态', 'A股公告速递', '期货市场情报',
@@ -57,42 +89,203 @@ SKIP_TAGS = {
 }
 
 
-# 计算热点等级
-def calculate_hotspot_level(scores):
-    if not scores:
-        return None
-    total_score = sum(scores.values())
-    return min(5, math.ceil(total_score / 21 * 5))
+# 并发评分配置
+SCORING_CONCURRENCY = 8          # 同时在途的 LLM 请求数
+DRAIN_IDLE_SECONDS = 30          # 持续模式下无待处理记录时的等待时间（秒）
+FAILED_RETRY_COOLDOWN = 600      # 持续模式下失败记录再次入队前的冷却时间（秒）
+THROUGHPUT_REPORT_INTERVAL = 60  # 吞吐量报告间隔（秒）
+SCORING_BATCH_SIZE = 10          # 每次 LLM 请求打包的新闻条数（1 表示逐条评分）
+
+# 本地预评分：例行市场消息高置信度判为 0 级时不调用 LLM
+PRESCORE_ENABLED = True
+
+# 近重复继承：与窗口内已由 LLM 评分的新闻近重复时直接继承其评分
+NEAR_DUP_ENABLED = True
+near_dup_index = NearDuplicateIndex()
+
+# 评分后端：remote 全部由 LLM 评分；local 全部由本地模型评分；routed 本地模型高置信度的直接采用，其余交给 LLM
+# 本地模型由 python scoring_backends.py train 训练，加载失败时回退到 LLM 评分
+SCORING_BACKEND = 'remote'
+scoring_backend = None
+
+# 热度汇总：写入评分时在同一事务内累加到按主题和小时/天汇总的 perception_hotspot_rollups
+ROLLUP_ENABLED = True
+
+# 流式模式配置
+STREAM_MAX_MESSAGES = 50         # 每次从队列读取的最大消息数
+STREAM_WAIT_SECONDS = 5          # 队列为空时单次等待时长（秒）
+STREAM_SWEEP_INTERVAL = 300      # 兜底扫描未经队列通知的待评分记录的间隔（秒）
+
+# 指标中的阶段名与待评分条件
+METRICS_STAGE = 'hotspot'
+PENDING_CONDITION = "hotspot_level IS NULL"
+
+# LLM 调用限速与重试（与未来事件抽取各占一半配额）
+llm_gateway = LLMGateway(METRICS_STAGE, quota_share=0.5)
+
+
+# 单条评分请求（只调用一次，重试由调用方决定），失败时抛出异常
+def request_scores(content):
+    response = llm_gateway.chat_completion(
+        client,
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": content + user_format_hint}
+        ],
+        response_format={"type": "json_object"}
+    )
+    scores = validate_scores(json.loads(response.choices[0].message.content))
+    if scores is None:
+        raise ValueError("评分返回的维度缺失或不是 0-5 的整数")
+    llm_cache.put(content, HOTSPOT_PROMPT_VERSION, LLM_MODEL, scores)
+    return scores
 
 
-# 处理单条记录
-def process_record(record_id, content, retry_count=0, max_retries=3):
-    user_content = content + " Please respond in the format {\"冲突性\": ..., \"名人效应\": ..., \"突发性\": ..., \"经济敏感议题\": ..., \"社会/文化热点\": ..., \"科技突破\": ..., \"外交动态\": ...}"
+# 处理单条记录（相同内容优先读取本地缓存），失败按退避重试
+def process_record(record_id, content, max_retries=3):
+    cached_scores = validate_scores(llm_cache.get(content, HOTSPOT_PROMPT_VERSION, LLM_MODEL))
+    if cached_scores is not None:
+        logging.info(f"记录 {record_id} 命中 LLM 缓存")
+        return cached_scores, calculate_hotspot_level(cached_scores), datetime.now(), True
+
     try:
-        response = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-V3",
+        scores = llm_gateway.call_with_retries(lambda: request_scores(content), max_retries, f"记录 {record_id} 评分")
+    except Exception as e:
+        logging.error(f"记录 {record_id} 处理失败: {e}")
+        return None, None, None, False
+    return scores, calculate_hotspot_level(scores), datetime.now(), True
+
+
+# 逐条评分多条记录：失败的条目按退避推迟重试，期间继续评分其余条目，返回 {record_id: process_record 的返回值}
+def process_records_individually(records, max_retries=3):
+    results = {}
+    for (record_id, _), scores, error in llm_gateway.run_deferred(records, lambda record: request_scores(record[1]), max_retries):
+        if error is None:
+            results[record_id] = (scores, calculate_hotspot_level(scores), datetime.now(), True)
+        else:
+            logging.error(f"记录 {record_id} 处理失败: {error}")
+            results[record_id] = (None, None, None, False)
+    return results
+
+
+# 校验并规范化评分：7 个维度齐全且均为 0-5 的整数，否则返回 None
+# 单条与批量评分、缓存读取都经过这里；3.0、"3" 规范化为 3，3.5 等非整数不截断，直接判为格式错误
+def validate_scores(scores):
+    if not isinstance(scores, dict):
+        return None
+    normalized = {}
+    for dimension in SCORE_DIMENSIONS:
+        value = scores.get(dimension)
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            return None
+        if isinstance(value, float):
+            if not value.is_integer():
+                return None
+        elif isinstance(value, str):
+            value = value.strip()
+            if not value.isdecimal():
+                return None
+        value = int(value)
+        if not 0 <= value <= 5:
+            return None
+        normalized[dimension] = value
+    return normalized
+
+
+# 批量评分：K 条新闻打包成一次请求，返回 {record_id: process_record 的返回值}
+# 缺失或格式错误的条目单独回退到逐条评分；批量与逐条使用同一评分规则，共用缓存版本
+def process_records_batch(records, max_retries=3):
+    results = {}
+    pending = []
+    for record_id, content in records:
+        cached_scores = validate_scores(llm_cache.get(content, HOTSPOT_PROMPT_VERSION, LLM_MODEL))
+        if cached_scores is not None:
+            results[record_id] = (cached_scores, calculate_hotspot_level(cached_scores), datetime.now(), True)
+        else:
+            pending.append((record_id, content))
+
+    if len(pending) == 1:
+        record_id, content = pending[0]
+        results[record_id] = process_record(record_id, content)
+        return results
+    if not pending:
+        return results
+
+    user_content = json.dumps({str(record_id): content for record_id, content in pending}, ensure_ascii=False)
+
+    def request_batch():
+        response = llm_gateway.chat_completion(
+            client,
+            model=LLM_MODEL,
             messages=[
-                {"role": "system", "content": system_content},
+                {"role": "system", "content": system_content + batch_instructions},
                 {"role": "user", "content": user_content}
             ],
             response_format={"type": "json_object"}
         )
         scores = json.loads(response.choices[0].message.content)
-        hotspot_level = calculate_hotspot_level(scores)
-        processed_at = datetime.now()
-        return scores, hotspot_level, processed_at, True
+        if not isinstance(scores, dict):
+            raise ValueError(f"批量评分返回的不是 JSON 对象: {type(scores).__name__}")
+        return scores
+
+    try:
+        batch_scores = llm_gateway.call_with_retries(request_batch, max_retries, f"批量评分 {len(pending)} 条")
     except Exception as e:
-        logging.error(f"记录 {record_id} 处理失败 (尝试 {retry_count + 1}/{max_retries}): {e}")
-        if retry_count < max_retries - 1:
-            time.sleep(2)
-            return process_record(record_id, content, retry_count + 1, max_retries)
-        return None, None, None, False
+        logging.error(f"批量评分 {len(pending)} 条失败: {e}")
+        batch_scores = {}
+
+    fallback = []
+    for record_id, content in pending:
+        scores = validate_scores(batch_scores.get(str(record_id)))
+        if scores is None:
+            fallback.append((record_id, content))
+            continue
+        llm_cache.put(content, HOTSPOT_PROMPT_VERSION, LLM_MODEL, scores)
+        results[record_id] = (scores, calculate_hotspot_level(scores), datetime.now(), True)
+    results.update(process_records_individually(fallback, max_retries))
+
+    logging.info(f"批量评分完成: {len(pending)} 条，单独回退 {len(fallback)} 条")
+    return results
+
+
+# 按 SCORING_BACKEND 创建评分后端（首次调用时加载本地模型）
+def get_scoring_backend():
+    global scoring_backend
+    if scoring_backend is None:
+        remote = RemoteLLMBackend(lambda records: process_records_batch(records))
+        scoring_backend = remote
+        if SCORING_BACKEND in ('local', 'routed'):
+            try:
+                model = LocalScoringModel.load(LOCAL_MODEL_PATH)
+            except Exception as e:
+                logging.error(f"本地模型加载失败: {e}，改用 LLM 评分")
+            else:
+                local = LocalModelBackend(model, calculate_hotspot_level)
+                scoring_backend = local if SCORING_BACKEND == 'local' else RoutingBackend(local, remote)
+                logging.info(f"评分后端: {scoring_backend.name}，本地模型版本 {model.version}")
+    return scoring_backend
+
+
+# 将记录按 batch_size 分组
+def chunk_records(records, batch_size=SCORING_BATCH_SIZE):
+    batch_size = max(1, batch_size)
+    return [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
 
 
-# 查询标签
-def get_subject_tags(cursor, news_id):
-    cursor.execute("SELECT subject_name FROM perception_cls_news_subjects WHERE news_id = %s", (news_id,))
-    tags = {row[0] for row in cursor.fetchall()}
+# 批量查询标签：一次查询返回 {news_id: 标签集合}
+def get_subject_tags_batch(cursor, news_ids):
+    news_ids = list(news_ids)
+    if not news_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT news_id, subject_name
+        FROM perception_cls_news_subjects
+        WHERE news_id IN ({', '.join(['%s'] * len(news_ids))})
+    """, news_ids)
+    tags = {news_id: set() for news_id in news_ids}
+    for news_id, subject_name in cursor.fetchall():
+        tags[news_id].add(subject_name)
     return tags
 
 
@@ -103,62 +296,396 @@ def should_skip_processing(tags):
     return tags.issubset(SKIP_TAGS)
 
 
+# 查询待评分记录（优先处理 ctime 最新的记录）
+# 跳过评分的记录 hotspot_level=0 且 feature_scores 为 NULL，因此只按 hotspot_level 判断是否待处理，避免重复选中
+def fetch_pending_records(cursor, limit, exclude_ids=()):
+    exclude_ids = list(exclude_ids)
+    exclude_clause = ""
+    if exclude_ids:
+        exclude_clause = f"AND id NOT IN ({', '.join(['%s'] * len(exclude_ids))})"
+    cursor.execute(f"""
+        SELECT id, content 
+        FROM perception_cls_news 
+        WHERE {PENDING_CONDITION} {exclude_clause}
+        ORDER BY ctime DESC 
+        LIMIT %s
+    """, (*exclude_ids, limit))
+    return cursor.fetchall()
+
+
+# 按 id 查询仍待评分的记录（流式模式使用）
+def fetch_pending_records_by_ids(cursor, news_ids):
+    news_ids = list(news_ids)
+    if not news_ids:
+        return []
+    cursor.execute(f"""
+        SELECT id, content 
+        FROM perception_cls_news 
+        WHERE {PENDING_CONDITION} AND id IN ({', '.join(['%s'] * len(news_ids))})
+        ORDER BY ctime DESC
+    """, news_ids)
+    return cursor.fetchall()
+
+
+# 写入评分结果：只写入仍待评分的记录（drain、stream 与合并分析可能同时处理同一条记录），返回是否写入
+def save_scores(cursor, record_id, hotspot_level, feature_scores_json, processed_at):
+    cursor.execute(f"""
+        UPDATE perception_cls_news
+        SET hotspot_level = %s, feature_scores = %s, processed_at = %s
+        WHERE id = %s AND {PENDING_CONDITION}
+    """, (hotspot_level, feature_scores_json, processed_at, record_id))
+    return cursor.rowcount == 1
+
+
+# 锁定仍待评分的记录并返回其 id 集合（在当前事务内持有锁），批量写入 0 级前调用，已由其他进程评分的记录不重复写入和累加
+def lock_pending_ids(cursor, news_ids):
+    news_ids = list(news_ids)
+    if not news_ids:
+        return set()
+    cursor.execute(f"""
+        SELECT id FROM perception_cls_news
+        WHERE {PENDING_CONDITION} AND id IN ({', '.join(['%s'] * len(news_ids))})
+        FOR UPDATE
+    """, news_ids)
+    return {row[0] for row in cursor.fetchall()}
+
+
+# 把本事务内实际写入评分的记录累加到热度汇总表，需在提交前调用
+def update_rollups(cursor, news_ids):
+    if ROLLUP_ENABLED:
+        accumulate_news(cursor, news_ids)
+
+
+# 检查并创建评分写入依赖的表（建表会隐式提交，需在写入评分前调用）
+# 评分来源表在只用远程评分时也需要：近重复继承会查询被继承新闻的评分来源
+def ensure_tables(cursor):
+    if ROLLUP_ENABLED:
+        ensure_rollup_table(cursor)
+    ensure_score_sources_table(cursor)
+
+
+# 标签全部属于 SKIP_TAGS 的记录用一条 UPDATE 写入 0 级，返回仍需评分的记录
+def skip_tagged_records(cursor, records):
+    tags_by_id = get_subject_tags_batch(cursor, [record_id for record_id, _ in records])
+    skip_ids = [record_id for record_id, _ in records if should_skip_processing(tags_by_id[record_id])]
+    if not skip_ids:
+        return list(records)
+    open_ids = lock_pending_ids(cursor, skip_ids)
+    skipped = set(skip_ids)
+    skip_ids = [record_id for record_id in skip_ids if record_id in open_ids]
+    if not skip_ids:
+        return [record for record in records if record[0] not in skipped]
+
+    cursor.execute(f"""
+        UPDATE perception_cls_news
+        SET hotspot_level = 0, feature_scores = NULL, processed_at = %s
+        WHERE id IN ({', '.join(['%s'] * len(skip_ids))})
+    """, (datetime.now(), *skip_ids))
+    update_rollups(cursor, skip_ids)
+    RECORDS_PROCESSED.labels(METRICS_STAGE, 'skipped').inc(len(skip_ids))
+    logging.info(f"{len(skip_ids)} 条记录按标签跳过评分: hotspot_level=0, feature_scores=NULL (id: {skip_ids})")
+    return [record for record in records if record[0] not in skipped]
+
+
+# 本地预评分高置信度为 0 级的记录用一条 UPDATE 写入 0 级（feature_scores 为 NULL，与标签跳过一致），返回仍需评分的记录
+def prescore_zero_records(cursor, records):
+    if not PRESCORE_ENABLED:
+        return list(records)
+    zero_ids = [record_id for record_id, content in records if is_confident_zero(prescore(content))]
+    if not zero_ids:
+        return list(records)
+    open_ids = lock_pending_ids(cursor, zero_ids)
+    zeroed = set(zero_ids)
+    zero_ids = [record_id for record_id in zero_ids if record_id in open_ids]
+    if not zero_ids:
+        return [record for record in records if record[0] not in zeroed]
+
+    cursor.execute(f"""
+        UPDATE perception_cls_news
+        SET hotspot_level = 0, feature_scores = NULL, processed_at = %s
+        WHERE id IN ({', '.join(['%s'] * len(zero_ids))})
+    """, (datetime.now(), *zero_ids))
+    update_rollups(cursor, zero_ids)
+    RECORDS_PROCESSED.labels(METRICS_STAGE, 'prescored').inc(len(zero_ids))
+    logging.info(f"{len(zero_ids)} 条记录经本地预评分判为 0 级，未调用 LLM (id: {zero_ids})")
+    return [record for record in records if record[0] not in zeroed]
+
+
+# 与已评分新闻近重复的记录继承其评分并记录近重复关系，返回仍需评分的记录
+# 被继承的评分来自本地模型时同时继承评分来源，训练时一并排除
+def inherit_duplicate_scores(cursor, records):
+    if not NEAR_DUP_ENABLED or not records:
+        return list(records)
+    if not near_dup_index.warmed:
+        ensure_duplicates_table(cursor)
+        near_dup_index.warm(cursor, "feature_scores IS NOT NULL")
+
+    matches = {}
+    for record_id, content in records:
+        match = near_dup_index.find(content, exclude_id=record_id)
+        if match:
+            matches[record_id] = match
+    if not matches:
+        return list(records)
+
+    canonical_ids = list({canonical_id for canonical_id, _ in matches.values()})
+    cursor.execute(f"""
+        SELECT n.id, n.hotspot_level, n.feature_scores, s.source, s.confidence
+        FROM perception_cls_news n
+        LEFT JOIN {SCORE_SOURCES_TABLE} s ON s.news_id = n.id
+        WHERE n.feature_scores IS NOT NULL AND n.id IN ({', '.join(['%s'] * len(canonical_ids))})
+    """, canonical_ids)
+    canonical_scores = {row[0]: row for row in cursor.fetchall()}
+
+    inherited = set()
+    taken = set()                    # 已由其他进程评分的记录
+    processed_at = datetime.now()
+    for record_id, (canonical_id, similarity) in matches.items():
+        if canonical_id not in canonical_scores:
+            continue
+        _, hotspot_level, feature_scores_json, source, confidence = canonical_scores[canonical_id]
+        if isinstance(feature_scores_json, bytes):
+            feature_scores_json = feature_scores_json.decode('utf-8')
+        if not save_scores(cursor, record_id, hotspot_level, feature_scores_json, processed_at):
+            taken.add(record_id)
+            continue
+        if source is not None:
+            record_score_source(cursor, record_id, source, confidence)
+        record_duplicate(cursor, record_id, canonical_id, similarity)
+        inherited.add(record_id)
+        RECORDS_PROCESSED.labels(METRICS_STAGE, 'inherited').inc()
+        logging.info(f"记录 {record_id} 与 {canonical_id} 近重复 (相似度 {similarity:.2f})，继承 hotspot_level={hotspot_level}")
+    update_rollups(cursor, inherited)
+    return [record for record in records if record[0] not in inherited and record[0] not in taken]
+
+
+# 写入评分结果（LLM 或本地模型），本地模型的评分记录来源与置信度，返回是否写入
+# 评分成功但记录已由其他进程评分时不写入，返回 False
+def apply_score_result(cursor, record_id, result):
+    scores, hotspot_level, processed_at, success, source, confidence = ScoreResult(*result)
+    if success:
+        if not save_scores(cursor, record_id, hotspot_level, json.dumps(scores), processed_at):
+            RECORDS_PROCESSED.labels(METRICS_STAGE, 'taken').inc()
+            logging.info(f"记录 {record_id} 已由其他进程评分，跳过写入")
+            return False
+        if source == 'llm':
+            RECORDS_PROCESSED.labels(METRICS_STAGE, 'scored').inc()
+            logging.info(f"记录 {record_id} 处理成功: hotspot_level={hotspot_level}, feature_scores={scores}")
+        else:
+            record_score_source(cursor, record_id, source, confidence)
+            RECORDS_PROCESSED.labels(METRICS_STAGE, source).inc()
+            logging.info(f"记录 {record_id} 由本地模型评分 (置信度 {confidence:.2f}): hotspot_level={hotspot_level}, feature_scores={scores}")
+    else:
+        cursor.execute(f"""
+            UPDATE perception_cls_news
+            SET processed_at = NULL
+            WHERE id = %s AND {PENDING_CONDITION}
+        """, (record_id,))
+        RECORDS_PROCESSED.labels(METRICS_STAGE, 'failed').inc()
+        logging.warning(f"记录 {record_id} 处理失败，processed_at 设为 NULL")
+    return success
+
+
+# 吞吐量统计（按行/分钟报告，用于对照爬取速率评估并发度）
+class ThroughputMeter:
+    def __init__(self, report_interval=THROUGHPUT_REPORT_INTERVAL):
+        self.report_interval = report_interval
+        self.started_at = time.time()
+        self.window_start = self.started_at
+        self.window_rows = 0
+        self.total_rows = 0
+
+    def add(self, rows=1):
+        self.window_rows += rows
+        self.total_rows += rows
+
+    def rows_per_minute(self):
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return self.total_rows / elapsed * 60
+
+    def maybe_report(self):
+        now = time.time()
+        elapsed = now - self.window_start
+        if elapsed < self.report_interval:
+            return False
+        logging.info(
+            f"评分吞吐: 最近 {elapsed:.0f} 秒处理 {self.window_rows} 行 "
+            f"({self.window_rows / elapsed * 60:.1f} 行/分钟)，"
+            f"累计 {self.total_rows} 行 (平均 {self.rows_per_minute():.1f} 行/分钟)"
+        )
+        self.window_start = now
+        self.window_rows = 0
+        return True
+
+
+# 过滤掉按标签跳过、本地预评分为 0 级和近重复继承的记录，本地模型评分的记录直接写入，
+# 其余按批量大小提交到线程池远程评分，返回 {future: 该批记录}
+def submit_scoring(executor, conn, cursor, records, batch_size=SCORING_BATCH_SIZE):
+    to_score = prescore_zero_records(cursor, skip_tagged_records(cursor, records))
+    to_score = inherit_duplicate_scores(cursor, to_score)
+    backend = get_scoring_backend()
+    local_results, to_score_remotely = backend.score_local(to_score)
+    apply_batch_results(conn, cursor, [record for record in to_score if record[0] in local_results], local_results)
+
+    futures = {}
+    for chunk in chunk_records(to_score_remotely, batch_size):
+        futures[executor.submit(backend.score_remote, chunk)] = chunk
+    return futures
+
+
+# 写入一批评分结果、累加热度汇总并提交，成功的记录加入近重复索引，返回失败的记录 id
+def apply_batch_results(conn, cursor, chunk, results):
+    failed_ids = []
+    scored_ids = []
+    for record_id, content in chunk:
+        result = results.get(record_id, FAILED_RESULT)
+        if apply_score_result(cursor, record_id, result):
+            near_dup_index.add(record_id, content)
+            scored_ids.append(record_id)
+        elif not ScoreResult(*result).success:
+            failed_ids.append(record_id)
+    update_rollups(cursor, scored_ids)
+    conn.commit()
+    return failed_ids
+
+
+# 并发评分一批记录：LLM 调用在线程池中执行，数据库写入和提交只在当前线程进行，返回失败的记录 id
+def score_records_concurrently(conn, cursor, records, max_workers=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    failed_ids = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = submit_scoring(executor, conn, cursor, records, batch_size)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                failed_ids.extend(apply_batch_results(conn, cursor, futures.pop(future), future.result()))
+    return failed_ids
+
+
 # 处理数据库中的记录
 def process_news_data():
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = instrument_connection(mysql.connector.connect(**db_config))
         cursor = conn.cursor()
+        ensure_tables(cursor)
 
-        # 优先处理 ctime 最新的记录
-        cursor.execute("""
-            SELECT id, content 
-            FROM perception_cls_news 
-            WHERE (hotspot_level IS NULL OR feature_scores IS NULL) 
-            ORDER BY ctime DESC 
-            LIMIT 10
-        """)
-        records = cursor.fetchall()
+        update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+        records = fetch_pending_records(cursor, 10)
 
         if not records:
             logging.info("没有待处理的记录")
             return
 
         logging.info(f"开始处理 {len(records)} 条记录")
-        for record in records:
-            record_id, content = record
-            tags = get_subject_tags(cursor, record_id)
-
-            if should_skip_processing(tags):
-                hotspot_level = 0
-                feature_scores_json = None
-                processed_at = datetime.now()
-                cursor.execute("""
-                    UPDATE perception_cls_news
-                    SET hotspot_level = %s, feature_scores = %s, processed_at = %s
-                    WHERE id = %s
-                """, (hotspot_level, feature_scores_json, processed_at, record_id))
-                logging.info(f"记录 {record_id} 跳过评分: hotspot_level=0, feature_scores=NULL (标签: {tags})")
-            else:
-                scores, hotspot_level, processed_at, success = process_record(record_id, content)
-                if success:
-                    feature_scores_json = json.dumps(scores)
-                    cursor.execute("""
-                        UPDATE perception_cls_news
-                        SET hotspot_level = %s, feature_scores = %s, processed_at = %s
-                        WHERE id = %s
-                    """, (hotspot_level, feature_scores_json, processed_at, record_id))
-                    logging.info(f"记录 {record_id} 处理成功: hotspot_level={hotspot_level}, feature_scores={scores}")
-                else:
-                    cursor.execute("""
-                        UPDATE perception_cls_news
-                        SET processed_at = NULL
-                        WHERE id = %s
-                    """, (record_id,))
-                    logging.warning(f"记录 {record_id} 处理失败，processed_at 设为 NULL")
-
-            conn.commit()
-
+        score_records_concurrently(conn, cursor, records)
         logging.info(f"本次处理完成，共处理 {len(records)} 条记录")
+        llm_cache.log_stats()
+
+    except mysql.connector.Error as db_err:
+        logging.error(f"数据库错误: {db_err}")
+    except Exception as e:
+        logging.error(f"未知错误: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+
+# 持续消化待评分记录：始终保持 max_workers 个 LLM 请求在途，每个请求的结果返回后立即提交
+def drain_news_data(max_workers=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    meter = ThroughputMeter()
+    in_flight = {}       # future -> 该请求包含的记录
+    failed_until = {}    # record_id -> 冷却结束时间
+    try:
+        conn = instrument_connection(mysql.connector.connect(**db_config))
+        cursor = conn.cursor()
+        ensure_tables(cursor)
+        logging.info(f"持续评分模式启动，并发数 {max_workers}，每请求 {batch_size} 条")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                now = time.time()
+                failed_until = {rid: until for rid, until in failed_until.items() if until > now}
+
+                records = []
+                free_slots = max_workers - len(in_flight)
+                if free_slots > 0:
+                    # 结束上一个只读快照，才能看到爬虫新写入的记录
+                    conn.commit()
+                    exclude_ids = {rid for chunk in in_flight.values() for rid, _ in chunk} | set(failed_until)
+                    records = fetch_pending_records(cursor, free_slots * batch_size, exclude_ids)
+                    submitted = submit_scoring(executor, conn, cursor, records, batch_size)
+                    meter.add(len(records) - sum(len(chunk) for chunk in submitted.values()))
+                    in_flight.update(submitted)
+
+                if not in_flight:
+                    if meter.maybe_report():
+                        llm_cache.log_stats()
+                        update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+                    if not records:
+                        time.sleep(DRAIN_IDLE_SECONDS)
+                    continue
+
+                done, _ = wait(in_flight, timeout=THROUGHPUT_REPORT_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = in_flight.pop(future)
+                    for record_id in apply_batch_results(conn, cursor, chunk, future.result()):
+                        failed_until[record_id] = time.time() + FAILED_RETRY_COOLDOWN
+                    meter.add(len(chunk))
+                if meter.maybe_report():
+                    llm_cache.log_stats()
+                    update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+
+    except mysql.connector.Error as db_err:
+        logging.error(f"数据库错误: {db_err}")
+    except Exception as e:
+        logging.error(f"未知错误: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+        logging.info(f"持续评分模式退出，累计处理 {meter.total_rows} 行，平均 {meter.rows_per_minute():.1f} 行/分钟")
+
+
+# 流式模式：消费爬虫发布到本地队列的新闻 id，入队后立即评分，并记录端到端延迟
+def stream_news_data(max_workers=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    queue = NewsQueue()
+    last_sweep = 0.0
+    last_latency_log = time.time()
+    try:
+        conn = instrument_connection(mysql.connector.connect(**db_config))
+        cursor = conn.cursor()
+        ensure_tables(cursor)
+        logging.info(f"流式评分模式启动，并发数 {max_workers}，每请求 {batch_size} 条")
+
+        while True:
+            if time.time() - last_sweep >= STREAM_SWEEP_INTERVAL:
+                # 兜底：补处理爬虫未发布到队列的记录（如补采数据）
+                process_news_data()
+                last_sweep = time.time()
+
+            messages = queue.consume(HOTSPOT_CONSUMER, STREAM_MAX_MESSAGES, STREAM_WAIT_SECONDS)
+            if messages:
+                first_messages = {}
+                for message in messages:
+                    first_messages.setdefault(message[1], message)
+
+                # 结束上一个只读快照，才能看到爬虫刚写入的记录
+                conn.commit()
+                records = fetch_pending_records_by_ids(cursor, first_messages)
+                if records:
+                    failed_ids = set(score_records_concurrently(conn, cursor, records, max_workers, batch_size))
+                    done_messages = [first_messages[record_id] for record_id, _ in records if record_id not in failed_ids]
+                    queue.record_latency(HOTSPOT_CONSUMER, done_messages)
+                    observe_pipeline_latency(HOTSPOT_CONSUMER, done_messages)
+                queue.ack(HOTSPOT_CONSUMER, messages[-1][0])
+
+            if time.time() - last_latency_log >= THROUGHPUT_REPORT_INTERVAL:
+                queue.log_latency(HOTSPOT_CONSUMER)
+                update_queue_backlog(queue, HOTSPOT_CONSUMER)
+                update_backlog(cursor, METRICS_STAGE, PENDING_CONDITION)
+                last_latency_log = time.time()
 
     except mysql.connector.Error as db_err:
         logging.error(f"数据库错误: {db_err}")
@@ -185,7 +712,35 @@ def run_scheduler():
             time.sleep(5)
 
 
+# 持续评分模式（带重启逻辑）
+def run_drain(max_workers=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    while True:
+        drain_news_data(max_workers, batch_size)
+        logging.error("持续评分模式中断，将在5秒后重启")
+        time.sleep(5)
+
+
+# 流式模式（带重启逻辑）
+def run_stream(max_workers=SCORING_CONCURRENCY, batch_size=SCORING_BATCH_SIZE):
+    while True:
+        stream_news_data(max_workers, batch_size)
+        logging.error("流式评分模式中断，将在5秒后重启")
+        time.sleep(5)
+
+
 if __name__ == "__main__":
-    logging.info("脚本启动，处理所有未处理数据")
-    process_news_data()
-    run_scheduler()
\ No newline at end of file
+    # python hot_spot_detector.py drain [并发数] [每请求条数]：持续消化待评分记录
+    # python hot_spot_detector.py stream [并发数] [每请求条数]：消费爬虫发布的新闻队列，入队即评分
+    start_metrics_server(HOTSPOT_METRICS_PORT)
+    if len(sys.argv) > 1 and sys.argv[1] in ("drain", "stream"):
+        concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else SCORING_CONCURRENCY
+        batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else SCORING_BATCH_SIZE
+        logging.info(f"脚本启动，{sys.argv[1]} 模式，并发数 {concurrency}，每请求 {batch_size} 条")
+        if sys.argv[1] == "drain":
+            run_drain(concurrency, batch_size)
+        else:
+            run_stream(concurrency, batch_size)
+    else:
+        logging.info("脚本启动，处理所有未处理数据")
+        process_news_data()
+        run_scheduler()
\ No newline at end of file
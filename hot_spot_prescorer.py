@@ -0,0 +1,156 @@
+import re
+import sys
+import json
+from collections import deque, namedtuple, Counter
+
+# 本地预评分：多模式匹配（Aho–Corasick）+ 简单规则，把明显为 0 热度的例行市场消息直接判为 0 级，其余交给 LLM
+
+# 各维度的触发词：命中任一维度说明可能有热度，必须交给 LLM 评分
+DIMENSION_KEYWORDS = {
+    '冲突性': ['制裁', '冲突', '战争', '袭击', '空袭', '导弹', '反制', '对峙', '抗议', '罢工', '加征关税', '报复', '军演', '交火', '停火', '封锁'],
+    '名人效应': ['总统', '主席', '总理', '首相', '国务卿', '领导人', '马斯克', '黄仁勋', '特朗普', '拜登', '普京', '泽连斯基', '奥特曼', '巴菲特', '鲍威尔'],
+    '突发性': ['地震', '爆炸', '事故', '火灾', '台风', '坠毁', '突发', '暴雨', '洪水', '疫情', '遇难', '伤亡', '紧急', '将于', '即将', '宣布'],
+    '经济敏感议题': ['贸易', '供应链', '出口管制', '降准', '降息', '加息', '汇率', '通胀', 'GDP', '财政', '稀土', '关税', '反倾销', '实体清单', '国债'],
+    '社会/文化热点': ['票房', '教育', '高考', '消费券', '医保', '养老', '就业', '生育', '房价', '以旧换新', '食品安全', '网红'],
+    '科技突破': ['人工智能', 'AI', '大模型', '芯片', '量子', '发射', '航天', '卫星', '首次', '突破', '机器人', '光刻', '算力'],
+    '外交动态': ['外交部', '会谈', '会晤', '访华', '出访', '峰会', '联合国', '大使', '双边', '磋商', '联合声明', '通话', '建交'],
+}
+
+# 例行市场消息特征词
+ROUTINE_KEYWORDS = [
+    '涨停', '跌停', '收涨', '收跌', '涨超', '跌超', '盘中', '开盘', '收盘', '午盘', '成交额', '主力资金',
+    '龙虎榜', '报价', '中标', '回购', '减持', '增持', '质押', '净买入', '净卖出', '板块', '个股', '拉升',
+    '异动', '涨幅', '跌幅', '融资余额', '主力合约', '大宗交易', '北向资金', '限售股', '解禁', '股价', '市值',
+]
+
+PERCENT_PATTERN = re.compile(r'\d+(?:\.\d+)?%')
+
+PRESCORE_CONFIDENCE_THRESHOLD = 0.8  # 置信度不低于该值时直接判为 0 级
+
+PrescoreResult = namedtuple('PrescoreResult', ['level', 'confidence', 'dimension_hits', 'routine_hits'])
+
+
+# Aho–Corasick 自动机：一次扫描找出文本中出现的全部关键词
+class AhoCorasick:
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, word, payload):
+        state = 0
+        for char in word:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(payload)
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        return self
+
+    def find_all(self, text):
+        state = 0
+        found = []
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found.extend(self.output[state])
+        return found
+
+
+def build_matcher():
+    matcher = AhoCorasick()
+    for dimension, keywords in DIMENSION_KEYWORDS.items():
+        for keyword in keywords:
+            matcher.add(keyword, dimension)
+    for keyword in ROUTINE_KEYWORDS:
+        matcher.add(keyword, None)
+    return matcher.build()
+
+
+matcher = build_matcher()
+
+
+# 预评分：没有任何维度触发词、且带有例行市场消息特征时判为 0 级，否则 level 为 None（交给 LLM）
+def prescore(content):
+    hits = matcher.find_all(content or '')
+    dimension_hits = Counter(hit for hit in hits if hit is not None)
+    routine_hits = sum(1 for hit in hits if hit is None)
+    if dimension_hits or not routine_hits:
+        return PrescoreResult(None, 0.0, dict(dimension_hits), routine_hits)
+
+    confidence = 0.6 + 0.1 * min(routine_hits, 3)
+    if PERCENT_PATTERN.search(content):
+        confidence += 0.05
+    return PrescoreResult(0, min(confidence, 0.99), {}, routine_hits)
+
+
+def is_confident_zero(result, threshold=PRESCORE_CONFIDENCE_THRESHOLD):
+    return result.level == 0 and result.confidence >= threshold
+
+
+# 校准报告：用库中已由 LLM 评分的记录检验预评分的精确率与节省的调用数
+def calibrate(limit=5000):
+    import mysql.connector
+    from config import db_config
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, content, hotspot_level, feature_scores
+        FROM perception_cls_news
+        WHERE feature_scores IS NOT NULL
+        ORDER BY ctime DESC
+        LIMIT %s
+    """, (limit,))
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    total = len(rows)
+    actual_zero = 0
+    results = []
+    for _, content, hotspot_level, feature_scores in rows:
+        if isinstance(feature_scores, (bytes, bytearray)):
+            feature_scores = feature_scores.decode('utf-8')
+        scores = json.loads(feature_scores) if isinstance(feature_scores, str) else feature_scores
+        is_zero = hotspot_level == 0 or not any(scores.values())
+        actual_zero += is_zero
+        results.append((prescore(content), is_zero, hotspot_level))
+
+    print(f"校准样本: {total} 条已由 LLM 评分的记录，其中实际 0 级 {actual_zero} 条")
+    for threshold in (0.7, 0.8, 0.9):
+        predicted = [(is_zero, level) for result, is_zero, level in results if is_confident_zero(result, threshold)]
+        correct = sum(1 for is_zero, _ in predicted if is_zero)
+        precision = correct / len(predicted) if predicted else 0.0
+        recall = correct / actual_zero if actual_zero else 0.0
+        saved = len(predicted) / total if total else 0.0
+        missed_levels = Counter(level for is_zero, level in predicted if not is_zero)
+        print(
+            f"阈值 {threshold:.1f}: 判为 0 级 {len(predicted)} 条，精确率 {precision:.1%}，"
+            f"0 级召回率 {recall:.1%}，节省调用 {saved:.1%}，误判等级分布 {dict(sorted(missed_levels.items()))}"
+        )
+
+
+if __name__ == "__main__":
+    # python hot_spot_prescorer.py calibrate [样本数]
+    if len(sys.argv) > 1 and sys.argv[1] == "calibrate":
+        calibrate(int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    else:
+        for line in sys.stdin:
+            print(prescore(line.strip()))
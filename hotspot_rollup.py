@@ -0,0 +1,193 @@
+import sys
+import logging
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+# 热度汇总表：按 主题 x 时间桶（小时/天，按新闻发布时间 ctime）预聚合条数、热点等级与 7 个维度评分的和与最大值
+# 热度计算写入评分时在同一事务内增量累加；看板按主题查询趋势时只读汇总表，不再扫描新闻表
+ROLLUP_TABLE = 'perception_hotspot_rollups'
+ROLLUP_BUCKETS = {
+    'hour': "FROM_UNIXTIME(n.ctime - MOD(n.ctime, 3600))",
+    'day': "CAST(DATE(FROM_UNIXTIME(n.ctime)) AS DATETIME)",
+}
+ALL_SUBJECTS_ID = 0              # subject_id=0 汇总全部新闻（含无主题标签的新闻）
+ALL_SUBJECTS_NAME = '全部'
+HOT_LEVEL_THRESHOLD = 4          # hotspot_level 不低于该值计为热点新闻
+
+# 评分维度与汇总表字段前缀
+DIMENSION_COLUMNS = {
+    "冲突性": "conflict",
+    "名人效应": "celebrity",
+    "突发性": "suddenness",
+    "经济敏感议题": "economic",
+    "社会/文化热点": "social",
+    "科技突破": "tech",
+    "外交动态": "diplomacy",
+}
+
+DEFAULT_TREND_DAYS = 7
+DEFAULT_TOP_LIMIT = 20
+
+
+# 检查并创建热度汇总表
+def ensure_rollup_table(cursor):
+    dimension_columns = ",\n".join(
+        f"                {column}_sum INT NOT NULL DEFAULT 0,\n                {column}_max TINYINT NOT NULL DEFAULT 0"
+        for column in DIMENSION_COLUMNS.values()
+    )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+            granularity VARCHAR(8) NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            subject_id INT NOT NULL,
+            subject_name VARCHAR(255),
+            news_count INT NOT NULL DEFAULT 0,
+            level_sum INT NOT NULL DEFAULT 0,
+            level_max TINYINT NOT NULL DEFAULT 0,
+            hot_count INT NOT NULL DEFAULT 0,
+            scored_count INT NOT NULL DEFAULT 0,
+{dimension_columns},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (granularity, subject_id, bucket_start),
+            KEY idx_bucket (granularity, bucket_start)
+        )
+    """)
+
+
+# 把满足 condition 的已评分新闻累加到汇总表：每个粒度两条 INSERT ... SELECT，分别按主题标签和全部新闻汇总
+# 和与计数直接累加，最大值取较大者（新闻被重新评分导致最大值下降时需用 rebuild 重算）
+def accumulate(cursor, condition, params=()):
+    aggregates = [
+        "COUNT(*)",
+        "SUM(n.hotspot_level)",
+        "MAX(n.hotspot_level)",
+        f"SUM(n.hotspot_level >= {HOT_LEVEL_THRESHOLD})",
+        "COUNT(n.feature_scores)",
+    ]
+    columns = ["news_count", "level_sum", "level_max", "hot_count", "scored_count"]
+    for dimension, column in DIMENSION_COLUMNS.items():
+        score = f"""COALESCE(CAST(n.feature_scores->>'$."{dimension}"' AS SIGNED), 0)"""
+        aggregates += [f"SUM({score})", f"MAX({score})"]
+        columns += [f"{column}_sum", f"{column}_max"]
+    updates = ", ".join(
+        f"{column} = GREATEST({column}, VALUES({column}))" if column.endswith('_max')
+        else f"{column} = {column} + VALUES({column})"
+        for column in columns
+    )
+
+    sources = [
+        # 按主题标签汇总
+        ("COALESCE(s.subject_id, -1)", "MAX(s.subject_name)", "JOIN perception_cls_news_subjects s ON s.news_id = n.id"),
+        # 全部新闻汇总
+        (str(ALL_SUBJECTS_ID), f"'{ALL_SUBJECTS_NAME}'", ""),
+    ]
+    for granularity, bucket in ROLLUP_BUCKETS.items():
+        for subject_id, subject_name, join in sources:
+            cursor.execute(f"""
+                INSERT INTO {ROLLUP_TABLE} (granularity, bucket_start, subject_id, subject_name, {', '.join(columns)})
+                SELECT '{granularity}', {bucket} AS bucket, {subject_id} AS subject, {subject_name}, {', '.join(aggregates)}
+                FROM perception_cls_news n {join}
+                WHERE {condition} AND n.hotspot_level IS NOT NULL
+                GROUP BY bucket, subject
+                ON DUPLICATE KEY UPDATE {updates}
+            """, params)
+
+
+# 增量累加刚写入评分的新闻，与评分写入在同一事务中调用
+# 累加不可重复：news_ids 只能包含本事务内实际写入评分的新闻（save_scores 返回 True 或经 lock_pending_ids 锁定后写入的）
+def accumulate_news(cursor, news_ids):
+    news_ids = list(news_ids)
+    if news_ids:
+        accumulate(cursor, f"n.id IN ({', '.join(['%s'] * len(news_ids))})", news_ids)
+
+
+# 补算历史数据：按天删除 [start_date, end_date) 内的汇总行并从新闻表重新汇总，每天单独提交
+# 日期按数据库会话时区解释，与汇总时的时间桶一致；补算期间正在写入的当天数据建议在评分服务停止后重算
+def rebuild_rollups(conn, cursor, start_date, end_date):
+    day = start_date
+    while day < end_date:
+        day_start, day_end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+        cursor.execute(f"""
+            DELETE FROM {ROLLUP_TABLE}
+            WHERE bucket_start >= %s AND bucket_start < %s
+        """, (day_start, day_end))
+        accumulate(cursor, "n.ctime >= UNIX_TIMESTAMP(%s) AND n.ctime < UNIX_TIMESTAMP(%s)", (day_start, day_end))
+        conn.commit()
+        logging.info(f"热度汇总已重算 {day_start}")
+        day += timedelta(days=1)
+
+
+# 某主题在时间范围内的热度趋势，返回 [(bucket_start, news_count, 平均等级, level_max, hot_count, {维度: 平均分})]
+def subject_trend(cursor, subject_id=ALL_SUBJECTS_ID, granularity='hour', start=None, end=None):
+    end = end or datetime.now()
+    start = start or end - timedelta(days=DEFAULT_TREND_DAYS)
+    dimension_sums = ", ".join(f"{column}_sum" for column in DIMENSION_COLUMNS.values())
+    cursor.execute(f"""
+        SELECT bucket_start, news_count, level_sum, level_max, hot_count, scored_count, {dimension_sums}
+        FROM {ROLLUP_TABLE}
+        WHERE granularity = %s AND subject_id = %s AND bucket_start >= %s AND bucket_start < %s
+        ORDER BY bucket_start
+    """, (granularity, subject_id, start, end))
+    trend = []
+    for bucket_start, news_count, level_sum, level_max, hot_count, scored_count, *sums in cursor.fetchall():
+        dimension_avgs = {
+            dimension: value / scored_count if scored_count else 0.0
+            for dimension, value in zip(DIMENSION_COLUMNS, sums)
+        }
+        trend.append((bucket_start, news_count, level_sum / news_count if news_count else 0.0, level_max, hot_count, dimension_avgs))
+    return trend
+
+
+# 时间范围内热度最高的主题（按热点等级之和排序），返回 [(subject_id, subject_name, news_count, level_sum, level_max, hot_count)]
+def top_subjects(cursor, granularity='hour', start=None, end=None, limit=DEFAULT_TOP_LIMIT):
+    end = end or datetime.now()
+    start = start or end - timedelta(days=1)
+    cursor.execute(f"""
+        SELECT subject_id, MAX(subject_name), SUM(news_count), SUM(level_sum), MAX(level_max), SUM(hot_count)
+        FROM {ROLLUP_TABLE}
+        WHERE granularity = %s AND bucket_start >= %s AND bucket_start < %s AND subject_id <> %s
+        GROUP BY subject_id
+        ORDER BY SUM(level_sum) DESC
+        LIMIT %s
+    """, (granularity, start, end, ALL_SUBJECTS_ID, limit))
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    # python hotspot_rollup.py rebuild <开始日期> [结束日期]：补算历史汇总（日期格式 YYYY-MM-DD，结束日期默认今天，不含）
+    # python hotspot_rollup.py trend <subject_id> [hour|day] [天数]：输出主题热度趋势（subject_id=0 为全部新闻）
+    # python hotspot_rollup.py top [天数]：输出热度最高的主题
+    from config import db_config, setup_cli_logging
+    setup_cli_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    try:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        ensure_rollup_table(cursor)
+        if command == "rebuild" and len(sys.argv) > 2:
+            start_date = date.fromisoformat(sys.argv[2])
+            end_date = date.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else date.today()
+            rebuild_rollups(conn, cursor, start_date, end_date)
+        elif command == "trend" and len(sys.argv) > 2:
+            granularity = sys.argv[3] if len(sys.argv) > 3 else 'hour'
+            days = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_TREND_DAYS
+            end = datetime.now()
+            for bucket_start, news_count, avg_level, level_max, hot_count, _ in subject_trend(
+                    cursor, int(sys.argv[2]), granularity, end - timedelta(days=days), end):
+                print(f"{bucket_start}  {news_count:>6} 条  平均等级 {avg_level:.2f}  最高 {level_max}  热点 {hot_count}")
+        elif command == "top":
+            days = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+            end = datetime.now()
+            for subject_id, subject_name, news_count, level_sum, level_max, hot_count in top_subjects(
+                    cursor, 'hour', end - timedelta(days=days), end):
+                print(f"{subject_id:>8} {subject_name}  {news_count} 条  等级和 {level_sum}  最高 {level_max}  热点 {hot_count}")
+        else:
+            print("用法: python hotspot_rollup.py rebuild <开始日期> [结束日期] | trend <subject_id> [hour|day] [天数] | top [天数]")
+    except mysql.connector.Error as e:
+        logging.error(f"数据库错误: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+
+# 本地缓存配置（热度评分与未来事件抽取共用同一个缓存文件）
+LLM_CACHE_PATH = '/var/cache/media_corpus_perception/llm_cache.sqlite3'
+LLM_CACHE_MAX_ENTRIES = 200000           # 超出后按最近访问时间淘汰
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600    # 条目有效期
+LLM_CACHE_EVICT_EVERY = 500              # 每写入多少条检查一次淘汰
+
+
+# 归一化新闻内容：全半角统一并去掉所有空白，转载稿只差排版时可命中同一条缓存
+def normalize_content(content):
+    text = unicodedata.normalize('NFKC', content or '')
+    return ''.join(text.split())
+
+
+# 根据提示词文本生成版本号，提示词改动后旧缓存自动失效
+def prompt_fingerprint(*parts):
+    digest = hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+    return digest[:16]
+
+
+# 提示词含当前日期时把日期并入提示词版本：相对时间的换算和“晚于当前时间”的筛选随日期变化，跨日后旧结果不再命中
+def dated_prompt_version(prompt_version, current_time):
+    return f"{prompt_version}@{current_time}"
+
+
+# 缓存键：归一化内容哈希 + 提示词版本 + 模型名
+def make_cache_key(content, prompt_version, model):
+    raw = f"{model}\x1f{prompt_version}\x1f{normalize_content(content)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# 基于 SQLite 的 LLM 响应缓存（线程安全，多进程共享同一文件）
+class LLMResponseCache:
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    # 查询缓存，未命中或已过期返回 None
+    def get(self, content, prompt_version, model):
+        key = make_cache_key(content, prompt_version, model)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl_seconds:
+                    self.misses += 1
+                    return None
+                conn.execute(
+                    "UPDATE llm_cache SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                    (now, key)
+                )
+                conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logging.warning(f"读取 LLM 缓存失败: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+    # 写入缓存（只缓存成功解析的响应）
+    def put(self, content, prompt_version, model, response):
+        key = make_cache_key(content, prompt_version, model)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("""
+                    INSERT OR REPLACE INTO llm_cache
+                        (cache_key, prompt_version, model, response, created_at, last_access, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                """, (key, prompt_version, model, json.dumps(response, ensure_ascii=False), now, now))
+                conn.commit()
+                self._writes += 1
+                if self._writes % LLM_CACHE_EVICT_EVERY == 0:
+                    self._evict(conn, now)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"写入 LLM 缓存失败: {e}")
+
+    # 淘汰过期条目，再按最近访问时间裁剪到 max_entries
+    def _evict(self, conn, now):
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        total = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = max(0, total - self.max_entries)
+        if overflow:
+            conn.execute("""
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_access LIMIT ?
+                )
+            """, (overflow,))
+        conn.commit()
+        if expired or overflow:
+            logging.info(f"LLM 缓存淘汰: 过期 {expired} 条，超量 {overflow} 条")
+
+    def evict(self):
+        with self._lock:
+            self._evict(self._connect(), time.time())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+            }
+
+    def log_stats(self):
+        try:
+            s = self.stats()
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"读取 LLM 缓存统计失败: {e}")
+            return
+        logging.info(
+            f"LLM 缓存统计: 命中 {s['hits']} 次，未命中 {s['misses']} 次，"
+            f"命中率 {s['hit_rate']:.1%}，缓存条目 {s['entries']}"
+        )
+
+
+if __name__ == "__main__":
+    # python llm_cache.py：按提示词版本和模型汇总缓存条目与累计命中次数
+    cache = LLMResponseCache()
+    rows = cache._connect().execute("""
+        SELECT model, prompt_version, COUNT(*), SUM(hit_count)
+        FROM llm_cache GROUP BY model, prompt_version
+    """).fetchall()
+    for model, prompt_version, entries, hit_count in rows:
+        print(f"{model}  {prompt_version}  条目 {entries}  累计命中 {hit_count}")
@@ -0,0 +1,300 @@
+import time
+import heapq
+import random
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from metrics import (
+    LLM_CIRCUIT_OPEN, LLM_REQUEST_RATE_LIMIT, LLM_RETRIES, LLM_THROTTLE_SECONDS,
+    chat_completion as timed_chat_completion
+)
+
+# LLM 服务商配额（按账号实际配额填写；热度计算与未来事件抽取同时运行时各按 quota_share 分得一部分）
+LLM_REQUESTS_PER_MINUTE = 1000
+LLM_TOKENS_PER_MINUTE = 500000
+BURST_SECONDS = 10                   # 令牌桶容量：允许突发的配额秒数
+
+# 请求 token 估算（发送前按估算扣减，返回后按 usage 校正）
+CHARS_PER_TOKEN = 1.5
+COMPLETION_TOKEN_ESTIMATE = 300
+
+# 自适应限速：收到 429 时请求速率减半，之后每次成功按配额的 2% 逐步恢复
+RATE_LIMIT_DECREASE = 0.5
+RATE_LIMIT_RECOVERY = 0.02
+MIN_RATE_FRACTION = 0.1
+
+# 重试退避：全抖动指数退避，服务端给出 Retry-After 时以其为准
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 60
+
+# 熔断：连续失败（连接错误、超时、5xx）达到阈值后暂停调用，冷却后放行一次试探请求
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 60
+
+# 不可重试的状态码（请求本身有误，重试无意义）
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LLM 接口熔断中，{retry_after:.0f} 秒后试探恢复")
+        self.retry_after = retry_after
+
+
+# 令牌桶：按每分钟配额匀速补充，可透支（按实际用量校正后），透支部分由后续请求等待偿还
+class TokenBucket:
+    def __init__(self, per_minute, burst_seconds=BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self.set_rate(per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, per_minute):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * self.burst_seconds)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # 取走 amount 个令牌（超过容量的按容量计），不足时等待，返回等待秒数
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    # 按实际用量补扣或退还（amount 可为负）
+    def adjust(self, amount):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+# 请求数与 token 数双令牌桶，请求速率按 429 自适应（AIMD）
+class AdaptiveRateLimiter:
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.max_requests_per_minute = requests_per_minute
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+
+    @property
+    def requests_per_minute(self):
+        return self.requests.per_minute
+
+    # 按比例缩小配额（多进程共用同一账号时）
+    def scale(self, factor):
+        with self._lock:
+            self.max_requests_per_minute *= factor
+            self.requests.set_rate(self.requests.per_minute * factor)
+            self.tokens.set_rate(self.tokens.per_minute * factor)
+
+    def acquire(self, estimated_tokens):
+        return self.requests.acquire(1) + self.tokens.acquire(estimated_tokens)
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def on_success(self):
+        with self._lock:
+            current = self.requests.per_minute
+            if current < self.max_requests_per_minute:
+                self.requests.set_rate(min(self.max_requests_per_minute, current + self.max_requests_per_minute * RATE_LIMIT_RECOVERY))
+
+    def on_rate_limited(self):
+        with self._lock:
+            floor = self.max_requests_per_minute * MIN_RATE_FRACTION
+            self.requests.set_rate(max(floor, self.requests.per_minute * RATE_LIMIT_DECREASE))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    # 熔断期间抛出 CircuitOpenError；冷却结束后只放行一个试探请求
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0 or self.trial_in_flight:
+                raise CircuitOpenError(max(remaining, 0.0))
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    # 返回本次失败是否触发了熔断
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+                return True
+            return False
+
+
+def estimate_tokens(messages):
+    chars = sum(len(message.get('content') or '') for message in messages)
+    return int(chars / CHARS_PER_TOKEN) + COMPLETION_TOKEN_ESTIMATE
+
+
+def status_code_of(error):
+    return getattr(error, 'status_code', None)
+
+
+# 从 429/503 响应头读取 Retry-After（秒或 HTTP 日期），没有时返回 None
+def retry_after_seconds(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# 熔断期间不在本次调用内重试：记录保持待处理，熔断恢复后由下一轮处理
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    return status_code_of(error) not in NON_RETRYABLE_STATUS
+
+
+# 连接错误、超时和 5xx 计入熔断；429 与返回内容解析失败不计入
+def is_endpoint_failure(error):
+    status_code = status_code_of(error)
+    if status_code is not None:
+        return status_code >= 500
+    return not isinstance(error, (ValueError, KeyError, TypeError, IndexError))
+
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+# LLM 调用入口：限速、熔断、重试与指标，同一进程内各线程共用
+class LLMGateway:
+    def __init__(self, stage, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE, quota_share=1.0):
+        self.stage = stage
+        self.limiter = AdaptiveRateLimiter(requests_per_minute * quota_share, tokens_per_minute * quota_share)
+        self.breaker = CircuitBreaker()
+        LLM_REQUEST_RATE_LIMIT.labels(stage).set(self.limiter.requests_per_minute)
+
+    # 单次请求（不重试）：熔断检查 -> 令牌桶等待 -> 调用并按返回的 usage 校正 token 用量
+    def chat_completion(self, client, **kwargs):
+        self.breaker.allow()
+        estimated = estimate_tokens(kwargs.get('messages', []))
+        waited = self.limiter.acquire(estimated)
+        if waited:
+            LLM_THROTTLE_SECONDS.labels(self.stage).inc(waited)
+        try:
+            response = timed_chat_completion(client, self.stage, **kwargs)
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        usage = getattr(response, 'usage', None)
+        self.limiter.reconcile(estimated, getattr(usage, 'total_tokens', None))
+        self.limiter.on_success()
+        self.breaker.record_success()
+        LLM_CIRCUIT_OPEN.labels(self.stage).set(0)
+        LLM_REQUEST_RATE_LIMIT.labels(self.stage).set(self.limiter.requests_per_minute)
+        return response
+
+    def _record_failure(self, error):
+        if is_endpoint_failure(error):
+            if self.breaker.record_failure():
+                LLM_CIRCUIT_OPEN.labels(self.stage).set(1)
+                logging.error(f"LLM 接口连续失败，熔断 {self.breaker.reset_seconds} 秒: {error}")
+            return
+        # 接口有响应（429 或其他 4xx），说明服务可用
+        self.breaker.record_success()
+        LLM_CIRCUIT_OPEN.labels(self.stage).set(0)
+        if status_code_of(error) == 429:
+            self.limiter.on_rate_limited()
+            LLM_REQUEST_RATE_LIMIT.labels(self.stage).set(self.limiter.requests_per_minute)
+            logging.warning(f"LLM 接口限流 (429)，请求速率降至 {self.limiter.requests_per_minute:.0f} 次/分钟")
+
+    # 阻塞式重试：func 完成一次请求与解析，失败按退避等待后重试，最终失败时抛出最后一次的异常
+    def call_with_retries(self, func, max_attempts=3, description="LLM 调用"):
+        for attempt in range(max_attempts):
+            try:
+                return func()
+            except Exception as e:
+                if attempt == max_attempts - 1 or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, retry_after_seconds(e))
+                LLM_RETRIES.labels(self.stage).inc()
+                logging.warning(f"{description}失败 (尝试 {attempt + 1}/{max_attempts}): {e}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+
+    # 延迟重试队列：逐个处理 items，失败的条目按退避时间推迟重试，期间继续处理其他条目
+    # 依次产出 (item, result, error)，成功时 error 为 None，最终失败时 result 为 None
+    def run_deferred(self, items, func, max_attempts=3):
+        pending = deque(items)
+        deferred = []  # (重试时间, 序号, item, 已尝试次数)
+        sequence = 0
+        while pending or deferred:
+            if deferred and (not pending or deferred[0][0] <= time.monotonic()):
+                due, _, item, attempt = heapq.heappop(deferred)
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            else:
+                item, attempt = pending.popleft(), 0
+
+            try:
+                result = func(item)
+            except Exception as e:
+                if attempt + 1 < max_attempts and is_retryable(e):
+                    delay = backoff_delay(attempt, retry_after_seconds(e))
+                    LLM_RETRIES.labels(self.stage).inc()
+                    logging.warning(f"LLM 调用失败 (尝试 {attempt + 1}/{max_attempts}): {e}，{delay:.1f} 秒后重试，先处理其他条目")
+                    sequence += 1
+                    heapq.heappush(deferred, (time.monotonic() + delay, sequence, item, attempt + 1))
+                else:
+                    yield item, None, e
+                continue
+            yield item, result, None
@@ -0,0 +1,174 @@
+import time
+import logging
+
+import requests
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# 各服务共用的指标：HTTP 抓取、LLM 调用、数据库读写、积压量和端到端延迟
+# 每个进程在本地端口提供 /metrics，由 Prometheus 抓取，按 job 区分服务
+METRICS_HOST = '127.0.0.1'
+CRAWLER_METRICS_PORT = 9101
+HOTSPOT_METRICS_PORT = 9102
+FUTURE_EVENTS_METRICS_PORT = 9103
+COMBINED_METRICS_PORT = 9104
+FUTURE_EVENTS_WORKER_METRICS_PORT_BASE = 9110   # 堆积任务 worker 进程依次使用 9110、9111 ...
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'perception_http_request_seconds', '外部 HTTP 请求耗时', ['endpoint', 'status'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 15, 30)
+)
+LLM_REQUEST_SECONDS = Histogram(
+    'perception_llm_request_seconds', 'LLM 调用耗时', ['stage', 'outcome'],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+LLM_TOKENS = Counter('perception_llm_tokens_total', 'LLM 消耗的 token 数（以接口返回的 usage 为准）', ['stage', 'kind'])
+LLM_RETRIES = Counter('perception_llm_retries_total', 'LLM 调用或解析失败后的重试次数', ['stage'])
+LLM_THROTTLE_SECONDS = Counter('perception_llm_throttle_seconds_total', '本地限速器等待配额的累计秒数', ['stage'])
+LLM_REQUEST_RATE_LIMIT = Gauge('perception_llm_rpm_limit', '当前自适应请求速率上限（次/分钟）', ['stage'])
+LLM_CIRCUIT_OPEN = Gauge('perception_llm_circuit_open', 'LLM 接口是否处于熔断状态', ['stage'])
+DB_QUERY_SECONDS = Histogram(
+    'perception_db_query_seconds', '数据库语句与提交耗时', ['operation'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+DB_ERRORS = Counter('perception_db_errors_total', '数据库语句执行失败次数', ['operation'])
+RECORDS_PROCESSED = Counter('perception_records_processed_total', '处理完成的新闻条数', ['stage', 'outcome'])
+BACKLOG_ROWS = Gauge('perception_backlog_rows', '库中待处理的新闻条数', ['stage'])
+QUEUE_BACKLOG = Gauge('perception_queue_backlog', '本地队列中尚未确认的消息数', ['consumer'])
+PIPELINE_LATENCY_SECONDS = Histogram(
+    'perception_pipeline_latency_seconds', '端到端延迟：crawl 为入队到处理完成，publish 为新闻发布到处理完成',
+    ['consumer', 'span'], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+
+# 启动本地 /metrics 服务；端口被占用（如同机多开进程）时只记录警告，不影响业务
+def start_metrics_server(port, host=METRICS_HOST):
+    try:
+        start_http_server(port, addr=host)
+    except OSError as e:
+        logging.warning(f"指标服务启动失败 ({host}:{port}): {e}")
+        return False
+    logging.info(f"指标服务已启动: http://{host}:{port}/metrics")
+    return True
+
+
+# 带指标的 GET 请求（传入 session 时复用其连接池）：按接口与状态码记录耗时，网络异常记为 error
+def http_get(endpoint, url, session=None, **kwargs):
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        response = (session or requests).get(url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        HTTP_REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - start)
+
+
+def llm_error_outcome(error):
+    status_code = getattr(error, 'status_code', None)
+    if status_code == 429:
+        return 'rate_limited'
+    if status_code is not None:
+        return f'http_{status_code}'
+    if 'Timeout' in type(error).__name__:
+        return 'timeout'
+    return 'error'
+
+
+# 带指标的 client.chat.completions.create：记录耗时、结果和接口返回的 token 用量
+def chat_completion(client, stage, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        LLM_REQUEST_SECONDS.labels(stage, llm_error_outcome(e)).observe(time.perf_counter() - start)
+        raise
+    LLM_REQUEST_SECONDS.labels(stage, 'ok').observe(time.perf_counter() - start)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        LLM_TOKENS.labels(stage, 'prompt').inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels(stage, 'completion').inc(usage.completion_tokens or 0)
+    return response
+
+
+def sql_operation(statement):
+    words = statement.split(None, 1)
+    return words[0].lower() if words else 'unknown'
+
+
+# 数据库连接包装：cursor 的 execute/executemany 按语句类型计时，commit/rollback 单独计时
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, method, statement, *args, **kwargs):
+        operation = sql_operation(statement)
+        start = time.perf_counter()
+        try:
+            return method(statement, *args, **kwargs)
+        except Exception:
+            DB_ERRORS.labels(operation).inc()
+            raise
+        finally:
+            DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+    def execute(self, statement, *args, **kwargs):
+        return self._timed(self._cursor.execute, statement, *args, **kwargs)
+
+    def executemany(self, statement, *args, **kwargs):
+        return self._timed(self._cursor.executemany, statement, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            DB_QUERY_SECONDS.labels('commit').observe(time.perf_counter() - start)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            return self._conn.rollback()
+        finally:
+            DB_QUERY_SECONDS.labels('rollback').observe(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_connection(conn):
+    return InstrumentedConnection(conn) if conn is not None else None
+
+
+# 统计库中待处理条数；condition 为筛选待处理记录的 SQL 条件
+def update_backlog(cursor, stage, condition):
+    cursor.execute(f"SELECT COUNT(*) FROM perception_cls_news WHERE {condition}")
+    count = cursor.fetchone()[0]
+    BACKLOG_ROWS.labels(stage).set(count)
+    return count
+
+
+# 记录队列消息的端到端延迟，messages 为 NewsQueue.consume 返回的 (seq, news_id, ctime, published_at)
+def observe_pipeline_latency(consumer, messages, done_at=None):
+    done_at = done_at or time.time()
+    for _, _, ctime, published_at in messages:
+        PIPELINE_LATENCY_SECONDS.labels(consumer, 'crawl').observe(done_at - published_at)
+        if ctime is not None:
+            PIPELINE_LATENCY_SECONDS.labels(consumer, 'publish').observe(done_at - ctime)
+
+
+def update_queue_backlog(queue, consumer):
+    QUEUE_BACKLOG.labels(consumer).set(queue.backlog(consumer))
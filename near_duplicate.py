@@ -0,0 +1,151 @@
+import time
+import heapq
+import random
+import hashlib
+import logging
+from collections import defaultdict
+
+from llm_cache import normalize_content
+
+# 近重复检测配置：字符 shingle 的 MinHash 签名，分段 LSH 召回候选，再按估计的 Jaccard 相似度判定
+# 短新闻上补一句话或改一个日期时 SimHash 海明距离波动较大，MinHash 估计的 Jaccard 更稳定
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+LSH_BANDS = 16                        # 16 段 x 4 行，Jaccard 约 0.5 以上的文本大概率成为候选
+SIMILARITY_THRESHOLD = 0.7            # 估计 Jaccard 相似度不低于该值视为同一簇
+MIN_CONTENT_LENGTH = 20               # 过短的文本签名不稳定，不参与近重复匹配
+NEAR_DUP_WINDOW_SECONDS = 48 * 3600   # 滑动时间窗口
+
+ROWS_PER_BAND = NUM_PERM // LSH_BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# 固定种子生成的哈希排列参数，保证进程间签名一致
+_rng = random.Random(20240320)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    text = normalize_content(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash(text):
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'big')
+        for shingle in shingles(text)
+    ]
+    if not hashes:
+        return (MAX_HASH,) * NUM_PERM
+    return tuple(
+        min(((a * value + b) % MERSENNE_PRIME) & MAX_HASH for value in hashes)
+        for a, b in PERMUTATIONS
+    )
+
+
+def estimate_similarity(signature_a, signature_b):
+    return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / NUM_PERM
+
+
+def band_keys(signature):
+    return [
+        (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        for band in range(LSH_BANDS)
+    ]
+
+
+# 增量近重复索引：只收录已处理完成的新闻，按时间窗口淘汰
+class NearDuplicateIndex:
+    def __init__(self, window_seconds=NEAR_DUP_WINDOW_SECONDS, threshold=SIMILARITY_THRESHOLD):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.items = {}                    # news_id -> (signature, timestamp)
+        self.buckets = defaultdict(set)    # (band, band_value) -> news_id 集合
+        self.expiry = []                   # (timestamp, news_id) 最小堆
+        self.warmed = False
+
+    def add(self, news_id, content, timestamp=None):
+        if len(normalize_content(content)) < MIN_CONTENT_LENGTH:
+            return
+        timestamp = timestamp or time.time()
+        self.remove(news_id)
+        signature = minhash(content)
+        self.items[news_id] = (signature, timestamp)
+        for key in band_keys(signature):
+            self.buckets[key].add(news_id)
+        heapq.heappush(self.expiry, (timestamp, news_id))
+
+    def remove(self, news_id):
+        item = self.items.pop(news_id, None)
+        if item is None:
+            return
+        for key in band_keys(item[0]):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(news_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def expire(self, now=None):
+        cutoff = (now or time.time()) - self.window_seconds
+        while self.expiry and self.expiry[0][0] < cutoff:
+            timestamp, news_id = heapq.heappop(self.expiry)
+            item = self.items.get(news_id)
+            if item is not None and item[1] == timestamp:
+                self.remove(news_id)
+
+    # 查找最相似的已处理新闻，返回 (news_id, 估计相似度) 或 None
+    def find(self, content, exclude_id=None):
+        if len(normalize_content(content)) < MIN_CONTENT_LENGTH:
+            return None
+        self.expire()
+        signature = minhash(content)
+        candidates = set()
+        for key in band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude_id)
+
+        best = None
+        for news_id in candidates:
+            similarity = estimate_similarity(signature, self.items[news_id][0])
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (news_id, similarity)
+        return best
+
+    # 从库中预热：condition 为筛选“已处理完成”记录的 SQL 条件
+    # 结果继承自其他新闻的记录不入索引，与运行时一致，只有经模型处理的记录才能作为 canonical
+    def warm(self, cursor, condition):
+        cursor.execute(f"""
+            SELECT id, content, ctime
+            FROM perception_cls_news n
+            WHERE {condition} AND ctime >= %s
+              AND NOT EXISTS (SELECT 1 FROM perception_news_duplicates d WHERE d.news_id = n.id)
+        """, (int(time.time() - self.window_seconds),))
+        rows = cursor.fetchall()
+        for news_id, content, ctime in rows:
+            self.add(news_id, content, ctime)
+        self.warmed = True
+        logging.info(f"近重复索引已预热 {len(self.items)} 条（读取 {len(rows)} 条）")
+
+
+# 近重复关系表：记录每条新闻继承自哪条已处理新闻，继承的未来事件不再复制，按 canonical_id 关联
+def ensure_duplicates_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS perception_news_duplicates (
+            news_id INT PRIMARY KEY,
+            canonical_id INT NOT NULL,
+            similarity FLOAT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_canonical_id (canonical_id)
+        )
+    """)
+
+
+def record_duplicate(cursor, news_id, canonical_id, similarity):
+    cursor.execute("""
+        INSERT INTO perception_news_duplicates (news_id, canonical_id, similarity)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE canonical_id = VALUES(canonical_id), similarity = VALUES(similarity)
+    """, (news_id, canonical_id, similarity))
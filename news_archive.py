@@ -0,0 +1,408 @@
+import os
+import sys
+import logging
+import argparse
+from datetime import date, datetime
+
+import mysql.connector
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from hotspot_rollup import ROLLUP_TABLE, DIMENSION_COLUMNS
+from scoring_backends import SCORE_SOURCES_TABLE
+from engagement_tracker import ENGAGEMENT_TABLE
+
+# 冷数据归档：perception_cls_news 按新闻发布时间（ctime）的自然月划分，热度评分与未来事件抽取都已完成的旧月份
+# 连同其主题标签、未来事件、近重复关系和该月的热度汇总导出为 zstd 压缩的 Parquet 文件（按 month=YYYY-MM 分区），校验后从热表删除，热表只保留近期数据
+# perception_future_events 以外键引用新闻表，MySQL 不支持对带外键的表做原生分区，因此按月份逻辑划分、整月导出和删除
+ARCHIVE_ROOT = '/var/lib/media_corpus_perception/archive'
+ARCHIVE_MANIFEST_TABLE = 'perception_archive_months'
+RETAIN_MONTHS = 3                # 热表保留最近几个自然月（含当月），更早且已全部处理的月份才归档
+EXPORT_FETCH_SIZE = 10000        # 导出时每次从数据库读取的行数
+ROW_GROUP_SIZE = 100000          # Parquet 行组大小，行组内按 ctime 有序，读取时按行组统计信息跳过
+PURGE_CHUNK_SIZE = 1000          # 删除热表数据时每个事务处理的新闻数
+COMPRESSION = 'zstd'
+
+# 未完成处理的条件：仍有此类记录的月份不归档
+UNFINISHED_CONDITION = "(hotspot_level IS NULL OR future_event_status = 'unprocessed')"
+
+# 以 news_id 关联新闻的表：删除热表新闻时在同一事务内一并删除（分类表随事件外键级联删除）
+# 近重复关系随新闻归档；评分来源、计数序列与数据源条目映射只服务于近期数据，直接删除
+NEWS_DEPENDENT_TABLES = [
+    'perception_future_events', 'perception_cls_news_subjects', 'perception_news_duplicates',
+    SCORE_SOURCES_TABLE, ENGAGEMENT_TABLE, 'perception_news_source_items',
+]
+# 按功能开关创建的表：不存在时跳过对应数据集的导出（NEWS_DEPENDENT_TABLES 中不存在的表同样跳过删除）
+OPTIONAL_TABLES = {
+    'duplicates': 'perception_news_duplicates',
+    'rollups': ROLLUP_TABLE,
+}
+ROLLUP_MONTH_CONDITION = "r.bucket_start >= %s AND r.bucket_start < %s"
+
+# 各归档数据集的导出语句与 Parquet 结构；主题与事件附带所属新闻的 ctime，读取时可按时间下推过滤
+DATASETS = {
+    'news': (
+        """
+        SELECT id, ctime, content, level, reading_num, comment_num, share_num, modified_time, insert_time,
+               hotspot_level, feature_scores, processed_at, future_event_status
+        FROM perception_cls_news n
+        WHERE {month_condition}
+        ORDER BY n.ctime, n.id
+        """,
+        pa.schema([
+            ('id', pa.int64()), ('ctime', pa.int64()), ('content', pa.string()), ('level', pa.string()),
+            ('reading_num', pa.int64()), ('comment_num', pa.int64()), ('share_num', pa.int64()),
+            ('modified_time', pa.int64()), ('insert_time', pa.timestamp('s')), ('hotspot_level', pa.int8()),
+            ('feature_scores', pa.string()), ('processed_at', pa.timestamp('s')), ('future_event_status', pa.string()),
+        ]),
+    ),
+    'subjects': (
+        """
+        SELECT s.news_id, n.ctime, s.subject_id, s.subject_name
+        FROM perception_cls_news_subjects s
+        JOIN perception_cls_news n ON n.id = s.news_id
+        WHERE {month_condition}
+        ORDER BY n.ctime, s.news_id
+        """,
+        pa.schema([
+            ('news_id', pa.int64()), ('ctime', pa.int64()), ('subject_id', pa.int64()), ('subject_name', pa.string()),
+        ]),
+    ),
+    'events': (
+        """
+        SELECT e.id, e.news_id, n.ctime, e.event_description, e.expected_time, e.remarks, e.created_at,
+               e.probability_of_occurrence, e.theme_categories, e.region_categories, e.event_hash
+        FROM perception_future_events e
+        JOIN perception_cls_news n ON n.id = e.news_id
+        WHERE {month_condition}
+        ORDER BY n.ctime, e.id
+        """,
+        pa.schema([
+            ('id', pa.int64()), ('news_id', pa.int64()), ('ctime', pa.int64()), ('event_description', pa.string()),
+            ('expected_time', pa.timestamp('s')), ('remarks', pa.string()), ('created_at', pa.timestamp('s')),
+            ('probability_of_occurrence', pa.float32()), ('theme_categories', pa.string()),
+            ('region_categories', pa.string()), ('event_hash', pa.string()),
+        ]),
+    ),
+    'duplicates': (
+        """
+        SELECT d.news_id, n.ctime, d.canonical_id, d.similarity
+        FROM perception_news_duplicates d
+        JOIN perception_cls_news n ON n.id = d.news_id
+        WHERE {month_condition}
+        ORDER BY n.ctime, d.news_id
+        """,
+        pa.schema([
+            ('news_id', pa.int64()), ('ctime', pa.int64()), ('canonical_id', pa.int64()), ('similarity', pa.float32()),
+        ]),
+    ),
+    # 热度汇总按时间桶而不是新闻划分，以 bucket_start 所在月份导出（没有 ctime 列，不经 ArchiveReader 读取）
+    'rollups': (
+        f"""
+        SELECT granularity, bucket_start, subject_id, subject_name, news_count, level_sum, level_max, hot_count, scored_count,
+               {', '.join(f"{column}_sum, {column}_max" for column in DIMENSION_COLUMNS.values())}
+        FROM {ROLLUP_TABLE} r
+        WHERE {ROLLUP_MONTH_CONDITION}
+        ORDER BY r.bucket_start, r.granularity, r.subject_id
+        """,
+        pa.schema([
+            ('granularity', pa.string()), ('bucket_start', pa.timestamp('s')), ('subject_id', pa.int64()),
+            ('subject_name', pa.string()), ('news_count', pa.int64()), ('level_sum', pa.int64()), ('level_max', pa.int8()),
+            ('hot_count', pa.int64()), ('scored_count', pa.int64()),
+        ] + [
+            (f"{column}_{suffix}", pa.int64() if suffix == 'sum' else pa.int8())
+            for column in DIMENSION_COLUMNS.values() for suffix in ('sum', 'max')
+        ]),
+    ),
+}
+
+MONTH_CONDITION = "n.ctime >= UNIX_TIMESTAMP(%s) AND n.ctime < UNIX_TIMESTAMP(%s)"
+
+
+# 归档清单：每个已导出月份的行数、导出与删除时间；读取时只从已删除热表数据的月份读归档，避免与热表重复
+def ensure_manifest_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_MANIFEST_TABLE} (
+            month CHAR(7) PRIMARY KEY,
+            news_rows INT NOT NULL,
+            subject_rows INT NOT NULL,
+            event_rows INT NOT NULL,
+            exported_at DATETIME NOT NULL,
+            purged_at DATETIME NULL
+        )
+    """)
+
+
+# 月份 'YYYY-MM' 的起止日期（按数据库会话时区转换为时间戳，与热度汇总的时间桶一致）
+def month_bounds(month):
+    year, month_number = map(int, month.split('-'))
+    start = date(year, month_number, 1)
+    end = date(year + month_number // 12, month_number % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+# 库中存在的表
+def existing_tables(cursor, tables):
+    existing = []
+    for table in tables:
+        cursor.execute("SHOW TABLES LIKE %s", (table,))
+        if cursor.fetchall():
+            existing.append(table)
+    return existing
+
+
+# 检查并添加删除时按 news_id 定位用的索引（数据源条目映射表建表时没有该索引）
+def ensure_purge_indexes(cursor):
+    if not existing_tables(cursor, ['perception_news_source_items']):
+        return
+    cursor.execute("SHOW INDEX FROM perception_news_source_items WHERE Column_name = 'news_id' AND Seq_in_index = 1")
+    if not cursor.fetchall():
+        cursor.execute("ALTER TABLE perception_news_source_items ADD KEY idx_news_id (news_id)")
+        logging.info("perception_news_source_items 已添加 idx_news_id 索引")
+
+
+def partition_path(root, dataset, month):
+    return os.path.join(root, dataset, f"month={month}", "part-0.parquet")
+
+
+# 可归档的月份：早于保留期、尚未导出且全部记录都已完成处理，返回 [(month, 新闻条数)]
+def archivable_months(cursor, retain_months=RETAIN_MONTHS, today=None):
+    today = today or date.today()
+    cutoff_index = today.year * 12 + today.month - 1 - (retain_months - 1)
+    cutoff = date(cutoff_index // 12, cutoff_index % 12 + 1, 1).isoformat()
+    cursor.execute(f"""
+        SELECT DATE_FORMAT(FROM_UNIXTIME(ctime), '%%Y-%%m') AS month, COUNT(*), SUM({UNFINISHED_CONDITION})
+        FROM perception_cls_news
+        WHERE ctime < UNIX_TIMESTAMP(%s)
+        GROUP BY month
+        ORDER BY month
+    """, (cutoff,))
+    months = cursor.fetchall()
+    cursor.execute(f"SELECT month FROM {ARCHIVE_MANIFEST_TABLE}")
+    exported = {row[0] for row in cursor.fetchall()}
+    result = []
+    for month, news_rows, unfinished in months:
+        if month in exported:
+            continue
+        if unfinished:
+            logging.info(f"{month} 仍有 {unfinished} 条记录未完成处理，暂不归档")
+            continue
+        result.append((month, news_rows))
+    return result
+
+
+def normalize_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+# 流式导出一个数据集的一个月份：分批读取写入临时文件，完成后原子替换，返回行数
+def export_dataset(cursor, dataset, month, root=ARCHIVE_ROOT):
+    sql, schema = DATASETS[dataset]
+    path = partition_path(root, dataset, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    rows_written = 0
+    cursor.execute(sql.format(month_condition=MONTH_CONDITION), month_bounds(month))
+    with pq.ParquetWriter(tmp_path, schema, compression=COMPRESSION) as writer:
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            columns = list(zip(*[[normalize_value(value) for value in row] for row in rows]))
+            writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema),
+                               row_group_size=ROW_GROUP_SIZE)
+            rows_written += len(rows)
+    if pq.ParquetFile(tmp_path).metadata.num_rows != rows_written:
+        os.remove(tmp_path)
+        raise IOError(f"{path} 写入行数校验失败")
+    os.replace(tmp_path, path)
+    return rows_written
+
+
+# 导出一个月份的新闻、主题、事件、近重复关系与热度汇总并写入归档清单
+def export_month(conn, cursor, month, root=ARCHIVE_ROOT):
+    available = existing_tables(cursor, OPTIONAL_TABLES.values())
+    datasets = [dataset for dataset in DATASETS if dataset not in OPTIONAL_TABLES or OPTIONAL_TABLES[dataset] in available]
+    counts = {dataset: export_dataset(cursor, dataset, month, root) for dataset in datasets}
+    cursor.execute(f"""
+        INSERT INTO {ARCHIVE_MANIFEST_TABLE} (month, news_rows, subject_rows, event_rows, exported_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            news_rows = VALUES(news_rows), subject_rows = VALUES(subject_rows), event_rows = VALUES(event_rows),
+            exported_at = VALUES(exported_at), purged_at = NULL
+    """, (month, counts['news'], counts['subjects'], counts['events'], datetime.now()))
+    conn.commit()
+    logging.info(f"{month} 已归档: 新闻 {counts['news']} 条，主题 {counts['subjects']} 条，事件 {counts['events']} 条，"
+                 f"近重复关系 {counts.get('duplicates', 0)} 条，热度汇总 {counts.get('rollups', 0)} 行")
+    return counts
+
+
+# 删除已归档月份的热表数据：先核对热表中该月的新闻与事件都在归档文件中（导出后又有补采数据时需重新导出），
+# 再按新闻 id 分段删除 NEWS_DEPENDENT_TABLES 中的关联行与新闻，每段单独提交；最后删除该月的热度汇总并标记清单，中断后可重新执行
+def purge_month(conn, cursor, month, root=ARCHIVE_ROOT, chunk_size=PURGE_CHUNK_SIZE):
+    cursor.execute(f"SELECT 1 FROM {ARCHIVE_MANIFEST_TABLE} WHERE month = %s", (month,))
+    if cursor.fetchone() is None:
+        raise ValueError(f"{month} 尚未导出，不能删除")
+    bounds = month_bounds(month)
+    for dataset, label, sql in (
+        ('news', '新闻', f"SELECT n.id FROM perception_cls_news n WHERE {MONTH_CONDITION}"),
+        ('events', '事件', f"SELECT e.id FROM perception_future_events e JOIN perception_cls_news n ON n.id = e.news_id WHERE {MONTH_CONDITION}"),
+    ):
+        archived_ids = set(pq.read_table(partition_path(root, dataset, month), columns=['id']).column('id').to_pylist())
+        cursor.execute(sql, bounds)
+        missing = [row[0] for row in cursor.fetchall() if row[0] not in archived_ids]
+        if missing:
+            raise ValueError(f"{month} 有 {len(missing)} 条{label}不在归档文件中（如 id {missing[:5]}），请重新导出")
+
+    ensure_purge_indexes(cursor)
+    dependent_tables = existing_tables(cursor, NEWS_DEPENDENT_TABLES)
+    # 导出后才创建的汇总表没有该月的归档文件，其中的行保留
+    purge_rollups = bool(existing_tables(cursor, [ROLLUP_TABLE])) and os.path.exists(partition_path(root, 'rollups', month))
+
+    deleted = 0
+    while True:
+        cursor.execute(f"SELECT n.id FROM perception_cls_news n WHERE {MONTH_CONDITION} LIMIT %s", (*bounds, chunk_size))
+        news_ids = [row[0] for row in cursor.fetchall()]
+        if not news_ids:
+            break
+        placeholders = ', '.join(['%s'] * len(news_ids))
+        try:
+            for table in dependent_tables:
+                cursor.execute(f"DELETE FROM {table} WHERE news_id IN ({placeholders})", news_ids)
+            cursor.execute(f"DELETE FROM perception_cls_news WHERE id IN ({placeholders})", news_ids)
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        deleted += len(news_ids)
+    try:
+        if purge_rollups:
+            cursor.execute(f"DELETE r FROM {ROLLUP_TABLE} r WHERE {ROLLUP_MONTH_CONDITION}", bounds)
+        cursor.execute(f"UPDATE {ARCHIVE_MANIFEST_TABLE} SET purged_at = %s WHERE month = %s", (datetime.now(), month))
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    logging.info(f"{month} 热表数据已删除: 新闻 {deleted} 条")
+    return deleted
+
+
+# 归档所有可归档的月份；purge 为 False 时只导出，不删除热表数据
+def archive_old_months(conn, cursor, retain_months=RETAIN_MONTHS, purge=True, root=ARCHIVE_ROOT):
+    months = archivable_months(cursor, retain_months)
+    if not months:
+        logging.info("没有可归档的月份")
+    for month, _ in months:
+        export_month(conn, cursor, month, root)
+        if purge:
+            purge_month(conn, cursor, month, root)
+    return [month for month, _ in months]
+
+
+# 归档读取：以 month 分区目录裁剪文件，ctime 等条件下推到 Parquet 行组统计信息，只读取需要的列
+class ArchiveReader:
+    def __init__(self, root=ARCHIVE_ROOT):
+        self.root = root
+        self.datasets = {}
+
+    def dataset(self, name):
+        if name not in self.datasets:
+            self.datasets[name] = ds.dataset(
+                os.path.join(self.root, name), format='parquet', partitioning='hive',
+                schema=DATASETS[name][1].append(pa.field('month', pa.string()))
+            )
+        return self.datasets[name]
+
+    # 读取 ctime 在 [start_ts, end_ts) 内的归档数据，months 限定读取的月份，filter 为附加的 pyarrow 表达式，返回 pyarrow.Table
+    def read(self, name, start_ts, end_ts, columns=None, months=None, filter=None):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(path):
+            return DATASETS[name][1].empty_table().select(columns or DATASETS[name][1].names)
+        expression = (ds.field('ctime') >= start_ts) & (ds.field('ctime') < end_ts)
+        # 分区按数据库会话时区划分，裁剪时前后各放宽一天，时区不一致时也不会漏读；精确范围由 ctime 条件保证
+        start_month = datetime.fromtimestamp(start_ts - 86400).strftime('%Y-%m')
+        end_month = datetime.fromtimestamp(end_ts + 86400).strftime('%Y-%m')
+        expression &= (ds.field('month') >= start_month) & (ds.field('month') <= end_month)
+        if months is not None:
+            expression &= ds.field('month').isin(list(months))
+        if filter is not None:
+            expression &= filter
+        return self.dataset(name).to_table(columns=columns, filter=expression)
+
+
+# 已删除热表数据的归档月份
+def purged_months(cursor):
+    cursor.execute(f"SELECT month FROM {ARCHIVE_MANIFEST_TABLE} WHERE purged_at IS NOT NULL")
+    return [row[0] for row in cursor.fetchall()]
+
+
+# 透明查询：ctime 在 [start_ts, end_ts) 内的新闻，热表与已归档月份合并后按 ctime 倒序返回 [(列值, ...)]
+# min_level 为最低热点等级，对热表作为 WHERE 条件、对归档作为下推过滤
+def query_news(cursor, start_ts, end_ts, columns=('id', 'ctime', 'content', 'hotspot_level'), min_level=None, reader=None):
+    columns = list(columns)
+    level_condition = "AND hotspot_level >= %s" if min_level is not None else ""
+    cursor.execute(f"""
+        SELECT {', '.join(columns)}
+        FROM perception_cls_news
+        WHERE ctime >= %s AND ctime < %s {level_condition}
+    """, (start_ts, end_ts) + ((min_level,) if min_level is not None else ()))
+    rows = cursor.fetchall()
+
+    months = purged_months(cursor)
+    if months:
+        reader = reader or ArchiveReader()
+        level_filter = ds.field('hotspot_level') >= min_level if min_level is not None else None
+        table = reader.read('news', start_ts, end_ts, columns, months, level_filter)
+        rows.extend(zip(*[table.column(column).to_pylist() for column in columns]))
+
+    if 'ctime' in columns:
+        ctime_index = columns.index('ctime')
+        rows.sort(key=lambda row: row[ctime_index], reverse=True)
+    return rows
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='新闻冷数据归档')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help='导出并删除可归档的旧月份')
+    run.add_argument('--retain-months', type=int, default=RETAIN_MONTHS)
+    run.add_argument('--no-purge', action='store_true', help='只导出，不删除热表数据')
+    purge = subparsers.add_parser('purge', help='删除已导出月份的热表数据')
+    purge.add_argument('month', help='YYYY-MM')
+    query = subparsers.add_parser('query', help='查询时间范围内的新闻（含归档）')
+    query.add_argument('start', help='YYYY-MM-DD')
+    query.add_argument('end', help='YYYY-MM-DD（不含）')
+    query.add_argument('--min-level', type=int)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # python news_archive.py run [--retain-months 3] [--no-purge]：导出已全部处理的旧月份，校验后删除热表数据
+    # python news_archive.py purge 2025-01：删除已导出（如之前使用 --no-purge）月份的热表数据
+    # python news_archive.py query 2025-01-01 2025-02-01 --min-level 4：查询时间范围内的新闻，热表与归档合并
+    from config import db_config, setup_cli_logging
+    setup_cli_logging()
+    args = parse_args(sys.argv[1:])
+    try:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        ensure_manifest_table(cursor)
+        if args.command == 'run':
+            archive_old_months(conn, cursor, args.retain_months, purge=not args.no_purge)
+        elif args.command == 'purge':
+            purge_month(conn, cursor, args.month)
+        else:
+            start_ts = int(datetime.fromisoformat(args.start).timestamp())
+            end_ts = int(datetime.fromisoformat(args.end).timestamp())
+            for news_id, ctime, content, hotspot_level in query_news(cursor, start_ts, end_ts, min_level=args.min_level):
+                print(f"{datetime.fromtimestamp(ctime)}  [{news_id}] 等级 {hotspot_level}  {content[:60]}")
+    except (mysql.connector.Error, ValueError, IOError) as e:
+        logging.error(f"归档失败: {e}")
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+import threading
+
+# 本地持久化队列配置（爬虫发布新增/变更的新闻 id，热度计算与未来事件抽取各自按消费位点读取）
+NEWS_QUEUE_PATH = '/var/lib/media_corpus_perception/news_queue.sqlite3'
+QUEUE_POLL_INTERVAL = 1.0                # 消费者等待新消息时的轮询间隔（秒）
+QUEUE_RETENTION_SECONDS = 3 * 24 * 3600  # 消息与延迟记录保留时长
+QUEUE_PURGE_EVERY = 1000                 # 每发布多少条消息清理一次过期数据
+
+# 已知的消费者名称
+HOTSPOT_CONSUMER = 'hot_spot_detector'
+FUTURE_EVENTS_CONSUMER = 'future_events_analysis'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# 延迟秒数格式化：没有样本（如消息缺少 ctime）时输出 n/a
+def format_seconds(value):
+    return "n/a" if value is None else f"{value:.1f}s"
+
+
+# 基于 SQLite 的持久化消息队列：消息只追加，每个消费者独立记录已确认的位点（至少一次投递）
+class NewsQueue:
+    def __init__(self, path=NEWS_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._published = 0
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS news_events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    news_id INTEGER NOT NULL,
+                    ctime INTEGER,
+                    published_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS consumer_offsets (
+                    consumer TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS pipeline_latency (
+                    consumer TEXT NOT NULL,
+                    news_id INTEGER NOT NULL,
+                    ctime INTEGER,
+                    published_at REAL NOT NULL,
+                    done_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_pipeline_latency_done ON pipeline_latency (consumer, done_at);
+            """)
+            self._conn.commit()
+        return self._conn
+
+    # 发布消息：entries 为 [(news_id, ctime), ...]
+    def publish(self, entries):
+        entries = list(entries)
+        if not entries:
+            return 0
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO news_events (news_id, ctime, published_at) VALUES (?, ?, ?)",
+                [(news_id, ctime, now) for news_id, ctime in entries]
+            )
+            conn.commit()
+            self._published += len(entries)
+            if self._published >= QUEUE_PURGE_EVERY:
+                self._published = 0
+                self._purge(conn, now)
+        return len(entries)
+
+    # 读取消费者位点之后的消息，没有新消息时最多等待 timeout 秒
+    # 返回 [(seq, news_id, ctime, published_at), ...]，处理完成后需调用 ack
+    def consume(self, consumer, max_items=100, timeout=30):
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT seq FROM consumer_offsets WHERE consumer = ?", (consumer,)).fetchone()
+                offset = row[0] if row else 0
+                messages = conn.execute("""
+                    SELECT seq, news_id, ctime, published_at
+                    FROM news_events WHERE seq > ? ORDER BY seq LIMIT ?
+                """, (offset, max_items)).fetchall()
+            if messages or time.time() >= deadline:
+                return messages
+            time.sleep(QUEUE_POLL_INTERVAL)
+
+    # 确认处理到 seq（含）为止的消息
+    def ack(self, consumer, seq):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("""
+                INSERT INTO consumer_offsets (consumer, seq) VALUES (?, ?)
+                ON CONFLICT(consumer) DO UPDATE SET seq = MAX(seq, excluded.seq)
+            """, (consumer, seq))
+            conn.commit()
+
+    # 记录处理完成的消息，用于统计爬取到处理完成的端到端延迟
+    def record_latency(self, consumer, messages, done_at=None):
+        done_at = done_at or time.time()
+        rows = [(consumer, news_id, ctime, published_at, done_at) for _, news_id, ctime, published_at in messages]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("""
+                INSERT INTO pipeline_latency (consumer, news_id, ctime, published_at, done_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+
+    # 统计最近 window_seconds 内的延迟：crawl 为入队到处理完成，publish 为新闻发布（ctime）到处理完成
+    def latency_summary(self, consumer, window_seconds=3600):
+        with self._lock:
+            rows = self._connect().execute("""
+                SELECT done_at - published_at, done_at - ctime
+                FROM pipeline_latency WHERE consumer = ? AND done_at >= ?
+            """, (consumer, time.time() - window_seconds)).fetchall()
+        crawl = [row[0] for row in rows]
+        publish = [row[1] for row in rows if row[1] is not None]
+        return {
+            'count': len(rows),
+            'crawl_p50': percentile(crawl, 50),
+            'crawl_p99': percentile(crawl, 99),
+            'publish_p50': percentile(publish, 50),
+            'publish_p99': percentile(publish, 99),
+        }
+
+    # 积压量：消费者位点之后尚未确认的消息数
+    def backlog(self, consumer):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT seq FROM consumer_offsets WHERE consumer = ?", (consumer,)).fetchone()
+            return conn.execute("SELECT COUNT(*) FROM news_events WHERE seq > ?", (row[0] if row else 0,)).fetchone()[0]
+
+    def log_latency(self, consumer, window_seconds=3600):
+        s = self.latency_summary(consumer, window_seconds)
+        if not s['count']:
+            return
+        logging.info(
+            f"端到端延迟 ({consumer}, 最近 {window_seconds // 60} 分钟 {s['count']} 条): "
+            f"入队到完成 p50={format_seconds(s['crawl_p50'])} p99={format_seconds(s['crawl_p99'])}，"
+            f"发布到完成 p50={format_seconds(s['publish_p50'])} p99={format_seconds(s['publish_p99'])}"
+        )
+
+    def _purge(self, conn, now):
+        cutoff = now - QUEUE_RETENTION_SECONDS
+        conn.execute("DELETE FROM news_events WHERE published_at < ?", (cutoff,))
+        conn.execute("DELETE FROM pipeline_latency WHERE done_at < ?", (cutoff,))
+        conn.commit()
+
+
+if __name__ == "__main__":
+    # python news_queue.py stats [窗口分钟数]：输出各消费者的积压量与端到端延迟
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        window_minutes = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+        queue = NewsQueue()
+        for consumer in (HOTSPOT_CONSUMER, FUTURE_EVENTS_CONSUMER):
+            s = queue.latency_summary(consumer, window_minutes * 60)
+            print(f"{consumer}: 积压 {queue.backlog(consumer)} 条，最近 {window_minutes} 分钟完成 {s['count']} 条")
+            if s['count']:
+                print(f"  入队到完成 p50={format_seconds(s['crawl_p50'])} p99={format_seconds(s['crawl_p99'])}")
+                print(f"  发布到完成 p50={format_seconds(s['publish_p50'])} p99={format_seconds(s['publish_p99'])}")
+    else:
+        print("用法: python news_queue.py stats [窗口分钟数]")
@@ -0,0 +1,403 @@
+import sys
+import time
+import hashlib
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from mysql.connector import Error
+
+import crawler_cls
+from llm_cache import normalize_content
+from llm_client import TokenBucket
+
+# 多数据源采集：每个数据源实现一个适配器，把抓到的条目转为统一的 NewsRecord；
+# 调度器在线程池中按各自的轮询间隔与请求限速并发抓取，单个数据源失败只影响自身（指数退避）；
+# 写库在主线程进行，经内容哈希跨数据源去重后复用爬虫的变更检测、批量写入与队列发布，下游评分与事件抽取无需区分来源
+
+# 统一新闻记录；source_item_id 为数据源内的原始 id，subjects 为 [{'subject_id', 'subject_name'}]
+NewsRecord = namedtuple(
+    'NewsRecord',
+    ['source', 'source_item_id', 'ctime', 'content', 'level', 'reading_num', 'comment_num', 'share_num',
+     'modified_time', 'subjects'],
+    defaults=('C', 0, 0, 0, None, ())
+)
+
+SOURCE_ITEMS_TABLE = 'perception_news_source_items'
+LOOKUP_CHUNK_SIZE = 500              # 每条查询最多包含的 id/哈希数
+
+# 调度配置
+MAX_BACKOFF_SECONDS = 1800           # 连续失败时退避间隔的上限（秒）
+INIT_REGISTER_DAYS = 7               # init 时登记的财联社历史新闻天数
+
+
+# 数据源条目映射表：记录每个数据源条目对应的新闻 id 与内容哈希
+# 财联社新闻 id 沿用电报 id，其他数据源的新闻 id 为 EXTERNAL_ID_BASE + item_id；
+# 内容哈希与其他数据源已登记的条目相同时标记为重复（duplicate = 1），news_id 指向先收到的那条，不再写入新闻表
+def ensure_source_items_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SOURCE_ITEMS_TABLE} (
+            item_id INT AUTO_INCREMENT PRIMARY KEY,
+            source VARCHAR(32) NOT NULL,
+            source_item_id VARCHAR(128) NOT NULL,
+            news_id INT,
+            content_hash CHAR(64) NOT NULL,
+            duplicate TINYINT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_source_item (source, source_item_id),
+            KEY idx_content_hash (content_hash),
+            KEY idx_news_id (news_id)
+        )
+    """)
+
+
+# 内容哈希：与 LLM 缓存相同的归一化（NFKC、去空白）后取 SHA-256，转载时的排版差异不影响去重
+def content_hash(content):
+    return hashlib.sha256(normalize_content(content).encode('utf-8')).hexdigest()
+
+
+def record_key(record):
+    return record.source, str(record.source_item_id)
+
+
+# 财联社电报条目转为统一记录
+def record_from_cls(entry):
+    return NewsRecord(
+        source='cls',
+        source_item_id=str(entry['id']),
+        ctime=entry['ctime'],
+        content=entry['content'],
+        level=entry['level'],
+        reading_num=entry['reading_num'],
+        comment_num=entry['comment_num'],
+        share_num=entry['share_num'],
+        modified_time=entry['modified_time'],
+        subjects=entry.get('subjects') or (),
+    )
+
+
+# 统一记录转为爬虫写库使用的条目
+def record_to_entry(record, news_id):
+    return {
+        'id': news_id,
+        'ctime': record.ctime,
+        'content': record.content,
+        'level': record.level,
+        'reading_num': record.reading_num,
+        'comment_num': record.comment_num,
+        'share_num': record.share_num,
+        'modified_time': record.modified_time if record.modified_time is not None else record.ctime,
+        'subjects': list(record.subjects),
+        'source': record.source,
+    }
+
+
+# 查询已登记的条目，返回 {(source, source_item_id): (news_id, duplicate)}
+def lookup_items(cursor, keys):
+    known = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        cursor.execute(f"""
+            SELECT source, source_item_id, news_id, duplicate FROM {SOURCE_ITEMS_TABLE}
+            WHERE (source, source_item_id) IN ({', '.join(['(%s, %s)'] * len(chunk))})
+        """, [value for key in chunk for value in key])
+        for source, source_item_id, news_id, duplicate in cursor.fetchall():
+            known[(source, source_item_id)] = (news_id, bool(duplicate))
+    return known
+
+
+# 查询内容哈希对应的最先登记的非重复条目，返回 {content_hash: (source, news_id)}
+def lookup_hashes(cursor, hashes):
+    canonical = {}
+    for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+        chunk = hashes[start:start + LOOKUP_CHUNK_SIZE]
+        cursor.execute(f"""
+            SELECT content_hash, source, news_id FROM {SOURCE_ITEMS_TABLE}
+            WHERE content_hash IN ({', '.join(['%s'] * len(chunk))}) AND duplicate = 0
+            ORDER BY item_id
+        """, chunk)
+        for digest, source, news_id in cursor.fetchall():
+            canonical.setdefault(digest, (source, news_id))
+    return canonical
+
+
+def insert_items(cursor, rows):
+    for start in range(0, len(rows), LOOKUP_CHUNK_SIZE):
+        chunk = rows[start:start + LOOKUP_CHUNK_SIZE]
+        cursor.execute(f"""
+            INSERT IGNORE INTO {SOURCE_ITEMS_TABLE} (source, source_item_id, news_id, content_hash, duplicate)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))}
+        """, [value for row in chunk for value in row])
+
+
+# 登记新收到的条目并返回每条记录的 (news_id, duplicate)
+# 按发布时间先后处理，内容哈希与其他数据源已有条目相同的记为重复；同一数据源内的相同内容仍各自保留（由近重复检测处理）
+def register_records(conn, records):
+    keys = list(dict.fromkeys(record_key(record) for record in records))
+    cursor = conn.cursor()
+    try:
+        known = lookup_items(cursor, keys)
+        fresh = list({record_key(record): record for record in records if record_key(record) not in known}.values())
+        if not fresh:
+            return known
+
+        hashes = {record_key(record): content_hash(record.content) for record in fresh}
+        canonical = lookup_hashes(cursor, list(set(hashes.values())))
+        originals, duplicates = [], []
+        for record in sorted(fresh, key=lambda record: record.ctime):
+            digest = hashes[record_key(record)]
+            first = canonical.get(digest)
+            if first is not None and first[0] != record.source:
+                duplicates.append(record)
+            else:
+                originals.append(record)
+                if first is None:
+                    canonical[digest] = (record.source, record_key(record))
+
+        # 财联社直接使用电报 id；其他数据源先插入再按自增 item_id 分配新闻 id
+        insert_items(cursor, [
+            (record.source, record.source_item_id,
+             int(record.source_item_id) if record.source == 'cls' else None,
+             hashes[record_key(record)], 0)
+            for record in originals
+        ])
+        cursor.execute(f"""
+            UPDATE {SOURCE_ITEMS_TABLE} SET news_id = %s + item_id
+            WHERE news_id IS NULL AND duplicate = 0
+        """, (crawler_cls.EXTERNAL_ID_BASE,))
+        known.update(lookup_items(cursor, [record_key(record) for record in originals]))
+
+        # 批内先到的条目此时才有新闻 id，重复条目指向它
+        for digest, (source, news_id) in canonical.items():
+            if isinstance(news_id, tuple):
+                canonical[digest] = (source, known[news_id][0])
+        insert_items(cursor, [
+            (record.source, record.source_item_id, canonical[hashes[record_key(record)]][1],
+             hashes[record_key(record)], 1)
+            for record in duplicates
+        ])
+        known.update(lookup_items(cursor, [record_key(record) for record in duplicates]))
+        conn.commit()
+        if duplicates:
+            print(f"跨数据源去重: {len(duplicates)} 条内容与其他数据源已收到的新闻相同，已跳过")
+        return known
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# 保存一批统一记录：登记映射、跳过重复，其余按爬虫的写库流程保存（变更检测、批量写入、发布到本地队列）
+# 返回 (写入的新闻条数, 新增与内容变更的条目是否全部写入)
+def save_records(conn, records):
+    if not records:
+        return 0, True
+    known = register_records(conn, records)
+    entries = {}
+    for record in records:
+        news_id, duplicate = known.get(record_key(record), (None, True))
+        if news_id is not None and not duplicate:
+            entries[news_id] = record_to_entry(record, news_id)
+    if entries and not crawler_cls.store_entries(conn, list(entries.values())):
+        return len(entries), False
+    return len(entries), True
+
+
+# 数据源适配器基类：子类实现 fetch(since)，返回发布时间晚于游标 since 的记录（可多返回，重复的由写库去重）
+# 每次请求前调用 acquire() 按 requests_per_minute 限速；poll_interval 为两次轮询的间隔（秒）
+class NewsSource(ABC):
+    name = 'base'
+    poll_interval = 300
+    requests_per_minute = 30
+
+    def __init__(self):
+        self.limiter = TokenBucket(self.requests_per_minute)
+        self.cursor = None           # 已保存记录的最新 ctime
+        self.failures = 0            # 连续失败次数
+        self.next_run = 0.0
+
+    # 调度开始前调用一次（在主线程），conn 可用于读取游标等
+    def start(self, conn):
+        pass
+
+    def acquire(self):
+        self.limiter.acquire()
+
+    # 抓取 since 之后的新记录，返回 NewsRecord 列表（在线程池中调用）；请求失败时抛出异常，由调度器退避
+    @abstractmethod
+    def fetch(self, since):
+        pass
+
+    # 本次抓取的记录全部写库后调用（在主线程），用于前移数据源自己维护的游标；写库失败时不调用
+    def commit(self):
+        pass
+
+    # 本次轮询后的间隔，records 为本次抓到的记录
+    def next_interval(self, records):
+        return self.poll_interval
+
+
+# 财联社电报：复用爬虫的多分类并发翻页、计数刷新与自适应轮询间隔
+class CLSSource(NewsSource):
+    name = 'cls'
+    poll_interval = crawler_cls.MIN_POLL_INTERVAL
+    requests_per_minute = 120
+
+    def __init__(self):
+        super().__init__()
+        self.news_rate = 0.0         # 平滑后的新闻速率（条/秒）
+        self.last_poll = time.time()
+        self.pending_cursors = {}    # 本次抓取到的各分类最新 ctime，写库成功后才前移分类游标
+
+    def start(self, conn):
+        crawler_cls.request_limiter = self.limiter
+        crawler_cls.init_engagement_tracker()
+        self.cursor = crawler_cls.get_latest_stored_ctime(conn)
+
+    def fetch(self, since):
+        roll_data, self.pending_cursors = crawler_cls.fetch_all_categories(since, int(time.time()))
+        entries = {entry['id']: entry for entry in roll_data}
+        if crawler_cls.engagement_tracker is not None:
+            try:
+                for entry in crawler_cls.engagement_tracker.refresh():
+                    entries.setdefault(entry['id'], entry)
+            except requests.exceptions.RequestException as e:
+                print(f"计数刷新请求失败: {e}")
+        return [record_from_cls(entry) for entry in entries.values()]
+
+    def commit(self):
+        crawler_cls.commit_category_cursors(self.pending_cursors)
+        self.pending_cursors = {}
+
+    def next_interval(self, records):
+        now = time.time()
+        elapsed = max(now - self.last_poll, 1)
+        self.last_poll = now
+        new_count = sum(1 for record in records if self.cursor is None or record.ctime > self.cursor)
+        self.news_rate = crawler_cls.RATE_SMOOTHING * (new_count / elapsed) + (1 - crawler_cls.RATE_SMOOTHING) * self.news_rate
+        return crawler_cls.next_poll_interval(self.news_rate)
+
+
+# 启用的数据源；新增数据源时实现 NewsSource 子类并加入此列表
+def build_sources():
+    return [CLSSource()]
+
+
+# 多数据源调度器：各数据源在线程池中按各自的间隔抓取，同一数据源同时只有一个抓取在进行；
+# 抓取失败按 poll_interval * 2^失败次数 退避（上限 MAX_BACKOFF_SECONDS），不影响其他数据源；写库与游标更新在主线程
+class SourceScheduler:
+    def __init__(self, sources):
+        self.sources = sources
+
+    def start(self):
+        crawler_cls.init_change_detector()
+        conn = crawler_cls.connect_db()
+        if not conn:
+            raise RuntimeError("数据库连接失败，无法启动多数据源调度")
+        try:
+            cursor = conn.cursor()
+            ensure_source_items_table(cursor)
+            cursor.close()
+            for source in self.sources:
+                source.start(conn)
+        finally:
+            conn.close()
+
+    # 数据源连续失败时按指数退避推迟下次轮询
+    def back_off(self, source, now, reason):
+        source.failures += 1
+        delay = min(source.poll_interval * 2 ** source.failures, MAX_BACKOFF_SECONDS)
+        source.next_run = now + delay
+        print(f"数据源 {source.name} {reason}（连续 {source.failures} 次），{delay:.0f} 秒后重试")
+
+    def complete(self, source, future):
+        now = time.time()
+        try:
+            records = future.result()
+        except Exception as e:
+            self.back_off(source, now, f"抓取失败: {e}")
+            return
+        saved = 0
+        if records:
+            conn = crawler_cls.connect_db()
+            if not conn:
+                source.next_run = now + source.poll_interval
+                return
+            try:
+                saved, complete = save_records(conn, records)
+            except Exception as e:
+                # 写库异常（含数据源记录格式问题）只推迟该数据源，不影响调度循环与其他数据源
+                self.back_off(source, now, f"写库失败: {e}")
+                return
+            finally:
+                conn.close()
+            if not complete:
+                # 游标保持不变，下次轮询重新抓取未写入的条目
+                print(f"数据源 {source.name} 部分条目写库失败，游标保持不变")
+                source.next_run = now + source.poll_interval
+                return
+        source.failures = 0
+        source.commit()
+        interval = source.next_interval(records)
+        if records:
+            source.cursor = max([record.ctime for record in records] + ([source.cursor] if source.cursor else []))
+        source.next_run = now + interval
+        print(f"数据源 {source.name}: 抓取 {len(records)} 条，写入 {saved} 条，{interval} 秒后再次轮询")
+
+    def run(self):
+        self.start()
+        running = {}                 # future -> 数据源
+        with ThreadPoolExecutor(max_workers=max(1, len(self.sources))) as executor:
+            while True:
+                busy = set(running.values())
+                now = time.time()
+                for source in self.sources:
+                    if source not in busy and source.next_run <= now:
+                        running[executor.submit(source.fetch, source.cursor)] = source
+                idle = [source.next_run for source in self.sources if source not in set(running.values())]
+                timeout = max(0.0, min(idle) - time.time()) if idle else None
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.complete(running.pop(future), future)
+
+
+# 登记近期已入库的财联社新闻，使其他数据源转载的相同内容从一开始就能被去重
+def register_existing_cls(conn, days=INIT_REGISTER_DAYS):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id, ctime, content FROM perception_cls_news
+            WHERE ctime >= %s AND id < %s
+        """, (int(time.time()) - days * 86400, crawler_cls.EXTERNAL_ID_BASE))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    records = [NewsRecord('cls', str(news_id), ctime, content) for news_id, ctime, content in rows]
+    for start in range(0, len(records), LOOKUP_CHUNK_SIZE):
+        register_records(conn, records[start:start + LOOKUP_CHUNK_SIZE])
+    return len(records)
+
+
+if __name__ == "__main__":
+    crawler_cls.start_metrics_server(crawler_cls.CRAWLER_METRICS_PORT)
+    # python news_sources.py init [天数]：创建映射表并登记近期财联社新闻；python news_sources.py：启动多数据源调度
+    if len(sys.argv) > 1 and sys.argv[1] == "init":
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else INIT_REGISTER_DAYS
+        conn = crawler_cls.connect_db()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                ensure_source_items_table(cursor)
+                cursor.close()
+                print(f"已登记 {register_existing_cls(conn, days)} 条财联社新闻")
+            except Error as e:
+                print(f"数据库错误: {e}")
+            finally:
+                conn.close()
+    else:
+        SourceScheduler(build_sources()).run()
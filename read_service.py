@@ -0,0 +1,250 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pandas as pd
+from mysql.connector import pooling
+
+from config import read_db_config
+from metrics import instrument_connection
+from hotspot_rollup import ROLLUP_TABLE, DIMENSION_COLUMNS, ALL_SUBJECTS_ID
+from future_events_query import query_upcoming_events
+
+# 读取服务配置：Streamlit 各会话共用同一进程内的连接池与查询结果缓存
+DB_POOL_SIZE = 4
+CACHE_TTL_SECONDS = 300          # 查询结果最长缓存时间（秒），兜底覆盖水位线感知不到的变化（如阅读数更新）
+CACHE_MAX_ENTRIES = 256          # 最多缓存的查询结果数，超过后淘汰最久未使用的
+WATERMARK_CHECK_SECONDS = 10     # 水位线查询间隔（秒），间隔内复用上次读到的水位线
+DEFAULT_PAGE_SIZE = 500
+
+# 各数据集的写入水位线：水位线变化说明有新写入，该数据集的缓存结果作废
+# 新闻与热度汇总随评分写入（processed_at）、爬虫新增（insert_time）和未来事件抽取进度（待抽取条数，写入抽取状态后减少）变化，
+# 未来事件随自增 id 变化
+WATERMARK_QUERIES = {
+    'news': """
+        SELECT MAX(processed_at), MAX(insert_time),
+               (SELECT COUNT(*) FROM perception_cls_news WHERE future_event_status = 'unprocessed')
+        FROM perception_cls_news
+    """,
+    'events': "SELECT MAX(id) FROM perception_future_events",
+}
+
+NEWS_COLUMNS = ['id', 'ctime', 'content', 'level', 'reading_num', 'comment_num', 'share_num',
+                'hotspot_level', 'feature_scores', 'processed_at', 'future_event_status']
+EVENT_COLUMNS = ['id', 'news_id', 'event_description', 'expected_time', 'remarks',
+                 'probability_of_occurrence', 'theme_categories', 'region_categories']
+
+
+# 检查并添加水位线查询用的索引，MAX() 直接读索引端点，不扫描新闻表
+# 待抽取条数只扫描索引中 unprocessed 的范围；未来事件抽取的认领索引 (future_event_status, ctime) 已存在时直接复用
+def ensure_watermark_indexes(cursor):
+    for column in ('processed_at', 'insert_time'):
+        cursor.execute(f"SHOW INDEX FROM perception_cls_news WHERE Key_name = 'idx_{column}'")
+        if not cursor.fetchall():
+            cursor.execute(f"ALTER TABLE perception_cls_news ADD KEY idx_{column} ({column})")
+            logging.info(f"perception_cls_news 已添加 idx_{column} 索引")
+    cursor.execute("SHOW INDEX FROM perception_cls_news WHERE Column_name = 'future_event_status' AND Seq_in_index = 1")
+    if not cursor.fetchall():
+        cursor.execute("ALTER TABLE perception_cls_news ADD KEY idx_future_event_status (future_event_status)")
+        logging.info("perception_cls_news 已添加 idx_future_event_status 索引")
+
+
+# 带 TTL 与水位线校验的查询结果缓存；同一查询并发未命中时只有一个线程访问数据库，其余等待其结果
+class QueryCache:
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # key -> (value, watermark, expires_at)
+        self.loading = {}               # key -> threading.Event
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, watermark, load):
+        while True:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] == watermark and entry[2] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                event = self.loading.get(key)
+                if event is None:
+                    event = self.loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()
+
+        try:
+            value = load()
+            with self._lock:
+                self.entries[key] = (value, watermark, time.monotonic() + self.ttl)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                del self.loading[key]
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+
+# 前端读取服务：所有查询经连接池执行，结果以 DataFrame 返回并按数据集水位线缓存
+# Streamlit 中用 st.cache_resource 包装 get_read_service()，各会话共用同一实例
+class ReadService:
+    def __init__(self, config=None, pool_size=DB_POOL_SIZE, cache=None):
+        self.pool = pooling.MySQLConnectionPool(pool_name="read_service", pool_size=pool_size, **(config or read_db_config))
+        self.cache = cache or QueryCache()
+        self.watermarks = {}            # 数据集 -> (水位线, 读取时间)
+        self._watermark_lock = threading.Lock()
+
+    def _query(self, sql, params=(), columns=None):
+        conn = instrument_connection(self.pool.get_connection())
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            columns = columns or [description[0] for description in cursor.description]
+            cursor.close()
+            return pd.DataFrame.from_records(rows, columns=columns)
+        finally:
+            conn.close()
+
+    def watermark(self, dataset):
+        with self._watermark_lock:
+            cached = self.watermarks.get(dataset)
+            if cached is not None and time.monotonic() - cached[1] < WATERMARK_CHECK_SECONDS:
+                return cached[0]
+        conn = self.pool.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(WATERMARK_QUERIES[dataset])
+            value = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+        with self._watermark_lock:
+            self.watermarks[dataset] = (value, time.monotonic())
+        return value
+
+    def _cached(self, dataset, key, load):
+        return self.cache.get((dataset,) + key, self.watermark(dataset), load)
+
+    # 最近 hours 小时的新闻（按发布时间倒序），可按最低热点等级筛选
+    def latest_news(self, hours=24, min_level=None, limit=DEFAULT_PAGE_SIZE):
+        since = int(time.time() - hours * 3600)
+        # 起点按分钟取整，同一分钟内的刷新命中同一缓存
+        since -= since % 60
+        level_condition = "AND hotspot_level >= %s" if min_level is not None else ""
+        params = (since,) + ((min_level,) if min_level is not None else ()) + (limit,)
+        return self._cached('news', ('latest_news', since, min_level, limit), lambda: self._query(f"""
+            SELECT {', '.join(NEWS_COLUMNS)}
+            FROM perception_cls_news
+            WHERE ctime >= %s {level_condition}
+            ORDER BY ctime DESC, id DESC
+            LIMIT %s
+        """, params, NEWS_COLUMNS))
+
+    # 键集分页：读取 [start_ts, end_ts) 内的新闻，返回 (DataFrame, 下一页游标)，游标为上一页最后一条的 (ctime, id)，最后一页时为 None
+    # 不使用 OFFSET，翻到很深的页也只读取一页数据
+    def news_page(self, start_ts, end_ts, after=None, page_size=DEFAULT_PAGE_SIZE):
+        if after is None:
+            cursor_condition, cursor_params = "ctime < %s", (end_ts,)
+        else:
+            ctime, news_id = after
+            cursor_condition, cursor_params = "ctime <= %s AND (ctime < %s OR id < %s)", (ctime, ctime, news_id)
+        frame = self._cached('news', ('news_page', start_ts, end_ts, after, page_size), lambda: self._query(f"""
+            SELECT {', '.join(NEWS_COLUMNS)}
+            FROM perception_cls_news
+            WHERE ctime >= %s AND {cursor_condition}
+            ORDER BY ctime DESC, id DESC
+            LIMIT %s
+        """, (start_ts, *cursor_params, page_size), NEWS_COLUMNS))
+        if len(frame) < page_size:
+            return frame, None
+        last = frame.iloc[-1]
+        return frame, (int(last['ctime']), int(last['id']))
+
+    # 逐页读取时间范围内的新闻，前端按需取下一页，避免一次载入整个范围
+    def iter_news_pages(self, start_ts, end_ts, page_size=DEFAULT_PAGE_SIZE):
+        after = None
+        while True:
+            frame, after = self.news_page(start_ts, end_ts, after, page_size)
+            if not frame.empty:
+                yield frame
+            if after is None:
+                return
+
+    # 主题热度趋势（读取热度汇总表），subject_id=0 为全部新闻
+    def hotspot_trend(self, subject_id=ALL_SUBJECTS_ID, granularity='hour', days=7):
+        end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        start = end - timedelta(days=days)
+        dimension_sums = [f"{column}_sum" for column in DIMENSION_COLUMNS.values()]
+        columns = ['bucket_start', 'news_count', 'level_sum', 'level_max', 'hot_count', 'scored_count'] + dimension_sums
+        return self._cached('news', ('hotspot_trend', subject_id, granularity, start), lambda: self._query(f"""
+            SELECT {', '.join(columns)}
+            FROM {ROLLUP_TABLE}
+            WHERE granularity = %s AND subject_id = %s AND bucket_start >= %s AND bucket_start < %s
+            ORDER BY bucket_start
+        """, (granularity, subject_id, start, end), columns))
+
+    # 时间窗口内的未来事件（按发生概率排序），可按主题和地区筛选
+    def upcoming_events(self, theme=None, region=None, days=14, limit=DEFAULT_PAGE_SIZE):
+        start = datetime.now().replace(second=0, microsecond=0)
+
+        def load():
+            conn = self.pool.get_connection()
+            try:
+                cursor = conn.cursor()
+                rows = query_upcoming_events(cursor, theme, region, start, days, limit=limit)
+                cursor.close()
+            finally:
+                conn.close()
+            return pd.DataFrame.from_records(rows, columns=EVENT_COLUMNS)
+
+        return self._cached('events', ('upcoming_events', theme, region, start, days, limit), load)
+
+
+_read_service = None
+_read_service_lock = threading.Lock()
+
+
+def get_read_service():
+    global _read_service
+    with _read_service_lock:
+        if _read_service is None:
+            _read_service = ReadService()
+        return _read_service
+
+
+if __name__ == "__main__":
+    # python read_service.py init：添加水位线查询用的索引（需有 ALTER 权限，使用 config.db_config 而不是只读配置）
+    import sys
+    import mysql.connector
+    from config import db_config, setup_cli_logging
+    setup_cli_logging()
+    if len(sys.argv) > 1 and sys.argv[1] == "init":
+        try:
+            conn = mysql.connector.connect(**db_config)
+            cursor = conn.cursor()
+            ensure_watermark_indexes(cursor)
+        except mysql.connector.Error as e:
+            logging.error(f"数据库错误: {e}")
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+    else:
+        print("用法: python read_service.py init")
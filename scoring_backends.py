@@ -0,0 +1,286 @@
+import sys
+import json
+import math
+import time
+import pickle
+import random
+import logging
+from datetime import datetime
+from collections import namedtuple
+
+from llm_cache import normalize_content
+
+# 评分后端：远程 LLM 与本地模型实现同一接口，热度计算按配置选用或组合
+# 本地模型为字符 n-gram TF-IDF + 每个维度一个线性分类头，用库中已有的 LLM 评分训练，只需 CPU
+
+# 单条评分结果；source 为评分来源（llm/local），confidence 为本地模型置信度
+ScoreResult = namedtuple(
+    'ScoreResult', ['scores', 'hotspot_level', 'processed_at', 'success', 'source', 'confidence'],
+    defaults=('llm', None)
+)
+FAILED_RESULT = ScoreResult(None, None, None, False)
+
+SCORE_DIMENSIONS = ["冲突性", "名人效应", "突发性", "经济敏感议题", "社会/文化热点", "科技突破", "外交动态"]
+
+# 本地模型配置
+LOCAL_MODEL_PATH = '/var/lib/media_corpus_perception/hotspot_local_model.pkl'
+LOCAL_CONFIDENCE_THRESHOLD = 0.8     # 各维度预测概率的最小值不低于该值时直接采用本地评分
+TRAIN_MAX_ROWS = 200000              # 训练使用的最新已评分记录数
+TRAIN_HOLDOUT_FRACTION = 0.1         # 留出评估的比例
+NGRAM_RANGE = (1, 3)
+MAX_FEATURES = 300000
+
+SCORE_SOURCES_TABLE = 'perception_hotspot_score_sources'
+
+
+# 计算热点等级（远程与本地评分共用，热度计算模块从这里导入）
+def calculate_hotspot_level(scores):
+    if not scores:
+        return None
+    total_score = sum(scores.values())
+    return min(5, math.ceil(total_score / 21 * 5))
+
+
+# 本地评分来源表：记录由本地模型评分的新闻及置信度，训练时排除这些记录，避免模型用自己的输出训练自己
+def ensure_score_sources_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCORE_SOURCES_TABLE} (
+            news_id INT PRIMARY KEY,
+            source VARCHAR(16) NOT NULL,
+            confidence FLOAT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def record_score_source(cursor, news_id, source, confidence):
+    cursor.execute(f"""
+        INSERT INTO {SCORE_SOURCES_TABLE} (news_id, source, confidence)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE source = VALUES(source), confidence = VALUES(confidence)
+    """, (news_id, source, confidence))
+
+
+# 评分后端接口：score_local 在主线程对整批记录做本地评分，返回 ({record_id: ScoreResult}, 仍需远程评分的记录)
+# score_remote 在线程池中执行，返回 {record_id: ScoreResult}
+class ScoringBackend:
+    name = 'base'
+
+    def score_local(self, records):
+        return {}, list(records)
+
+    def score_remote(self, records):
+        return {record_id: FAILED_RESULT for record_id, _ in records}
+
+    def score(self, records):
+        results, remaining = self.score_local(records)
+        if remaining:
+            results.update(self.score_remote(remaining))
+        return results
+
+
+# 远程 LLM 后端：score_func 为批量评分函数（hot_spot_detector.process_records_batch）
+class RemoteLLMBackend(ScoringBackend):
+    name = 'remote'
+
+    def __init__(self, score_func):
+        self.score_func = score_func
+
+    def score_remote(self, records):
+        return self.score_func(records)
+
+
+# 本地模型：字符 n-gram TF-IDF 特征，每个维度一个多分类逻辑回归头（类别为 0-5 分）
+class LocalScoringModel:
+    def __init__(self, vectorizer, heads, version, metrics=None):
+        self.vectorizer = vectorizer
+        self.heads = heads           # 维度 -> 分类器，训练数据中只有一个取值的维度为该常数
+        self.version = version
+        self.metrics = metrics or {}
+
+    # 向量化批量预测，返回 [(scores, confidence)]；confidence 为各维度最大预测概率中的最小值
+    def predict(self, contents):
+        import numpy as np
+        if not contents:
+            return []
+        features = self.vectorizer.transform([normalize_content(content) for content in contents])
+        predictions = np.zeros((len(contents), len(SCORE_DIMENSIONS)), dtype=int)
+        confidence = np.ones(len(contents))
+        for column, dimension in enumerate(SCORE_DIMENSIONS):
+            head = self.heads[dimension]
+            if isinstance(head, int):
+                predictions[:, column] = head
+                continue
+            probabilities = head.predict_proba(features)
+            predictions[:, column] = head.classes_[probabilities.argmax(axis=1)]
+            confidence = np.minimum(confidence, probabilities.max(axis=1))
+        return [
+            ({dimension: int(value) for dimension, value in zip(SCORE_DIMENSIONS, row)}, float(item_confidence))
+            for row, item_confidence in zip(predictions, confidence)
+        ]
+
+    def save(self, path=LOCAL_MODEL_PATH):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path=LOCAL_MODEL_PATH):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+# 本地模型后端：全部记录由本地模型评分；level_func 为热点等级计算函数
+class LocalModelBackend(ScoringBackend):
+    name = 'local'
+
+    def __init__(self, model, level_func):
+        self.model = model
+        self.level_func = level_func
+
+    def predict(self, records):
+        processed_at = datetime.now()
+        return {
+            record_id: ScoreResult(scores, self.level_func(scores), processed_at, True, self.name, confidence)
+            for (record_id, _), (scores, confidence) in zip(records, self.model.predict([content for _, content in records]))
+        }
+
+    def score_local(self, records):
+        return self.predict(records), []
+
+
+# 路由后端：本地模型先对整批记录评分，置信度不低于阈值的直接采用，其余交给远程 LLM
+class RoutingBackend(ScoringBackend):
+    name = 'routed'
+
+    def __init__(self, local, remote, threshold=LOCAL_CONFIDENCE_THRESHOLD):
+        self.local = local
+        self.remote = remote
+        self.threshold = threshold
+
+    def score_local(self, records):
+        predictions = self.local.predict(records)
+        accepted = {record_id: result for record_id, result in predictions.items() if result.confidence >= self.threshold}
+        remaining = [record for record in records if record[0] not in accepted]
+        if records:
+            logging.info(f"本地模型评分 {len(records)} 条，采用 {len(accepted)} 条，{len(remaining)} 条交给 LLM")
+        return accepted, remaining
+
+    def score_remote(self, records):
+        return self.remote.score_remote(records)
+
+
+# 读取训练数据：由 LLM 评分（或继承）的记录，排除本地模型评分的记录
+def load_training_data(cursor, limit=TRAIN_MAX_ROWS):
+    cursor.execute(f"""
+        SELECT n.content, n.feature_scores
+        FROM perception_cls_news n
+        LEFT JOIN {SCORE_SOURCES_TABLE} s ON s.news_id = n.id AND s.source = 'local'
+        WHERE n.feature_scores IS NOT NULL AND s.news_id IS NULL
+        ORDER BY n.ctime DESC
+        LIMIT %s
+    """, (limit,))
+    contents, labels = [], []
+    for content, feature_scores in cursor.fetchall():
+        if isinstance(feature_scores, bytes):
+            feature_scores = feature_scores.decode('utf-8')
+        try:
+            scores = json.loads(feature_scores)
+            labels.append([int(scores[dimension]) for dimension in SCORE_DIMENSIONS])
+        except (ValueError, KeyError, TypeError):
+            continue
+        contents.append(content)
+    return contents, labels
+
+
+# 训练本地模型并在留出集上评估：各维度准确率、热点等级一致率，以及置信度阈值下的覆盖率与等级一致率
+def train_local_model(contents, labels, level_func, threshold=LOCAL_CONFIDENCE_THRESHOLD, seed=42):
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    indices = list(range(len(contents)))
+    random.Random(seed).shuffle(indices)
+    holdout_size = int(len(indices) * TRAIN_HOLDOUT_FRACTION)
+    holdout, train = indices[:holdout_size], indices[holdout_size:]
+    labels = np.array(labels, dtype=int)
+
+    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=NGRAM_RANGE, max_features=MAX_FEATURES,
+                                 min_df=2, sublinear_tf=True)
+    train_features = vectorizer.fit_transform([normalize_content(contents[i]) for i in train])
+    heads = {}
+    for column, dimension in enumerate(SCORE_DIMENSIONS):
+        train_labels = labels[train, column]
+        classes = np.unique(train_labels)
+        if len(classes) == 1:
+            heads[dimension] = int(classes[0])
+            continue
+        head = LogisticRegression(max_iter=1000, C=4.0)
+        head.fit(train_features, train_labels)
+        heads[dimension] = head
+
+    model = LocalScoringModel(vectorizer, heads, datetime.now().strftime('%Y%m%d%H%M%S'))
+    if not holdout:
+        return model
+
+    started = time.perf_counter()
+    predictions = model.predict([contents[i] for i in holdout])
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    expected = labels[holdout]
+    predicted = np.array([[scores[dimension] for dimension in SCORE_DIMENSIONS] for scores, _ in predictions])
+    confident = np.array([confidence >= threshold for _, confidence in predictions])
+    level_match = np.array([
+        level_func(scores) == level_func(dict(zip(SCORE_DIMENSIONS, row)))
+        for (scores, _), row in zip(predictions, expected)
+    ])
+    model.metrics = {
+        'train_rows': len(train),
+        'holdout_rows': len(holdout),
+        'dimension_accuracy': {dimension: float((predicted[:, column] == expected[:, column]).mean())
+                               for column, dimension in enumerate(SCORE_DIMENSIONS)},
+        'level_accuracy': float(level_match.mean()),
+        'confident_coverage': float(confident.mean()),
+        'confident_level_accuracy': float(level_match[confident].mean()) if confident.any() else 0.0,
+        'items_per_second': len(holdout) / elapsed,
+    }
+    return model
+
+
+def print_metrics(metrics, threshold=LOCAL_CONFIDENCE_THRESHOLD):
+    print(f"训练 {metrics['train_rows']} 条，留出评估 {metrics['holdout_rows']} 条")
+    for dimension, accuracy in metrics['dimension_accuracy'].items():
+        print(f"  {dimension}: 准确率 {accuracy:.1%}")
+    print(f"热点等级一致率 {metrics['level_accuracy']:.1%}")
+    print(f"置信度 >= {threshold}: 覆盖 {metrics['confident_coverage']:.1%}，其中等级一致率 {metrics['confident_level_accuracy']:.1%}")
+    print(f"批量推理 {metrics['items_per_second']:.0f} 条/秒")
+
+
+if __name__ == "__main__":
+    # python scoring_backends.py train [训练条数] [模型路径]：用库中已有的 LLM 评分训练本地模型，输出留出集评估结果
+    import mysql.connector
+    from config import db_config, setup_cli_logging
+    setup_cli_logging()
+    if len(sys.argv) > 1 and sys.argv[1] == "train":
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else TRAIN_MAX_ROWS
+        path = sys.argv[3] if len(sys.argv) > 3 else LOCAL_MODEL_PATH
+        try:
+            conn = mysql.connector.connect(**db_config)
+            cursor = conn.cursor()
+            ensure_score_sources_table(cursor)
+            contents, labels = load_training_data(cursor, limit)
+        except mysql.connector.Error as e:
+            logging.error(f"数据库错误: {e}")
+            sys.exit(1)
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+        # 通过模块名调用，使模型按 scoring_backends.LocalScoringModel 序列化，热度计算进程才能加载
+        import scoring_backends
+        model = scoring_backends.train_local_model(contents, labels, calculate_hotspot_level)
+        model.save(path)
+        print(f"本地模型 {model.version} 已保存到 {path}")
+        if model.metrics:
+            print_metrics(model.metrics)
+    else:
+        print("用法: python scoring_backends.py train [训练条数] [模型路径]")
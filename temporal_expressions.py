@@ -0,0 +1,276 @@
+import re
+import sys
+import calendar
+from datetime import date, datetime, timedelta
+from collections import namedtuple
+
+# 中文时间表达检测：正则识别未来时间提示词与日期表达，并按当前日期换算为具体日期范围
+# 完全没有未来时间线索的新闻直接判为无未来事件，不调用 LLM；识别出的日期作为提示附在请求中，并用于校验模型返回的 expected_time
+
+# 单个时间表达；kind 为 marker（未来提示词，无具体日期）、date（日期）或 relative（相对时间）；start/end 为 date，marker 为 None
+TemporalMatch = namedtuple('TemporalMatch', ['text', 'kind', 'start', 'end'])
+
+# 未来提示词：出现任一即视为有未来时间线索
+FUTURE_MARKERS = [
+    '将于', '将在', '将会', '即将', '拟于', '拟在', '定于', '计划', '预计', '预期', '有望', '届时', '择期', '择机',
+    '筹备', '倒计时', '未来', '展望', '前景', '待定', '下一步', '年内', '月内', '本周内', '本月内', '年底前', '年末前',
+    '月底前', '尚未', '今晚', '今夜', '稍后', '近期将',
+]
+# 单字"将""拟"：排除"将近""将军""模拟""虚拟"等非将来时用法
+FUTURE_MARKER_PATTERN = re.compile('|'.join(map(re.escape, FUTURE_MARKERS)) + r'|将(?![近军领士帅])|(?<![模虚])拟')
+
+# 财联社电头（"财联社5月20日电"）为发稿日期，不是事件时间
+DATELINE_PATTERN = re.compile(r'财联社(?:\d{1,2}月\d{1,2}日)?电')
+
+NUM = r'(\d{1,4}|[零〇一二两三四五六七八九十]{1,3})'
+CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+WEEKDAYS = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6}
+MONTH_PARTS = {'初': (1, 10), '上旬': (1, 10), '中旬': (11, 20), '下旬': (21, 31), '底': (21, 31), '末': (21, 31)}
+
+# 日期表达，按从具体到宽泛的顺序匹配，已匹配的片段不再参与后面的模式
+DATE_PATTERNS = [
+    ('ymd', re.compile(r'(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})')),
+    ('ymd', re.compile(r'(?:(\d{4})年)?' + NUM + r'月' + NUM + r'[日号]')),
+    ('ym', re.compile(r'(?:(\d{4})年)?' + NUM + r'月份?(初|上旬|中旬|下旬|底|末)?')),
+    ('quarter', re.compile(r'(?:(\d{4}|今|明)年)?(?:第?([一二三四1-4])季度|[Qq]([1-4]))')),
+    ('half', re.compile(r'(?:(\d{4}|今|明)年)?(上|下)半年')),
+    ('year', re.compile(r'(\d{4})年(?:底|末)?')),
+    ('weekday', re.compile(r'(上|下|本|这)?(?:周|星期|礼拜)([一二三四五六日天])')),
+    ('relative', re.compile(NUM + r'(?:个)?(天|日|周|个月|年)(?:后|内|之内|以内)')),
+    ('named', re.compile(r'明天|明日|后天|下周|下个?月|下季度|明年|后年|年底|年末')),
+]
+
+MIN_EXPECTED_YEAR = 2000             # expected_time 年份的合理范围
+MAX_YEARS_AHEAD = 30
+EXPECTED_TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d', '%Y年%m月%d日']
+EXPECTED_TIME_SUFFIX = re.compile(r'(左右|前后|以前|之前|前|期间)$')
+HINT_PREFIX = "\n时间线索（已按当前日期换算，仅供推断 expected_time 参考）："
+
+
+def cn_number(text):
+    if text.isdigit():
+        return int(text)
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return (CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (CN_DIGITS.get(ones, 0) if ones else 0)
+    value = 0
+    for char in text:
+        value = value * 10 + CN_DIGITS[char]
+    return value
+
+
+def month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def add_months(day, months):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+# 季度、半年前的年份：数字年份、"今年"或"明年"，未写时为今年
+def explicit_year(value, today):
+    if not value or value == '今':
+        return today.year
+    if value == '明':
+        return today.year + 1
+    return int(value)
+
+
+# 未写年份的日期按今年解释，早于今天半年以上的视为明年（如 12 月提到的"1月5日"）
+def infer_year(year, month, today):
+    if year:
+        return int(year)
+    if date(today.year, month, 1) < add_months(today.replace(day=1), -6):
+        return today.year + 1
+    return today.year
+
+
+def resolve_date(kind, groups, today):
+    if kind == 'ymd':
+        month, day = cn_number(groups[1]), cn_number(groups[2])
+        year = infer_year(groups[0], month, today)
+        value = date(year, month, day)
+        return value, value
+    if kind == 'ym':
+        month = cn_number(groups[1])
+        year = infer_year(groups[0], month, today)
+        first, last = date(year, month, 1), month_end(year, month)
+        if groups[2]:
+            start_day, end_day = MONTH_PARTS[groups[2]]
+            return first.replace(day=start_day), last.replace(day=min(end_day, last.day))
+        return first, last
+    if kind == 'quarter':
+        quarter = cn_number(groups[1] or groups[2])
+        year = explicit_year(groups[0], today)
+        return date(year, quarter * 3 - 2, 1), month_end(year, quarter * 3)
+    if kind == 'half':
+        year = explicit_year(groups[0], today)
+        return (date(year, 1, 1), date(year, 6, 30)) if groups[1] == '上' else (date(year, 7, 1), date(year, 12, 31))
+    if kind == 'year':
+        year = int(groups[0])
+        return date(year, 1, 1), date(year, 12, 31)
+    if kind == 'weekday':
+        monday = today - timedelta(days=today.weekday())
+        offset = {'上': -7, '下': 7}.get(groups[0], 0)
+        value = monday + timedelta(days=offset + WEEKDAYS[groups[1]])
+        return value, value
+    if kind == 'relative':
+        amount, unit = cn_number(groups[0]), groups[1]
+        if unit in ('天', '日'):
+            return today, today + timedelta(days=amount)
+        if unit == '周':
+            return today, today + timedelta(weeks=amount)
+        if unit == '个月':
+            return today, add_months(today, amount)
+        return today, add_months(today, amount * 12)
+    return resolve_named(groups, today)
+
+
+def resolve_named(text, today):
+    if text in ('明天', '明日'):
+        value = today + timedelta(days=1)
+        return value, value
+    if text == '后天':
+        value = today + timedelta(days=2)
+        return value, value
+    if text == '下周':
+        monday = today - timedelta(days=today.weekday()) + timedelta(days=7)
+        return monday, monday + timedelta(days=6)
+    if text in ('下月', '下个月'):
+        first = add_months(today.replace(day=1), 1)
+        return first, month_end(first.year, first.month)
+    if text == '下季度':
+        first = date(today.year, (today.month - 1) // 3 * 3 + 1, 1)
+        first = add_months(first, 3)
+        return first, month_end(first.year, first.month + 2)
+    if text in ('明年', '后年'):
+        year = today.year + (1 if text == '明年' else 2)
+        return date(year, 1, 1), date(year, 12, 31)
+    return date(today.year, 12, 1), date(today.year, 12, 31)
+
+
+# 找出文本中的全部时间表达（电头除外）
+def find_expressions(content, now=None):
+    today = (now or datetime.now()).date()
+    text = DATELINE_PATTERN.sub(lambda match: ' ' * len(match.group()), content or '')
+    matches = []
+    taken = []
+    for kind, pattern in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            span = match.span()
+            if any(span[0] < end and start < span[1] for start, end in taken):
+                continue
+            groups = match.groups() if kind != 'named' else match.group()
+            try:
+                start, end = resolve_date(kind, groups, today)
+            except (ValueError, KeyError):
+                # 月份、日期超出范围等不是日期的数字组合
+                continue
+            taken.append(span)
+            matches.append(TemporalMatch(match.group(), 'relative' if kind in ('relative', 'named') else 'date', start, end))
+    for match in FUTURE_MARKER_PATTERN.finditer(text):
+        matches.append(TemporalMatch(match.group(), 'marker', None, None))
+    return matches
+
+
+# 是否有未来时间线索：出现未来提示词，或有结束日期不早于今天的日期表达
+def has_future_cue(content, now=None):
+    today = (now or datetime.now()).date()
+    return any(match.kind == 'marker' or match.end >= today for match in find_expressions(content, now))
+
+
+# 换算后的日期提示，附在 LLM 请求的新闻内容之后；没有不早于今天的日期表达时返回空字符串
+def format_hints(content, now=None):
+    today = (now or datetime.now()).date()
+    hints = []
+    for match in find_expressions(content, now):
+        if match.kind == 'marker' or match.end < today:
+            continue
+        if match.start == match.end:
+            hints.append(f"{match.text} = {match.start.isoformat()}")
+        else:
+            hints.append(f"{match.text} = {match.start.isoformat()} 至 {match.end.isoformat()}")
+    return HINT_PREFIX + "；".join(hints) if hints else ""
+
+
+# 校验并规范化模型返回的 expected_time：可解析且年份合理的返回 "YYYY-MM-DD HH:MM:SS"，
+# 模型返回"2025年6月""下周一"等中文表达时取其起始日，"未指明"或无法解析的返回 None
+def normalize_expected_time(value, now=None):
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not value or value == '未指明':
+        return None
+    now = now or datetime.now()
+    parsed = None
+    for fmt in EXPECTED_TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    if parsed is None:
+        # 整个字符串须是一个时间表达（允许"左右""之前"等后缀），避免"2025年13月1日"被部分匹配为"2025年"
+        expression = EXPECTED_TIME_SUFFIX.sub('', value)
+        dates = [match for match in find_expressions(expression, now) if match.kind != 'marker' and match.text == expression]
+        if not dates:
+            return None
+        parsed = datetime.combine(dates[0].start, datetime.min.time())
+    if not MIN_EXPECTED_YEAR <= parsed.year <= now.year + MAX_YEARS_AHEAD:
+        return None
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# 评估：用库中已由 LLM 抽取的记录（has_events / no_events）检验预过滤的召回率与节省的调用数
+# 以新闻发布时间作为"当前日期"换算相对时间；启用预过滤后被过滤的记录也会记为 no_events，应使用启用前的记录评估
+def evaluate(limit=5000):
+    import mysql.connector
+    from config import db_config
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, ctime, content, future_event_status
+        FROM perception_cls_news
+        WHERE future_event_status IN ('has_events', 'no_events')
+        ORDER BY ctime DESC
+        LIMIT %s
+    """, (limit,))
+    rows = cursor.fetchall()
+    cursor.execute("""
+        SELECT e.expected_time IS NULL, COUNT(*)
+        FROM perception_future_events e
+        JOIN (SELECT id FROM perception_cls_news
+              WHERE future_event_status = 'has_events' ORDER BY ctime DESC LIMIT %s) n ON n.id = e.news_id
+        GROUP BY e.expected_time IS NULL
+    """, (limit,))
+    expected_time_counts = dict(cursor.fetchall())
+    cursor.close()
+    conn.close()
+
+    total = len(rows)
+    has_events = [row for row in rows if row[3] == 'has_events']
+    filtered = [row for row in rows if not has_future_cue(row[2], datetime.fromtimestamp(row[1]))]
+    missed = [row for row in filtered if row[3] == 'has_events']
+    recall = 1 - len(missed) / len(has_events) if has_events else 1.0
+    saved = len(filtered) / total if total else 0.0
+    print(f"评估样本: {total} 条已抽取记录，其中 has_events {len(has_events)} 条")
+    print(f"无时间线索判为 no_events {len(filtered)} 条，节省调用 {saved:.1%}")
+    print(f"has_events 召回率 {recall:.1%}（误过滤 {len(missed)} 条）")
+    for news_id, _, content, _ in missed[:10]:
+        print(f"  误过滤 {news_id}: {content[:80]}")
+    with_time, without_time = expected_time_counts.get(0, 0), expected_time_counts.get(1, 0)
+    if with_time + without_time:
+        print(f"已写入事件 {with_time + without_time} 个，其中 expected_time 为空（未指明或无法解析）{without_time / (with_time + without_time):.1%}")
+
+
+if __name__ == "__main__":
+    # python temporal_expressions.py evaluate [样本数]；不带参数时逐行读取标准输入输出识别结果
+    if len(sys.argv) > 1 and sys.argv[1] == "evaluate":
+        evaluate(int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    else:
+        for line in sys.stdin:
+            line = line.strip()
+            print(has_future_cue(line), find_expressions(line), format_hints(line))